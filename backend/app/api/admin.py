@@ -0,0 +1,141 @@
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.services.model_router import ModelRouter
+from app.core.admission import admission_controller
+from app.core.single_flight import single_flight
+from app.core.profiling import ProfileStore
+from app.services.vector_index_cache import VectorIndexCache
+from app.services.report_cache import ReportCache
+from app.services.knowledge_graph_service import KnowledgeGraphService
+from app.services.embedding_migration import EmbeddingMigrator
+from app.core.database import get_db
+from app.api.deps import require_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/model-router")
+async def model_router_stats():
+    """
+    模型路由器的各后端滚动统计、当前排序和最近的路由决策
+    """
+    return ModelRouter.get_instance().snapshot()
+
+
+@router.get("/model-router/route")
+async def preview_route(objective: Optional[str] = None):
+    """
+    预览指定目标下的候选后端顺序
+    """
+    return {"objective": objective, "candidates": [b["name"] for b in ModelRouter.get_instance().rank(objective)]}
+
+
+@router.get("/admission")
+async def admission_stats():
+    """
+    准入控制的各类别并发数、队列深度和拒绝次数
+    """
+    return admission_controller.snapshot()
+
+
+@router.get("/single-flight")
+async def single_flight_stats():
+    """
+    合并计算的执行次数、被合并的请求数和进行中的 key 数
+    """
+    return single_flight.stats()
+
+
+@router.get("/vector-index-cache")
+async def vector_index_cache_stats():
+    """
+    已加载向量索引缓存的命中率、淘汰次数和常驻字节数
+    """
+    return VectorIndexCache.get_instance().stats()
+
+
+@router.get("/report-cache")
+def report_cache_stats():
+    """
+    报告文件缓存的命中率、文件数和占用字节数
+    """
+    return ReportCache.get_instance().stats()
+
+
+@router.post("/knowledge-graph/reindex")
+def reindex_knowledge_graph(db: Session = Depends(get_db)):
+    """
+    用已缓存的抽取结果重建所有文档的图谱索引 (重新做实体规范化，不调用 LLM)
+    """
+    return KnowledgeGraphService(db).reindex_documents()
+
+
+@router.get("/embedding-migrations")
+def list_embedding_migrations(db: Session = Depends(get_db)):
+    """
+    当前生效的 embedding 模型和所有迁移任务的进度 (完成比例、速度、预计剩余时间)
+    """
+    return EmbeddingMigrator.get_instance().overview(db)
+
+
+@router.post("/embedding-migrations")
+def start_embedding_migration(target_model: str = Body(..., embed=True), db: Session = Depends(get_db)):
+    """
+    开始迁移到新的 embedding 模型：后台分批限流地重新计算片段向量，完成前问答继续使用旧模型，完成后原子切换
+    """
+    try:
+        return EmbeddingMigrator.get_instance().start(db, target_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/embedding-migrations/{migration_id}")
+def get_embedding_migration(migration_id: int, db: Session = Depends(get_db)):
+    result = EmbeddingMigrator.get_instance().get(db, migration_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="迁移任务不存在")
+    return result
+
+
+@router.post("/embedding-migrations/{migration_id}/{action}")
+def control_embedding_migration(migration_id: int, action: str, db: Session = Depends(get_db)):
+    """
+    暂停 (pause)、从检查点继续 (resume) 或取消 (cancel) 迁移任务
+    """
+    migrator = EmbeddingMigrator.get_instance()
+    handlers = {"pause": migrator.pause, "resume": migrator.resume, "cancel": migrator.cancel}
+    if action not in handlers:
+        raise HTTPException(status_code=404, detail=f"不支持的操作: {action}")
+    try:
+        result = handlers[action](db, migration_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="迁移任务不存在")
+    return result
+
+
+@router.get("/profiles")
+def list_profiles():
+    """
+    已保存的剖析结果 (最新的在前)：X-Profile 请求头触发的单次剖析和慢请求的自动采样
+    """
+    return ProfileStore.get_instance().overview()
+
+
+@router.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, format: Optional[str] = None):
+    """
+    下载剖析结果：采样结果支持 speedscope (默认) 和 collapsed，cProfile 结果支持 pstats (默认) 和 text
+    """
+    try:
+        result = ProfileStore.get_instance().export(profile_id, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="剖析结果不存在")
+    content, media_type, filename = result
+    return Response(content=content, media_type=media_type,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -0,0 +1,44 @@
+import secrets
+from fastapi import Header, HTTPException, Request
+from typing import Optional
+
+from app.core.config import settings
+from app.services import usage_stats_service
+
+_LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+# 反向代理 (包括 Vite 开发代理) 从本机转发请求时附带的请求头
+_FORWARDED_HEADERS = ("forwarded", "x-forwarded-for", "x-real-ip")
+
+
+def track_usage(feature: str):
+    """
+    路由依赖：记录一次功能使用.
+    用户标识取自 X-User-Id 请求头，写入走异步批量写入器，不增加接口延迟。
+    """
+    def dependency(x_user_id: Optional[str] = Header(None)):
+        usage_stats_service.record_usage(x_user_id or "anonymous", feature)
+    return dependency
+
+
+def admin_denial(request: Request, x_admin_token: Optional[str]) -> Optional[str]:
+    """
+    管理员鉴权：校验 X-Admin-Token 请求头，未配置 ADMIN_TOKEN 时默认拒绝；
+    显式开启 ADMIN_ALLOW_LOOPBACK 时放行本机直连、且不带转发头的请求。通过时返回 None，否则返回拒绝原因。
+    """
+    if settings.ADMIN_TOKEN:
+        if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+            return "Admin token required"
+        return None
+    if not settings.ADMIN_ALLOW_LOOPBACK:
+        return "Admin API is disabled: ADMIN_TOKEN is not configured"
+    client_host = request.client.host if request.client else None
+    if client_host not in _LOOPBACK_HOSTS or any(request.headers.get(name) for name in _FORWARDED_HEADERS):
+        return "Admin API is only available from localhost"
+    return None
+
+
+def require_admin(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """管理接口鉴权依赖，规则见 admin_denial"""
+    reason = admin_denial(request, x_admin_token)
+    if reason is not None:
+        raise HTTPException(status_code=403, detail=reason)
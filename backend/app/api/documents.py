@@ -1,15 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
-import docx2txt
-from pypdf import PdfReader
-from io import BytesIO
+from typing import List, Optional
+import os
+import tempfile
 import traceback
 import logging
 
-from app.services import document_service
-from app.schemas.document import Document, DocumentCreate, DocumentResponse
+from app.services import document_service, extraction_service, ingestion_service, search_index
+from app.core.config import settings
+from app.schemas.document import Document, DocumentCreate, DocumentUpdate, DocumentResponse, DocumentSearchResponse
 from app.core.database import get_db
+from app.api.deps import track_usage
 
 router = APIRouter(prefix="/documents", tags=["documents"], redirect_slashes=False)
 
@@ -24,6 +26,23 @@ def read_documents(skip: int = 0, limit: int = 100, db: Session = Depends(get_db
     return documents
 
 
+@router.get("/search", response_model=DocumentSearchResponse)
+def search_documents(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """
+    全文检索文档 (文件名和正文)，按相关度排序并返回高亮片段.
+    多个词以空格分隔，需同时命中；中文按字建立索引，任意长度的词都可检索。
+    """
+    try:
+        return search_index.search(db, q, limit=limit, offset=offset)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
 @router.get("/{document_id}", response_model=DocumentResponse)
 def read_document(document_id: int, db: Session = Depends(get_db)):
     db_document = document_service.get_document(db, document_id=document_id)
@@ -32,23 +51,17 @@ def read_document(document_id: int, db: Session = Depends(get_db)):
     return db_document
 
 
-@router.post("/", response_model=DocumentResponse)
+@router.post("/", response_model=DocumentResponse, dependencies=[Depends(track_usage("document_upload"))])
 async def create_document(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    path = None
     try:
         logger.info(f"Uploading file: {file.filename}, content type: {file.content_type}")
-        
-        # 读取文件内容
-        content = ""
-        if file.content_type == "application/pdf":
-            content = await extract_text_from_pdf(file)
-        elif file.content_type in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", 
-                                   "application/msword"]:
-            content = await extract_text_from_docx(file)
-        elif file.content_type == "text/plain":
-            content = (await file.read()).decode('utf-8')
-        else:
+        if file.content_type not in extraction_service.EXTRACTORS:
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}")
-        
+
+        # 分块写入临时文件，解析器直接读取文件路径
+        path = await spool_upload(file)
+        content = await run_in_threadpool(extraction_service.extract_text, path, file.content_type)
         logger.info(f"Extracted content length: {len(content)}")
         
         document_data = DocumentCreate(
@@ -59,10 +72,52 @@ async def create_document(file: UploadFile = File(...), db: Session = Depends(ge
         result = document_service.create_document(db, document=document_data)
         logger.info(f"Document created successfully with ID: {result.id}")
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+    finally:
+        if path:
+            os.remove(path)
+
+
+@router.post("/bulk", dependencies=[Depends(track_usage("document_bulk_upload"))])
+async def create_documents_bulk(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
+    """
+    批量上传：可同时上传多个文件或 ZIP 压缩包 (按成员展开).
+    文本提取在工作进程中并行执行，文档分批写入数据库，返回逐文件的结果清单。
+    """
+    uploads = []
+    try:
+        remaining = settings.BULK_UPLOAD_MAX_BYTES
+        for file in files:
+            is_zip = file.content_type in extraction_service.ZIP_CONTENT_TYPES \
+                or (file.filename or "").lower().endswith(".zip")
+            limit = remaining if is_zip else min(remaining, settings.UPLOAD_MAX_BYTES)
+            path = await spool_upload(file, max_bytes=limit)
+            uploads.append((file.filename, path, file.content_type))
+            remaining -= os.path.getsize(path)
+        logger.info(f"Bulk upload: {len(uploads)} files")
+        return await run_in_threadpool(ingestion_service.ingest_uploads, db, uploads)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        for _, path, _ in uploads:
+            os.remove(path)
+
+
+@router.put("/{document_id}", response_model=DocumentResponse)
+def update_document(document_id: int, document: DocumentUpdate, db: Session = Depends(get_db)):
+    """
+    修改文档.
+    只有新增或改动的片段需要重新计算向量，未变片段的向量和图谱抽取结果直接复用。
+    """
+    db_document = document_service.update_document(db, document_id=document_id, document=document)
+    if db_document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return db_document
 
 
 @router.delete("/{document_id}", response_model=DocumentResponse)
@@ -73,32 +128,32 @@ def delete_document(document_id: int, db: Session = Depends(get_db)):
     return db_document
 
 
-async def extract_text_from_pdf(file: UploadFile):
-    """从PDF文件中提取文本"""
-    try:
-        content = await file.read()
-        logger.info(f"PDF file size: {len(content)} bytes")
-        pdf_reader = PdfReader(BytesIO(content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() or ""  # 处理None值
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from PDF: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {str(e)}")
-
-
-async def extract_text_from_docx(file: UploadFile):
-    """从DOCX文件中提取文本"""
-    try:
-        # 重新读取文件内容以确保文件指针位置正确
-        content = await file.read()
-        logger.info(f"DOCX file size: {len(content)} bytes")
-        # 使用BytesIO创建新的文件对象
-        file_obj = BytesIO(content)
-        return docx2txt.process(file_obj)
-    except Exception as e:
-        logger.error(f"Error extracting text from DOCX: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error extracting text from DOCX: {str(e)}")
\ No newline at end of file
+async def spool_upload(file: UploadFile, max_bytes: Optional[int] = None) -> str:
+    """
+    按 UPLOAD_CHUNK_SIZE 分块把上传内容写入磁盘临时文件并返回路径.
+    内存占用只有一个分块大小，超过 max_bytes 时删除临时文件并返回 413。
+    """
+    # 批量上传的剩余额度可能为 0，不能用 or 把它当作未指定
+    if max_bytes is None:
+        max_bytes = settings.UPLOAD_MAX_BYTES
+    suffix = os.path.splitext(file.filename or "")[1]
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=settings.UPLOAD_TMP_DIR) as tmp:
+        try:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large: limit is {max_bytes} bytes"
+                    )
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    logger.info(f"Spooled upload {file.filename}: {size} bytes -> {tmp.name}")
+    return tmp.name
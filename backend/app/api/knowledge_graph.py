@@ -1,15 +1,16 @@
-from fastapi import APIRouter, Depends, Body
+from fastapi import APIRouter, Depends, Body, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.services.knowledge_graph_service import KnowledgeGraphService
 from app.core.database import get_db
+from app.api.deps import track_usage
 
 router = APIRouter(prefix="/knowledge-graph", tags=["knowledge_graph"])
 
 
-@router.post("/build")
-async def build_knowledge_graph(
+@router.post("/build", dependencies=[Depends(track_usage("knowledge_graph_build"))])
+def build_knowledge_graph(
     document_id: Optional[int] = Body(None, embed=True),
     db: Session = Depends(get_db)
 ):
@@ -28,8 +29,8 @@ async def build_knowledge_graph(
     return result
 
 
-@router.get("/visualize")
-async def visualize_knowledge_graph(db: Session = Depends(get_db)):
+@router.get("/visualize", dependencies=[Depends(track_usage("knowledge_graph_visualize"))])
+def visualize_knowledge_graph(db: Session = Depends(get_db)):
     """
     获取知识图谱的可视化图像
     
@@ -37,5 +38,61 @@ async def visualize_knowledge_graph(db: Session = Depends(get_db)):
         base64编码的图像字符串
     """
     kg_service = KnowledgeGraphService(db)
-    result = kg_service.build_knowledge_graph()
-    return {"graph_image": result["graph_image"]}
\ No newline at end of file
+    kg_service.build_knowledge_graph()
+    return {"graph_image": kg_service.generate_graph_image_base64()}
+
+
+@router.get("/entities")
+def list_entities(
+    order_by: str = Query("pagerank", pattern="^(pagerank|degree|mentions)$"),
+    q: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    按 PageRank / 度数 / 提及次数排序的实体列表，q 为实体名的子串过滤
+    """
+    return KnowledgeGraphService(db).top_entities(order_by=order_by, query=q, skip=skip, limit=limit)
+
+
+@router.get("/neighborhood")
+def entity_neighborhood(
+    entity: str,
+    hops: int = Query(1, ge=1, le=3),
+    directed: bool = False,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    实体的 k 跳邻域，邻居按距离和度数分页，只返回中心实体与本页邻居之间的边
+    """
+    result = KnowledgeGraphService(db).neighborhood(entity, hops=hops, skip=skip, limit=limit, directed=directed)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"实体不存在: {entity}")
+    return result
+
+
+@router.get("/path")
+def entity_path(source: str, target: str, directed: bool = False, db: Session = Depends(get_db)):
+    """
+    两个实体之间的最短路径
+    """
+    result = KnowledgeGraphService(db).shortest_path(source, target, directed=directed)
+    if result is None:
+        raise HTTPException(status_code=404, detail="实体不存在")
+    return result
+
+
+@router.get("/mentions")
+def entity_mentions(
+    entity: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    提到该实体的文档片段
+    """
+    return KnowledgeGraphService(db).entity_mentions(entity, skip=skip, limit=limit)
@@ -1,28 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional, Any
+import json
 
 from app.services.qa_service import QAService
+from app.services.semantic_cache import SemanticAnswerCache
+from app.services.conversation_store import ConversationStore
+from app.services.llm_backends import CircuitBreakerRegistry
+from app.models.document import Document
 from app.core.database import get_db
+from app.api.deps import track_usage
 
 router = APIRouter(prefix="/qa", tags=["question_answering"])
 
 
-@router.post("/single-document")
-async def single_document_qa(
+@router.post("/single-document", dependencies=[Depends(track_usage("single_document_qa"))])
+def single_document_qa(
         document_id: int,
         question: str,
+        objective: Optional[str] = None,  # 路由目标: fastest / cheapest / capable
+        retrieval: Optional[str] = None,  # 检索方式: vector / graph (图谱增强)
         body: Dict[str, Any] = Body(default={}),  # 接收 history
         db: Session = Depends(get_db)
 ):
     history = body.get("history", [])
+    conversation_id = body.get("conversation_id")
     qa_service = QAService(db)
-    result = qa_service.single_document_qa(document_id, question, history)
+    result = qa_service.single_document_qa(document_id, question, history, conversation_id, objective, retrieval)
     return result
 
 
-@router.post("/knowledge-base")
-async def knowledge_base_qa(
+@router.post("/knowledge-base", dependencies=[Depends(track_usage("knowledge_base_qa"))])
+def knowledge_base_qa(
         question: str,
         body: Dict[str, Any] = Body(default={}),
         db: Session = Depends(get_db)
@@ -33,8 +43,8 @@ async def knowledge_base_qa(
     return result
 
 
-@router.post("/multi-document-comparison")
-async def multi_document_comparison(
+@router.post("/multi-document-comparison", dependencies=[Depends(track_usage("multi_document_comparison"))])
+def multi_document_comparison(
         payload: Dict[str, Any] = Body(...),
         db: Session = Depends(get_db)
 ):
@@ -46,15 +56,64 @@ async def multi_document_comparison(
     result = qa_service.multi_document_comparison(document_ids, question)
     return result
 
-@router.post("/multi-model")
-async def multi_model_qa(
+@router.post("/multi-model", dependencies=[Depends(track_usage("multi_model_qa"))])
+def multi_model_qa(
         document_id: int,
         question: str,
         db: Session = Depends(get_db)
 ):
     """
-    多模型竞技场：使用4个模型同时回答问题
+    多模型竞技场：使用4个模型同时回答问题.
+    超过截止时间的模型标记为 timeout，其余模型的答案照常返回。
     """
     qa_service = QAService(db)
     result = qa_service.multi_model_qa(document_id, question)
-    return result
\ No newline at end of file
+    return result
+
+
+@router.post("/multi-model/stream", dependencies=[Depends(track_usage("multi_model_qa"))])
+def multi_model_qa_stream(
+        document_id: int,
+        question: str,
+        db: Session = Depends(get_db)
+):
+    """
+    多模型竞技场 (流式)：每个模型完成后立即以一行 JSON (NDJSON) 推送结果
+    """
+    qa_service = QAService(db)
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    def event_stream():
+        for event in qa_service.iter_multi_model_answers(document, question):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+        yield json.dumps({"status": "done"}) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@router.get("/multi-model/backends")
+async def multi_model_backends():
+    """
+    各竞技场后端的熔断器状态
+    """
+    return CircuitBreakerRegistry.snapshot()
+
+
+@router.delete("/conversations/{conversation_id}")
+async def delete_conversation(conversation_id: str):
+    """
+    结束会话并释放服务端保存的对话状态
+    """
+    if not ConversationStore.get_instance().delete(conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"conversation_id": conversation_id, "deleted": True}
+
+
+@router.get("/cache/stats")
+async def semantic_cache_stats():
+    """
+    语义答案缓存的命中率统计
+    """
+    return SemanticAnswerCache.get_instance().stats()
@@ -1,37 +1,106 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Body
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Body, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Optional
+from typing import BinaryIO, List, Dict, Optional
+import logging
+import os
+import re
 import urllib.parse
 
-from app.services.report_service import ReportService
+from app.services.report_service import ReportService, REPORT_FORMATS, REPORT_TEMPLATE_VERSION
+from app.services.report_cache import ReportCache
 from app.services.knowledge_graph_service import KnowledgeGraphService
 from app.services.qa_service import QAService  # 导入 QAService
+from app.services.document_service import compute_content_hash
 from app.core.database import get_db
+from app.core.single_flight import single_flight
+from app.api.deps import track_usage
 from app.models.document import Document
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
-@router.post("/generate")
-async def generate_report(
-    format: str = Body("pdf", embed=True),
-    title: str = Body("智能文档分析报告", embed=True),
-    document_ids: List[int] = Body(..., embed=True),
-    db: Session = Depends(get_db)
-):
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _open_report(path: Optional[str]) -> Optional[BinaryIO]:
+    """打开缓存的报告文件；文件已被缓存淘汰时返回 None"""
+    if path is None:
+        return None
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+
+def _iter_file_range(file: BinaryIO, start: int, length: int):
+    # 从已打开的文件句柄读取，发送期间文件被缓存淘汰删除也不影响
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(_STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _file_response(request: Request, file: BinaryIO, media_type: str, etag: str, headers: Dict) -> Response:
     """
-    自动生成分析报告
+    以文件流发送缓存的报告 (调用方已打开文件，句柄由响应负责关闭).
+    支持 If-None-Match (304) 和单个 Range 区间 (206)；If-Range 与 ETag 不一致
+    或区间无效 (起点大于终点) 时忽略 Range，返回完整文件。
     """
-    if not document_ids:
-        raise HTTPException(status_code=400, detail="请至少选择一个文档")
+    etag = f'"{etag}"'
+    headers = {**headers, "ETag": etag, "Accept-Ranges": "bytes"}
+    if request.headers.get("if-none-match") == etag:
+        file.close()
+        return Response(status_code=304, headers=headers)
+
+    size = os.fstat(file.fileno()).st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    match = _RANGE_PATTERN.match(range_header.strip()) if range_header else None
+    if match and (if_range is None or if_range == etag) and (match.group(1) or match.group(2)):
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            # bytes=-N 表示最后 N 个字节
+            start, end = max(size - int(match.group(2)), 0), size - 1
+        if start >= size:
+            file.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if start <= end:
+            length = end - start + 1
+            return StreamingResponse(
+                _iter_file_range(file, start, length),
+                status_code=206,
+                media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(length)},
+            )
+    return StreamingResponse(_iter_file_range(file, 0, size), media_type=media_type,
+                             headers={**headers, "Content-Length": str(size)})
+
 
-    # 初始化所有需要的服务
+def _content_disposition(title: str, format: str) -> str:
+    encoded_filename = urllib.parse.quote(f"{title.replace(' ', '_')}.{format.lower()}")
+    fallback_filename = f"report.{format.lower()}"
+    return f"attachment; filename=\"{fallback_filename}\"; filename*=UTF-8''{encoded_filename}"
+
+
+def _build_report(db: Session, selected_docs: List[Document], title: str, format: str, key: str) -> str:
+    """生成报告并写入缓存，返回文件路径"""
     report_service = ReportService()
     kg_service = KnowledgeGraphService(db)
     qa_service = QAService(db)  # 实例化 QAService
-    
-    selected_docs = db.query(Document).filter(Document.id.in_(document_ids)).all()
-    if not selected_docs:
-        raise HTTPException(status_code=404, detail="所选文档未找到")
+    document_ids = [doc.id for doc in selected_docs]
 
     # --- 生成动态摘要 ---
     summary_text = qa_service.generate_summary_for_documents(document_ids)
@@ -41,33 +110,85 @@ async def generate_report(
         "title": title,
         "summary": summary_text
     }
-    
+
     # 为选定的所有文档构建一个统一的知识图谱
-    for doc_id in document_ids:
-        kg_service.build_knowledge_graph(doc_id)
+    kg_service.build_knowledge_graph(document_ids=document_ids)
+    kg_image = kg_service.generate_graph_image()
 
-    kg_image_base64 = kg_service.generate_graph_image_base64()
-    
-    try:
-        report_data = report_service.generate_report(
-            format=format,
-            content=report_content,
-            selected_docs=[{"filename": doc.filename} for doc in selected_docs],
-            kg_image_base64=kg_image_base64
-        )
-        
-        media_type = "application/pdf" if format.lower() == "pdf" else "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        
-        encoded_filename = urllib.parse.quote(f"{title.replace(' ', '_')}.{format.lower()}")
-        fallback_filename = f"report.{format.lower()}"
-        
-        disposition = f"attachment; filename=\"{fallback_filename}\"; filename*=UTF-8''{encoded_filename}"
-        
-        return Response(
-            content=report_data,
-            media_type=media_type,
-            headers={"Content-Disposition": disposition}
-        )
-    except Exception as e:
-        print(f"Error generating report: {e}")
-        raise HTTPException(status_code=500, detail=f"生成报告时出错: {str(e)}")
+    extension, _ = REPORT_FORMATS[format]
+    return ReportCache.get_instance().put(key, extension, lambda output: report_service.generate_report(
+        format=format,
+        content=report_content,
+        selected_docs=[{"filename": doc.filename} for doc in selected_docs],
+        kg_image=kg_image,
+        output=output,
+    ))
+
+
+@router.post("/generate", dependencies=[Depends(track_usage("report_generation"))])
+def generate_report(
+    request: Request,
+    format: str = Body("pdf", embed=True),
+    title: str = Body("智能文档分析报告", embed=True),
+    document_ids: List[int] = Body(..., embed=True),
+    db: Session = Depends(get_db)
+):
+    """
+    自动生成分析报告.
+    相同文档内容、标题和格式的报告只生成一次，之后直接返回缓存文件；
+    响应头 X-Report-Key 可用于 GET /reports/files/{key} 重新下载 (支持 ETag 和 Range)。
+    """
+    if not document_ids:
+        raise HTTPException(status_code=400, detail="请至少选择一个文档")
+    format = format.lower()
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的报告格式: {format}")
+
+    selected_docs = db.query(Document).filter(Document.id.in_(document_ids)).order_by(Document.id).all()
+    if not selected_docs:
+        raise HTTPException(status_code=404, detail="所选文档未找到")
+
+    cache = ReportCache.get_instance()
+    key = cache.make_key(
+        [(doc.id, doc.filename, compute_content_hash(doc.content)) for doc in selected_docs],
+        title, format, REPORT_TEMPLATE_VERSION,
+    )
+    extension, media_type = REPORT_FORMATS[format]
+    report = _open_report(cache.get(key, extension))
+    # 文件可能在生成后、打开前被缓存淘汰，此时重新生成一次
+    for _ in range(2):
+        if report is not None:
+            break
+        try:
+            # 相同报告的并发请求只生成一次
+            path = single_flight.do(("report", key), _build_report, db, selected_docs, title, format, key)
+        except Exception as e:
+            logger.error(f"Error generating report: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"生成报告时出错: {str(e)}")
+        report = _open_report(path)
+    if report is None:
+        raise HTTPException(status_code=503, detail="报告缓存空间不足，报告生成后即被清理，请稍后重试")
+
+    headers = {"Content-Disposition": _content_disposition(title, format), "X-Report-Key": key}
+    return _file_response(request, report, media_type, key, headers)
+
+
+@router.get("/files/{report_key}")
+def download_report(
+    request: Request,
+    report_key: str,
+    format: str = Query("pdf"),
+    title: Optional[str] = None
+):
+    """
+    下载已生成的报告文件，支持 If-None-Match 和断点续传 (Range)
+    """
+    format = format.lower()
+    if format not in REPORT_FORMATS or not re.fullmatch(r"[0-9a-f]{64}", report_key):
+        raise HTTPException(status_code=404, detail="报告不存在")
+    extension, media_type = REPORT_FORMATS[format]
+    report = _open_report(ReportCache.get_instance().get(report_key, extension))
+    if report is None:
+        raise HTTPException(status_code=404, detail="报告不存在或已过期")
+    headers = {"Content-Disposition": _content_disposition(title or "report", format)}
+    return _file_response(request, report, media_type, report_key, headers)
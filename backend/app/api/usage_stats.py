@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Header
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.services import usage_stats_service
+from app.schemas.usage_stats import UsageStats, UsageStatsSummary
+from app.core.database import get_db
+
+router = APIRouter(prefix="/usage-stats", tags=["usage_stats"])
+
+
+@router.get("/", response_model=UsageStatsSummary)
+def read_usage_summary(db: Session = Depends(get_db)):
+    """按功能汇总的使用次数 (读取预聚合计数)"""
+    return usage_stats_service.get_usage_summary(db)
+
+
+@router.get("/statistics", response_model=UsageStatsSummary)
+def read_statistics(db: Session = Depends(get_db)):
+    return usage_stats_service.get_usage_summary(db)
+
+
+@router.get("/records", response_model=List[UsageStats])
+def read_usage_records(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    return usage_stats_service.get_usage_stats(db, skip=skip, limit=limit)
+
+
+@router.post("/track-feature")
+def track_feature(feature: str, x_user_id: Optional[str] = Header(None)):
+    accepted = usage_stats_service.record_usage(x_user_id or "anonymous", feature)
+    return {"feature": feature, "accepted": accepted}
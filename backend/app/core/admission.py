@@ -0,0 +1,229 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (HTTP 方法, 路径前缀, 请求类别)，按顺序匹配，未匹配的请求不受准入控制
+ENDPOINT_CLASSES: List[Tuple[Optional[str], str, str]] = [
+    (None, "/qa/", "interactive"),
+    ("POST", "/documents", "upload"),
+    (None, "/knowledge-graph/build", "batch"),
+    (None, "/knowledge-graph/visualize", "batch"),
+    (None, "/reports/", "batch"),
+]
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, request_class: str, retry_after: int):
+        super().__init__(f"{request_class} queue is full")
+        self.request_class = request_class
+        self.retry_after = retry_after
+
+
+class _ClassState:
+    def __init__(self, name: str, priority: int, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.priority = priority  # 数值越小越优先
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_service_seconds = 1.0  # 处理耗时的指数滑动平均，用于估算 Retry-After
+        self.avg_wait_seconds = 0.0
+
+
+class AdmissionController:
+    """
+    请求准入控制.
+    每个请求类别有独立的并发上限和有界等待队列，所有类别共享 total_slots 个执行名额；
+    名额释放时按优先级 (interactive 先于 upload、batch) 和到达顺序唤醒等待者，
+    队列已满时立即拒绝并给出 Retry-After 估计。运行在事件循环线程内，无需加锁。
+    """
+
+    def __init__(self, total_slots: int, classes: Dict[str, Dict]):
+        self.total_slots = total_slots
+        self.active_total = 0
+        self._classes = {
+            name: _ClassState(name, cfg["priority"], cfg["max_concurrency"], cfg["max_queue"])
+            for name, cfg in classes.items()
+        }
+        self._waiters: List = []
+        self._seq = itertools.count()
+
+    @staticmethod
+    def classify(method: str, path: str) -> Optional[str]:
+        for rule_method, prefix, request_class in ENDPOINT_CLASSES:
+            if (rule_method is None or rule_method == method) and path.startswith(prefix):
+                return request_class
+        return None
+
+    def _can_run(self, state: _ClassState) -> bool:
+        return state.active < state.max_concurrency and self.active_total < self.total_slots
+
+    def _has_priority_waiters(self, state: _ClassState) -> bool:
+        """是否有同级或更高优先级、且此刻能运行的请求在排队"""
+        return any(
+            not future.done() and self._classes[name].priority <= state.priority
+            and self._can_run(self._classes[name])
+            for _, _, name, future in self._waiters
+        )
+
+    def _grant(self, state: _ClassState):
+        state.active += 1
+        state.admitted += 1
+        self.active_total += 1
+
+    def retry_after(self, state: _ClassState) -> int:
+        backlog = state.queued + state.active
+        return max(1, math.ceil(state.avg_service_seconds * backlog / max(state.max_concurrency, 1)))
+
+    async def acquire(self, request_class: str):
+        state = self._classes[request_class]
+        if self._can_run(state) and not self._has_priority_waiters(state):
+            self._grant(state)
+            return
+
+        if state.queued >= state.max_queue:
+            state.rejected += 1
+            raise AdmissionRejected(request_class, self.retry_after(state))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (state.priority, next(self._seq), request_class, future))
+        state.queued += 1
+        enqueued = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            state.rejected += 1
+            raise AdmissionRejected(request_class, self.retry_after(state))
+        except BaseException:
+            # 已被授予名额但调用方取消 (例如客户端断开)，归还名额
+            if future.done() and not future.cancelled():
+                self.release(request_class, 0.0)
+            raise
+        finally:
+            state.queued -= 1
+        waited = time.monotonic() - enqueued
+        state.avg_wait_seconds = 0.8 * state.avg_wait_seconds + 0.2 * waited
+
+    def release(self, request_class: str, service_seconds: float):
+        state = self._classes[request_class]
+        state.active -= 1
+        self.active_total -= 1
+        if service_seconds > 0:
+            state.avg_service_seconds = 0.8 * state.avg_service_seconds + 0.2 * service_seconds
+        self._dispatch()
+
+    def _dispatch(self):
+        """按优先级依次唤醒能够运行的等待者"""
+        skipped = []
+        while self._waiters and self.active_total < self.total_slots:
+            item = heapq.heappop(self._waiters)
+            _, _, name, future = item
+            if future.done():
+                continue
+            state = self._classes[name]
+            if state.active >= state.max_concurrency:
+                skipped.append(item)
+                continue
+            self._grant(state)
+            future.set_result(True)
+        for item in skipped:
+            heapq.heappush(self._waiters, item)
+
+    def snapshot(self) -> Dict:
+        return {
+            "total_slots": self.total_slots,
+            "active_total": self.active_total,
+            "classes": {
+                name: {
+                    "priority": state.priority,
+                    "max_concurrency": state.max_concurrency,
+                    "max_queue": state.max_queue,
+                    "active": state.active,
+                    "queue_depth": state.queued,
+                    "admitted": state.admitted,
+                    "rejected": state.rejected,
+                    "avg_service_seconds": round(state.avg_service_seconds, 3),
+                    "avg_wait_seconds": round(state.avg_wait_seconds, 3),
+                }
+                for name, state in self._classes.items()
+            },
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI 中间件：在整个请求 (包括流式响应) 期间占用准入名额.
+    使用纯 ASGI 而不是 BaseHTTPMiddleware，流式响应发送完毕后才释放名额。
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_class = self.controller.classify(scope["method"], scope["path"])
+        if request_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(request_class)
+        except AdmissionRejected as e:
+            logger.warning(f"Admission rejected ({request_class}): {scope['method']} {scope['path']}")
+            body = json.dumps({"error": f"服务繁忙，请 {e.retry_after} 秒后重试"}, ensure_ascii=False).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(e.retry_after).encode()),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(request_class, time.monotonic() - started)
+
+
+admission_controller = AdmissionController(
+    total_slots=settings.ADMISSION_TOTAL_SLOTS,
+    classes={
+        "interactive": {
+            "priority": 0,
+            "max_concurrency": settings.ADMISSION_INTERACTIVE_CONCURRENCY,
+            "max_queue": settings.ADMISSION_INTERACTIVE_QUEUE,
+        },
+        "upload": {
+            "priority": 1,
+            "max_concurrency": settings.ADMISSION_UPLOAD_CONCURRENCY,
+            "max_queue": settings.ADMISSION_UPLOAD_QUEUE,
+        },
+        "batch": {
+            "priority": 2,
+            "max_concurrency": settings.ADMISSION_BATCH_CONCURRENCY,
+            "max_queue": settings.ADMISSION_BATCH_QUEUE,
+        },
+    },
+)
@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.database import engine
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FlushHook = Callable[[Connection, List[Dict[str, Any]]], None]
+# 事务结束后的回调，第二个参数表示这批记录是否已提交
+DoneHook = Callable[[List[Dict[str, Any]], bool], None]
+
+
+class BatchWriter:
+    """
+    进程内缓冲写入器.
+    调用方只把记录放入内存队列即返回，后台线程按时间间隔或数量阈值
+    将同一张表的记录合并为一次 executemany 批量插入，不阻塞请求路径。
+    """
+
+    def __init__(self, flush_interval: float, max_batch: int, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._hooks: Dict[str, List[FlushHook]] = defaultdict(list)
+        self._done_hooks: Dict[str, List[DoneHook]] = defaultdict(list)
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # 计数在请求线程和后台写入线程中都会更新
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+
+    def register_flush_hook(self, table: Table, hook: FlushHook):
+        """注册在批量插入同一事务内执行的回调 (例如更新预聚合计数)"""
+        self._hooks[table.name].append(hook)
+
+    def register_done_hook(self, table: Table, hook: DoneHook):
+        """注册在批量插入的事务提交或回滚之后执行的回调 (例如扣减尚未落库的计数)"""
+        self._done_hooks[table.name].append(hook)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+            self._thread.start()
+            logger.info("BatchWriter 后台写入线程已启动。")
+
+    def stop(self, timeout: float = 10.0):
+        """停止后台线程，并在退出前写完队列中剩余的记录"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._stop_event.set()
+        thread.join(timeout=timeout)
+        logger.info("BatchWriter 后台写入线程已停止。")
+
+    def submit(self, table: Table, row: Dict[str, Any]) -> bool:
+        """放入写入队列，队列已满时丢弃并返回 False，绝不阻塞调用方"""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            self._count("dropped")
+            logger.warning(f"BatchWriter 队列已满，丢弃 {table.name} 记录。")
+            return False
+        self._count("submitted")
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {**stats, "pending": self.pending()}
+
+    def _run(self):
+        batch: List = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+
+            stopping = self._stop_event.is_set()
+            if len(batch) >= self.max_batch or time.monotonic() >= deadline or stopping:
+                # 顺便取走队列中已就绪的记录，凑满一批
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+                if stopping and self._queue.empty():
+                    return
+
+    def _write(self, batch: List):
+        rows_by_table: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        tables: Dict[str, Table] = {}
+        for table, row in batch:
+            rows_by_table[table.name].append(row)
+            tables[table.name] = table
+
+        for name, rows in rows_by_table.items():
+            try:
+                with engine.begin() as conn:
+                    # 传入参数列表时 SQLAlchemy 使用 executemany
+                    conn.execute(tables[name].insert(), rows)
+                    for hook in self._hooks.get(name, []):
+                        hook(conn, rows)
+                committed = True
+                self._count("written", len(rows))
+            except Exception as e:
+                committed = False
+                self._count("failed", len(rows))
+                logger.error(f"BatchWriter 批量写入 {name} 失败 ({len(rows)} 行): {e}")
+            for hook in self._done_hooks.get(name, []):
+                try:
+                    hook(rows, committed)
+                except Exception as e:
+                    logger.error(f"BatchWriter 写入后回调执行失败 ({name}): {e}")
+        self._count("flushes")
+
+
+batch_writer = BatchWriter(
+    flush_interval=settings.WRITE_BUFFER_FLUSH_INTERVAL,
+    max_batch=settings.WRITE_BUFFER_MAX_BATCH,
+    max_pending=settings.WRITE_BUFFER_MAX_PENDING,
+)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -36,11 +36,124 @@ class Settings(BaseSettings):
     ARENA_MODEL_4_NAME: str = "glm-3-turbo"
     ARENA_MODEL_4_BASE: Optional[str] = None
     ARENA_MODEL_4_KEY: Optional[str] = None
+
+    # 竞技场尾延迟控制
+    ARENA_DEADLINE_SECONDS: float = 30.0  # 整个竞技场请求的截止时间，超时的模型标记为 timeout
+    ARENA_HEDGE_DELAY_SECONDS: float = 10.0  # 超过该时间未返回则发起对冲请求，0 表示关闭
+    ARENA_MAX_WORKERS: int = 16  # 竞技场共享线程池大小 (含对冲请求)
+    ARENA_BREAKER_FAILURE_THRESHOLD: int = 3  # 连续失败/慢调用次数达到即熔断
+    ARENA_BREAKER_COOLDOWN_SECONDS: float = 60.0  # 熔断后的冷却时间
+    ARENA_SLOW_CALL_SECONDS: float = 20.0  # 超过该耗时的成功调用也计为一次失败
+
+    # --- 模型路由配置 (单模型问答) ---
+    ROUTER_DEFAULT_OBJECTIVE: str = "fastest"  # fastest / cheapest / capable
+    ROUTER_WINDOW_SIZE: int = 100  # 每个后端保留最近多少次调用用于统计
+    ROUTER_MIN_SAMPLES: int = 3  # 样本数不足的后端优先试探，以便获得统计
+    ROUTER_MAX_ERROR_RATE: float = 0.5  # 错误率超过该值的后端排到最后
+    ROUTER_MAX_ATTEMPTS: int = 3  # 失败时最多依次尝试的后端数
+    # 每千 token 价格与能力等级，可通过 JSON 格式的环境变量覆盖
+    MODEL_COST_PER_1K_TOKENS: Dict[str, float] = {}
+    MODEL_CAPABILITY_RANK: Dict[str, int] = {"glm-4": 3, "glm-4-air": 2, "glm-4-flash": 1, "glm-3-turbo": 1}
+
+    # --- 准入控制配置 ---
+    # 所有受控请求共享的执行名额；各类别另有并发上限和有界等待队列，队列满时返回 429
+    ADMISSION_TOTAL_SLOTS: int = 8
+    ADMISSION_INTERACTIVE_CONCURRENCY: int = 8  # /qa/* 交互式问答
+    ADMISSION_INTERACTIVE_QUEUE: int = 50
+    ADMISSION_UPLOAD_CONCURRENCY: int = 2  # 文档上传
+    ADMISSION_UPLOAD_QUEUE: int = 20
+    ADMISSION_BATCH_CONCURRENCY: int = 2  # 报告生成、知识图谱构建等批处理
+    ADMISSION_BATCH_QUEUE: int = 10
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 60.0  # 排队超过该时间同样返回 429
+
+    # 管理接口令牌 (X-Admin-Token)，未配置时管理接口一律拒绝访问
+    ADMIN_TOKEN: Optional[str] = None
+    # 未配置令牌时允许本机直连访问管理接口 (仅用于本地开发)；经代理转发的请求仍然拒绝
+    ADMIN_ALLOW_LOOPBACK: bool = False
     # -----------------------
 
     # 通义千问 (旧版原生SDK配置，建议优先使用 OpenAI 兼容配置)
     QWEN_API_KEY: Optional[str] = None
 
+    # --- 异步批量写入配置 (问答记录 / 使用统计) ---
+    WRITE_BUFFER_FLUSH_INTERVAL: float = 2.0  # 秒，定时刷新间隔
+    WRITE_BUFFER_MAX_BATCH: int = 200  # 单次批量插入的最大行数，达到即刷新
+    WRITE_BUFFER_MAX_PENDING: int = 10000  # 内存队列上限，超过后丢弃新记录
+
+    # --- 语义答案缓存配置 ---
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # 问题向量余弦相似度阈值，超过即复用答案
+    SEMANTIC_CACHE_MAX_ENTRIES_PER_DOCUMENT: int = 256
+
+    # --- 多轮对话配置 ---
+    # 改写独立问题、压缩历史所用的廉价模型，留空则使用 OPENAI_MODEL_NAME
+    QA_REWRITE_MODEL_NAME: Optional[str] = None
+    QA_HISTORY_TOKEN_BUDGET: int = 1500  # 最近轮次原文的 token 预算，超出部分折叠进摘要
+    QA_SUMMARY_MAX_TOKENS: int = 400  # 滚动摘要的 token 上限
+    QA_CONVERSATION_TTL_SECONDS: int = 3600
+    QA_MAX_CONVERSATIONS: int = 1000
+
+    # --- 图谱增强检索 ---
+    QA_DEFAULT_RETRIEVAL: str = "vector"  # 单文档问答默认检索方式: vector / graph
+    GRAPH_RETRIEVAL_HOPS: int = 2  # 从问题中的实体出发沿关系扩展的跳数
+    GRAPH_RETRIEVAL_MAX_CHUNKS: int = 3  # 送入模型的片段总数上限 (图谱片段在前，向量片段补足)
+    GRAPH_RETRIEVAL_VECTOR_K: int = 1  # 图谱模式下至少保留的向量检索片段数，兜底召回
+
+    # --- 知识图谱抽取 ---
+    KG_EXTRACT_BATCH_TOKENS: int = 6000  # 单次抽取调用中片段文本的 token 预算，多个片段合并为一次调用
+    KG_EXTRACT_BATCH_MAX_CHUNKS: int = 8  # 单次抽取调用最多包含的片段数
+    KG_EXTRACT_JSON_MODE: bool = True  # 请求 JSON 输出模式 (response_format)，后端不支持时自动退回
+
+    # --- 知识图谱实体规范化 ---
+    ENTITY_MERGE_THRESHOLD: float = 0.93  # 实体名向量余弦相似度阈值，超过才考虑合并
+    ENTITY_MERGE_MIN_OVERLAP: float = 0.6  # 同时要求较短名称至少有这一比例的字符出现在较长名称中
+
+    # --- 多文档对比配置 ---
+    COMPARISON_CHUNKS_PER_DOCUMENT: int = 4  # 每篇文档检索的片段数，决定单篇成本上限
+    COMPARISON_MAX_WORKERS: int = 8  # 并行检索/抽取的线程数
+    COMPARISON_ANSWER_MAX_TOKENS: int = 300  # 汇总时每篇文档要点的 token 上限
+
+    # --- Embedding 模型与在线迁移 ---
+    # 初始 embedding 模型；之后通过 POST /admin/embedding-migrations 切换，生效模型以数据库中已完成的迁移为准
+    EMBEDDING_MODEL_NAME: str = "sentence-transformers/all-mpnet-base-v2"
+    EMBEDDING_MIGRATION_BATCH_SIZE: int = 64  # 后台迁移每批重新计算向量的片段数，每批一个事务并记录检查点
+    EMBEDDING_MIGRATION_THROTTLE_SECONDS: float = 0.2  # 每批之间的休眠时间，限制迁移对在线请求的影响
+    EMBEDDING_MODEL_SYNC_SECONDS: float = 10.0  # 各 worker 检查生效模型是否已被切换的间隔
+
+    # --- 全文检索 (GET /documents/search) ---
+    SEARCH_RANK_WINDOW: int = 2000  # 命中数超过该值时只对最新的这些命中文档做相关度排序 (响应中 truncated=true)，常见词的查询耗时不随命中数增长
+
+    # --- 向量索引持久化与缓存 ---
+    VECTOR_INDEX_DIR: str = "./data/vector_indexes"  # 按内容指纹持久化的 faiss 索引目录
+    VECTOR_INDEX_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # 内存中已加载索引的总字节预算
+    VECTOR_INDEX_MMAP: bool = True  # 以内存映射方式加载索引，多个 worker 共享页缓存
+
+    # --- 报告缓存 ---
+    REPORT_CACHE_DIR: str = "./data/reports"  # 生成好的报告文件目录，按文档内容、标题、格式和模板版本缓存
+    REPORT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 报告缓存总大小上限，超出按最近访问时间淘汰
+
+    # --- 文件上传配置 ---
+    UPLOAD_MAX_BYTES: int = 100 * 1024 * 1024  # 单个上传文件的大小上限
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 流式读取的分块大小
+    UPLOAD_TMP_DIR: Optional[str] = None  # 上传临时文件目录，留空使用系统临时目录
+
+    # --- 批量导入配置 (POST /documents/bulk) ---
+    BULK_UPLOAD_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 单次批量上传 (含 ZIP) 的总大小上限
+    BULK_UPLOAD_MAX_FILES: int = 5000  # 单次批量导入的文件数上限 (ZIP 按成员计)
+    BULK_UPLOAD_MAX_UNCOMPRESSED_BYTES: int = 4 * 1024 * 1024 * 1024  # 单次批量导入解压后的总大小上限，防止 ZIP 炸弹
+    BULK_ZIP_MAX_COMPRESSION_RATIO: int = 100  # ZIP 成员 (解压后超过 1MB 的) 压缩比上限，超过的成员记为失败
+    BULK_INGEST_WORKERS: int = 4  # 并行提取文本的工作进程数
+    BULK_INGEST_BATCH_SIZE: int = 200  # 每个事务批量插入的文档数
+
+    # --- 性能剖析 (X-Profile 请求头 / 慢请求自动采样) ---
+    PROFILE_DIR: str = "./data/profiles"  # 剖析结果目录，按环形缓冲保留最新的结果
+    PROFILE_MAX_ENTRIES: int = 200  # 最多保留的剖析结果数
+    PROFILE_MAX_BYTES: int = 200 * 1024 * 1024  # 剖析结果总大小上限
+    PROFILE_SAMPLE_INTERVAL_SECONDS: float = 0.01  # 按请求头剖析时的调用栈采样间隔
+    SLOW_REQUEST_PROFILE_SECONDS: float = 10.0  # 耗时超过该值的请求自动保存采样结果，0 表示关闭
+    SLOW_REQUEST_SAMPLE_INTERVAL_SECONDS: float = 0.1  # 慢请求自动采样的间隔 (对所有请求生效，间隔较粗以降低开销)
+    SLOW_REQUEST_PROFILE_COOLDOWN_SECONDS: float = 60.0  # 同一接口两次自动保存之间的最小间隔
+
     class Config:
         env_file = ".env"
 
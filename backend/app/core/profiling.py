@@ -0,0 +1,465 @@
+"""
+请求级性能剖析.
+- 管理员请求带上 X-Profile: sample | cprofile 时剖析该请求，响应头 X-Profile-Id 给出结果编号；
+- SLOW_REQUEST_PROFILE_SECONDS 大于 0 时对每个请求按较粗的 SLOW_REQUEST_SAMPLE_INTERVAL_SECONDS 做栈采样，
+  耗时超过阈值才保存，否则丢弃。
+剖析范围是路由函数本身 (instrument_routes 包装各路由的调用)：同步路由在线程池中执行，按所在线程采样；
+异步路由运行在事件循环线程上，只记录栈中含有该请求路由入口的样本，其他请求的协程不会混入，
+cProfile 无法区分协程，异步路由改为采样。依赖项、流式响应体的生成以及路由再提交到其他线程池的任务不在范围内，
+等待它们的时间体现在路由的调用栈上。
+结果按环形缓冲保存在 PROFILE_DIR：采样结果为 speedscope 格式，cProfile 结果为 pstats 格式。
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from types import FrameType
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_MODES = ("sample", "cprofile")
+EXPORT_FORMATS = {"sample": ("speedscope", "collapsed"), "cprofile": ("pstats", "text")}
+_PROFILE_ID = re.compile(r"\d{8}-\d{9}-[0-9a-f]{8}")
+_MAX_STACK_DEPTH = 256
+_MAX_SAMPLES = 100_000
+
+_current: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar("profile_session", default=None)
+
+
+class ProfileSession:
+    """一次请求的剖析状态：路由在各线程上的入口栈帧、采样到的调用栈或各线程的 cProfile 结果"""
+
+    def __init__(self, method: str, path: str, mode: str, trigger: str):
+        self.started_at = time.time()
+        # 编号按时间排序 (精确到毫秒)，环形缓冲据此淘汰最旧的结果
+        self.id = (f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))}"
+                   f"{int(self.started_at * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}")
+        self.method, self.path, self.route = method, path, None
+        self.mode = mode
+        self.trigger = trigger  # header: 管理员按请求头剖析；slow: 慢请求自动采样
+        # 慢请求采样对所有请求生效，用较粗的间隔降低开销
+        self.interval = settings.SLOW_REQUEST_SAMPLE_INTERVAL_SECONDS if trigger == "slow" \
+            else settings.PROFILE_SAMPLE_INTERVAL_SECONDS
+        self.note: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.duration: Optional[float] = None
+        self.frames: Dict[Tuple[str, str, int], int] = {}
+        self.samples: List[Tuple[int, Tuple[int, ...], float]] = []  # (线程, 栈帧编号由外到内, 权重秒)
+        self.profilers: List[cProfile.Profile] = []
+        self.token: Optional[contextvars.Token] = None
+        self._started = self._last_sample = time.perf_counter()
+        self._anchors: Dict[int, FrameType] = {}
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def attach(self, anchor: FrameType, allow_cprofile: bool) -> Optional[cProfile.Profile]:
+        """路由开始执行：登记所在线程和入口栈帧；cprofile 模式下返回已启用的 profiler"""
+        if self.mode == "cprofile":
+            if allow_cprofile:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                    return profiler
+                except ValueError:
+                    # 当前线程已被其他剖析工具占用
+                    pass
+            self.mode = "sample"
+            self.note = "cProfile is not available for this route; sampled instead"
+            StackSampler.get_instance().add(self)
+        with self._lock:
+            self._anchors[threading.get_ident()] = anchor
+        return None
+
+    def detach(self, profiler: Optional[cProfile.Profile]):
+        if profiler is not None:
+            profiler.disable()
+        with self._lock:
+            if profiler is not None:
+                self.profilers.append(profiler)
+            self._anchors.pop(threading.get_ident(), None)
+
+    def due(self, now: float) -> bool:
+        # 容许少量提前，采样线程的唤醒间隔不会与会话间隔完全对齐
+        return now - self._last_sample >= self.interval * 0.9
+
+    def sample(self, frames: Dict[int, FrameType], now: float):
+        with self._lock:
+            if self._finished or len(self.samples) >= _MAX_SAMPLES:
+                return
+            anchors = list(self._anchors.items())
+            # 每个样本计入距上一个样本 (或会话开始) 的时间
+            weight, self._last_sample = now - self._last_sample, now
+            for thread_id, anchor in anchors:
+                stack = _stack_below(frames.get(thread_id), anchor)
+                if stack:
+                    self.samples.append((thread_id, tuple(self._frame_index(frame) for frame in stack), weight))
+
+    def _frame_index(self, frame: FrameType) -> int:
+        code = frame.f_code
+        key = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def finish(self, route: Optional[str]):
+        with self._lock:
+            self._finished = True
+            self.route = route
+            self.duration = time.perf_counter() - self._started
+
+    def describe(self) -> Dict:
+        return {
+            "id": self.id, "method": self.method, "path": self.path, "route": self.route,
+            "status_code": self.status_code, "duration_seconds": round(self.duration or 0.0, 4),
+            "mode": self.mode, "trigger": self.trigger, "note": self.note,
+            "samples": len(self.samples), "created_at": self.started_at,
+        }
+
+
+def _stack_below(frame: Optional[FrameType], anchor: FrameType) -> Optional[List[FrameType]]:
+    """从线程当前栈帧向外回溯到路由入口，返回由外到内的栈帧；入口不在栈上 (线程正在执行别的任务) 时返回 None"""
+    stack = []
+    while frame is not None and len(stack) < _MAX_STACK_DEPTH:
+        if frame is anchor:
+            stack.reverse()
+            return stack
+        stack.append(frame)
+        frame = frame.f_back
+    return None
+
+
+class StackSampler:
+    """后台采样线程：只在有进行中的采样会话时工作，按各会话中最短的间隔唤醒，读取到期会话所在线程的调用栈"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "StackSampler":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._sessions = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, session: ProfileSession):
+        with self._cond:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def remove(self, session: ProfileSession):
+        with self._cond:
+            self._sessions.discard(session)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._sessions:
+                    self._cond.wait()
+                interval = min(session.interval for session in self._sessions)
+            time.sleep(interval)
+            now = time.perf_counter()
+            with self._cond:
+                sessions = [session for session in self._sessions if session.due(now)]
+            if not sessions:
+                continue
+            frames = sys._current_frames()
+            for session in sessions:
+                session.sample(frames, now)
+            del frames
+
+
+def _instrument(call: Callable) -> Callable:
+    # 保持与原函数相同的同步/异步类型，FastAPI 据此决定是否放入线程池执行
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def profiled(*args, **kwargs):
+            session = _current.get()
+            if session is None:
+                return await call(*args, **kwargs)
+            session.attach(sys._getframe(), allow_cprofile=False)
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                session.detach(None)
+    else:
+        @functools.wraps(call)
+        def profiled(*args, **kwargs):
+            session = _current.get()
+            if session is None:
+                return call(*args, **kwargs)
+            profiler = session.attach(sys._getframe(), allow_cprofile=True)
+            try:
+                return call(*args, **kwargs)
+            finally:
+                session.detach(profiler)
+    profiled.__profiled__ = True
+    return profiled
+
+
+def instrument_routes(app: FastAPI):
+    """包装所有路由的调用，使请求的剖析会话能定位到执行路由的线程；需在注册完路由之后调用"""
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not getattr(route.dependant.call, "__profiled__", False):
+            route.dependant.call = _instrument(route.dependant.call)
+
+
+def begin(method: str, path: str, requested_mode: Optional[str]) -> Optional[ProfileSession]:
+    """
+    请求开始时创建剖析会话并设为当前会话，返回 None 表示不剖析.
+    requested_mode 为管理员通过请求头指定的模式 (调用方已完成鉴权)；未指定时按慢请求采样配置决定。
+    """
+    if requested_mode:
+        session = ProfileSession(method, path, requested_mode, "header")
+    elif settings.SLOW_REQUEST_PROFILE_SECONDS > 0:
+        session = ProfileSession(method, path, "sample", "slow")
+    else:
+        return None
+    if session.mode == "sample":
+        StackSampler.get_instance().add(session)
+    session.token = _current.set(session)
+    return session
+
+
+_last_saved: Dict[Tuple[str, str], float] = {}
+_last_saved_lock = threading.Lock()
+
+
+def end(session: ProfileSession, route: Optional[str]):
+    """请求结束：停止采样并恢复当前会话"""
+    session.finish(route)
+    StackSampler.get_instance().remove(session)
+    _current.reset(session.token)
+
+
+def keep(session: ProfileSession, status_code: int) -> bool:
+    """结果是否需要保存：按请求头剖析的总是保存，慢请求按阈值和同一接口的冷却时间决定"""
+    session.status_code = status_code
+    if session.trigger == "header":
+        return True
+    if session.duration < settings.SLOW_REQUEST_PROFILE_SECONDS:
+        return False
+    key = (session.method, session.route or "<unmatched>")
+    now = time.monotonic()
+    with _last_saved_lock:
+        last = _last_saved.get(key)
+        if last is not None and now - last < settings.SLOW_REQUEST_PROFILE_COOLDOWN_SECONDS:
+            return False
+        _last_saved[key] = now
+    logger.warning(f"慢请求 {session.method} {session.path} 耗时 {session.duration:.2f}s，保存采样剖析 {session.id}")
+    return True
+
+
+def to_speedscope(session: ProfileSession) -> Dict:
+    """采样结果转换为 speedscope 文件格式，每个线程一个 sampled profile"""
+    frames = [None] * len(session.frames)
+    for (name, filename, line), index in session.frames.items():
+        frames[index] = {"name": name, "file": filename, "line": line}
+    by_thread: Dict[int, Dict] = {}
+    for thread_id, stack, weight in session.samples:
+        profile = by_thread.setdefault(thread_id, {
+            "type": "sampled", "name": f"{session.method} {session.path} (thread {thread_id})", "unit": "seconds",
+            "startValue": 0, "endValue": 0, "samples": [], "weights": [],
+        })
+        profile["samples"].append(list(stack))
+        profile["weights"].append(round(weight, 6))
+        profile["endValue"] = round(profile["endValue"] + weight, 6)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{session.method} {session.path}",
+        "exporter": "docqa-profiler",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": list(by_thread.values()),
+    }
+
+
+def speedscope_to_collapsed(document: Dict) -> str:
+    """speedscope 结果转换为 collapsed stack 文本 (flamegraph.pl 等工具的输入)，数值为毫秒"""
+    frames = document["shared"]["frames"]
+    totals: Dict[str, float] = {}
+    for profile in document["profiles"]:
+        for stack, weight in zip(profile["samples"], profile["weights"]):
+            key = ";".join(frames[index]["name"] for index in stack)
+            totals[key] = totals.get(key, 0.0) + weight
+    return "".join(f"{key} {max(1, round(value * 1000))}\n" for key, value in sorted(totals.items()))
+
+
+class ProfileStore:
+    """
+    剖析结果的环形缓冲.
+    每个结果由元数据文件 {id}.json 和数据文件 ({id}.speedscope.json 或 {id}.pstats) 组成，
+    编号以时间开头，条数超过 PROFILE_MAX_ENTRIES 或总大小超过 PROFILE_MAX_BYTES 时删除最旧的结果。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "ProfileStore":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(profile_dir=settings.PROFILE_DIR, max_entries=settings.PROFILE_MAX_ENTRIES,
+                                        max_bytes=settings.PROFILE_MAX_BYTES)
+        return cls._instance
+
+    def __init__(self, profile_dir: str, max_entries: int, max_bytes: int):
+        self.profile_dir = profile_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(profile_dir, exist_ok=True)
+
+    @staticmethod
+    def _data_name(profile_id: str, mode: str) -> str:
+        return f"{profile_id}.pstats" if mode == "cprofile" else f"{profile_id}.speedscope.json"
+
+    def _write(self, name: str, writer: Callable[[str], None]):
+        """writer 写入临时文件后原子替换，读取方不会看到写了一半的文件"""
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{name}-", dir=self.profile_dir)
+        os.close(fd)
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, os.path.join(self.profile_dir, name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save(self, session: ProfileSession) -> str:
+        if session.mode == "cprofile":
+            if not session.profilers:
+                # 请求没有执行到路由 (未匹配、被中间件拒绝等)，结果为空的 pstats
+                session.note = session.note or "No route handler ran under cProfile; the profile is empty"
+
+            def write_data(path: str):
+                stats = pstats.Stats(session.profilers[0]) if session.profilers else pstats.Stats()
+                for profiler in session.profilers[1:]:
+                    stats.add(profiler)
+                stats.dump_stats(path)
+        else:
+            def write_data(path: str):
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(to_speedscope(session), f, ensure_ascii=False)
+
+        def write_meta(path: str):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(session.describe(), f, ensure_ascii=False)
+
+        self._write(self._data_name(session.id, session.mode), write_data)
+        # 元数据最后写入，列表中出现的结果一定可以下载
+        self._write(f"{session.id}.json", write_meta)
+        self._prune()
+        return session.id
+
+    def _entries(self) -> Dict[str, int]:
+        """各结果编号及其文件总大小，只统计已写入元数据的结果"""
+        sizes: Dict[str, int] = {}
+        complete = set()
+        for entry in os.scandir(self.profile_dir):
+            profile_id, _, suffix = entry.name.partition(".")
+            if entry.is_file() and _PROFILE_ID.fullmatch(profile_id):
+                sizes[profile_id] = sizes.get(profile_id, 0) + entry.stat().st_size
+                if suffix == "json":
+                    complete.add(profile_id)
+        return {profile_id: size for profile_id, size in sizes.items() if profile_id in complete}
+
+    def _prune(self):
+        with self._lock:
+            entries = self._entries()
+            ids = sorted(entries)
+            total = sum(entries.values())
+            # 至少保留最新的结果，即使它单独超出预算
+            while len(ids) > 1 and (len(ids) > self.max_entries or total > self.max_bytes):
+                oldest = ids.pop(0)
+                for name in (f"{oldest}.json", f"{oldest}.pstats", f"{oldest}.speedscope.json"):
+                    try:
+                        os.remove(os.path.join(self.profile_dir, name))
+                    except FileNotFoundError:
+                        pass
+                total -= entries[oldest]
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        if not _PROFILE_ID.fullmatch(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.profile_dir, f"{profile_id}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def list(self) -> List[Dict]:
+        entries = [self.get(profile_id) for profile_id in sorted(self._entries(), reverse=True)]
+        return [entry for entry in entries if entry is not None]
+
+    def export(self, profile_id: str, format: Optional[str] = None) -> Optional[Tuple[bytes, str, str]]:
+        """
+        按格式导出结果，返回 (内容, media type, 文件名)；结果不存在时返回 None.
+        采样结果支持 speedscope (默认) 和 collapsed，cProfile 结果支持 pstats (默认) 和 text。
+        """
+        meta = self.get(profile_id)
+        if meta is None:
+            return None
+        formats = EXPORT_FORMATS[meta["mode"]]
+        format = format or formats[0]
+        if format not in formats:
+            raise ValueError(f"{meta['mode']} 结果只支持以下格式: {', '.join(formats)}")
+        path = os.path.join(self.profile_dir, self._data_name(profile_id, meta["mode"]))
+        try:
+            if format == "pstats":
+                with open(path, "rb") as f:
+                    return f.read(), "application/octet-stream", f"{profile_id}.pstats"
+            if format == "text":
+                output = io.StringIO()
+                try:
+                    pstats.Stats(path, stream=output).sort_stats("cumulative").print_stats(100)
+                except TypeError:
+                    # pstats 无法加载空的统计数据
+                    output.write(f"{meta.get('note') or 'The profile is empty'}\n")
+                return output.getvalue().encode("utf-8"), "text/plain; charset=utf-8", f"{profile_id}.txt"
+            with open(path, "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        if format == "collapsed":
+            collapsed = speedscope_to_collapsed(json.loads(content))
+            return collapsed.encode("utf-8"), "text/plain; charset=utf-8", f"{profile_id}.collapsed.txt"
+        return content, "application/json", f"{profile_id}.speedscope.json"
+
+    def overview(self) -> Dict:
+        return {
+            "slow_request_threshold_seconds": settings.SLOW_REQUEST_PROFILE_SECONDS,
+            "sample_interval_seconds": settings.PROFILE_SAMPLE_INTERVAL_SECONDS,
+            "slow_request_sample_interval_seconds": settings.SLOW_REQUEST_SAMPLE_INTERVAL_SECONDS,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "profiles": self.list(),
+        }
@@ -0,0 +1,27 @@
+import re
+
+# 中日韩字符大致一字一个 token，其余文本按约 4 个字符一个 token 估算
+_CJK_PATTERN = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数，用于预算控制，无需加载分词器"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """保留文本开头部分，使估算 token 数不超过 max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
@@ -1,14 +1,20 @@
 import logging
+from typing import Optional
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
-# 移除 usage_stats 的导入
-from app.api import documents, questions, qa, knowledge_graph, reports
-from app.core.database import engine, Base
+from app.api import documents, questions, qa, knowledge_graph, reports, usage_stats, admin
+from app.api.deps import admin_denial
+from app.core.database import engine, Base, SessionLocal
 from app.core.config import settings
+from app.core.batch_writer import batch_writer
+from app.core.admission import AdmissionMiddleware, admission_controller
+from app.core import profiling
+from app.services import usage_stats_service, ingestion_service, embedding_migration, search_index
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +22,7 @@ logger = logging.getLogger(__name__)
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
+search_index.ensure_schema(engine)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -23,6 +30,9 @@ app = FastAPI(
     description=settings.PROJECT_DESCRIPTION
 )
 
+# 准入控制：按请求类别限制并发并排队，交互式问答优先于批处理任务
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -35,10 +45,34 @@ app.add_middleware(
 # 包含路由
 app.include_router(documents.router)
 app.include_router(questions.router)
-# 移除 usage_stats.router
+app.include_router(usage_stats.router)
 app.include_router(qa.router)
 app.include_router(knowledge_graph.router)
 app.include_router(reports.router)
+app.include_router(admin.router)
+
+
+@app.on_event("startup")
+def start_background_writers():
+    # 包装路由调用，使剖析会话能定位到执行路由的线程；在启动时执行，覆盖本模块中稍后声明的路由
+    profiling.instrument_routes(app)
+    db = SessionLocal()
+    try:
+        usage_stats_service.rebuild_counters(db)
+        embedding_migration.sync_active_model(db, force=True)
+        search_index.backfill(db)
+    finally:
+        db.close()
+    batch_writer.start()
+    # 接管因重启中断的 embedding 迁移
+    embedding_migration.EmbeddingMigrator.get_instance().start_watchdog()
+
+
+@app.on_event("shutdown")
+def stop_background_writers():
+    # 退出前写完缓冲区中的问答记录和使用统计
+    batch_writer.stop()
+    ingestion_service.shutdown_executor()
 
 # 添加全局异常处理器
 @app.exception_handler(StarletteHTTPException)
@@ -65,20 +99,60 @@ async def general_exception_handler(request, exc):
         content={"error": "Internal server error"}
     )
 
-# 记录所有请求
+def _requested_profile_mode(request: Request) -> Optional[str]:
+    """X-Profile 请求头指定的剖析模式；只接受管理员的请求，其余情况忽略该请求头"""
+    mode = request.headers.get(profiling.PROFILE_HEADER)
+    if not mode:
+        return None
+    mode = mode.strip().lower()
+    reason = admin_denial(request, request.headers.get("x-admin-token"))
+    if reason is None and mode not in profiling.PROFILE_MODES:
+        reason = f"unsupported mode, expected one of {', '.join(profiling.PROFILE_MODES)}"
+    if reason is not None:
+        logger.warning(f"Ignored {profiling.PROFILE_HEADER} header ({mode}): {reason}")
+        return None
+    return mode
+
+
+# 记录所有请求；管理员可用 X-Profile 请求头剖析单个请求，耗时超过阈值的请求自动保存采样剖析
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"Incoming request: {request.method} {request.url}")
+    session = profiling.begin(request.method, request.url.path, _requested_profile_mode(request))
     try:
         response = await call_next(request)
         logger.info(f"Response status: {response.status_code}")
-        return response
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
-        return JSONResponse(
+        response = JSONResponse(
             status_code=500,
             content={"error": "Internal server error"}
         )
+    finally:
+        if session is not None:
+            profiling.end(session, getattr(request.scope.get("route"), "path", None))
+    if session is not None and profiling.keep(session, response.status_code):
+        await run_in_threadpool(profiling.ProfileStore.get_instance().save, session)
+        if session.trigger == "header":
+            response.headers["X-Profile-Id"] = session.id
+    return response
+
+# 在解析 multipart 请求体之前，按 Content-Length 直接拒绝超限的上传
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and request.url.path.startswith("/documents"):
+        content_length = request.headers.get("content-length")
+        max_bytes = settings.BULK_UPLOAD_MAX_BYTES if request.url.path.startswith("/documents/bulk") \
+            else settings.UPLOAD_MAX_BYTES
+        # 预留 multipart 边界和表单头的开销
+        if content_length and content_length.isdigit() \
+                and int(content_length) > max_bytes + 64 * 1024:
+            logger.warning(f"Rejected upload of {content_length} bytes: {request.url.path}")
+            return JSONResponse(
+                status_code=413,
+                content={"error": f"File too large: limit is {max_bytes} bytes"}
+            )
+    return await call_next(request)
 
 @app.get("/")
 async def root():
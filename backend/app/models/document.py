@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary, func
 from app.core.database import Base
 
 
@@ -9,4 +9,23 @@ class Document(Base):
     filename = Column(String, index=True)
     content = Column(Text)
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class DocumentChunk(Base):
+    """文档向量检索片段的清单，片段按内容指纹寻址，用于增量更新和回收片段向量"""
+    __tablename__ = "document_chunks"
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    chunk_index = Column(Integer)
+    chunk_hash = Column(String, index=True)
+
+
+class ChunkEmbedding(Base):
+    """按 (向量模型, 片段内容指纹) 缓存的片段向量 (float32 字节)，内容不变的片段不再重复计算"""
+    __tablename__ = "chunk_embeddings"
+
+    model = Column(String, primary_key=True)
+    chunk_hash = Column(String, primary_key=True)
+    vector = Column(LargeBinary)
+    created_at = Column(DateTime, default=func.now())
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from app.core.database import Base
+
+
+class EmbeddingMigration(Base):
+    """
+    Embedding 模型迁移任务.
+    按 document_chunks.id 顺序为目标模型计算片段向量，checkpoint 记录已处理到的清单行，
+    中断后从检查点继续；状态变为 completed 的同一事务即切换生效模型。
+    """
+    __tablename__ = "embedding_migrations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_model = Column(String, nullable=False)
+    target_model = Column(String, nullable=False)
+    status = Column(String, nullable=False, index=True)  # running / paused / cancelled / failed / completed
+    total_chunks = Column(Integer, nullable=False, default=0)
+    done_chunks = Column(Integer, nullable=False, default=0)
+    checkpoint = Column(Integer, nullable=False, default=0)  # 已处理到的 document_chunks.id
+    owner = Column(String, nullable=True)  # 当前执行线程的标识，暂停或被其他 worker 接管后旧线程自行退出
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())  # 兼作执行线程的心跳
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,66 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary, func
+from app.core.database import Base
+
+
+class GraphExtraction(Base):
+    """按片段内容指纹缓存的 LLM 抽取结果 (JSON)，内容不变的片段不再重复调用 LLM"""
+    __tablename__ = "kg_extractions"
+
+    chunk_hash = Column(String, primary_key=True)
+    result = Column(Text)
+    created_at = Column(DateTime, default=func.now())
+
+
+class GraphChunk(Base):
+    """参与图谱抽取的文档片段"""
+    __tablename__ = "kg_chunks"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    chunk_index = Column(Integer)
+    chunk_hash = Column(String, index=True)
+    content = Column(Text)
+
+
+class EntityMention(Base):
+    """实体倒排索引：实体 -> 提到它的片段"""
+    __tablename__ = "kg_entity_mentions"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, index=True)
+    document_id = Column(Integer, index=True)
+    chunk_id = Column(Integer, ForeignKey("kg_chunks.id"), index=True)
+
+
+class GraphRelation(Base):
+    """持久化的图谱边，每条记录对应一次抽取出的关系"""
+    __tablename__ = "kg_relations"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, index=True)
+    chunk_id = Column(Integer, ForeignKey("kg_chunks.id"), index=True)
+    source = Column(String, index=True)
+    target = Column(String, index=True)
+    relation = Column(String)
+
+
+class CanonicalEntity(Base):
+    """合并后的规范实体及其名称向量 (float32 字节)，用于增量合并新实体"""
+    __tablename__ = "kg_canonical_entities"
+
+    name = Column(String, primary_key=True)
+    norm_key = Column(String, index=True)
+    vector = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+
+class EntityAlias(Base):
+    """抽取出的原始实体名 -> 规范实体名"""
+    __tablename__ = "kg_entity_aliases"
+
+    alias = Column(String, primary_key=True)
+    canonical = Column(String, index=True)
+    created_at = Column(DateTime, default=func.now())
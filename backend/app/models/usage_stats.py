@@ -8,4 +8,13 @@ class UsageStats(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, index=True)
     feature = Column(String)  # 使用的功能
-    created_at = Column(DateTime, default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime, default=func.now())
+
+
+class UsageCounter(Base):
+    """按功能预聚合的使用次数，随批量写入同一事务更新"""
+    __tablename__ = "usage_counters"
+
+    feature = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -30,4 +30,19 @@ class Document(DocumentInDBBase):
 
 
 class DocumentResponse(DocumentInDBBase):
-    pass
\ No newline at end of file
+    pass
+
+
+class DocumentSearchHit(BaseModel):
+    id: int
+    filename: str
+    score: float  # bm25 相关度，越大越相关
+    snippet: str  # 命中词用 <mark></mark> 标出的正文片段
+    created_at: Optional[datetime] = None
+
+
+class DocumentSearchResponse(BaseModel):
+    query: str
+    results: List[DocumentSearchHit]
+    # 命中数超过 SEARCH_RANK_WINDOW 时只对最新的命中文档排序，更早的文档可能未出现在结果中
+    truncated: bool = False
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Dict
 
 
 class UsageStatsBase(BaseModel):
@@ -20,4 +21,9 @@ class UsageStatsInDBBase(UsageStatsBase):
 
 
 class UsageStats(UsageStatsInDBBase):
-    pass
\ No newline at end of file
+    pass
+
+class UsageStatsSummary(BaseModel):
+    total: int
+    by_feature: Dict[str, int]
+    pending_writes: int
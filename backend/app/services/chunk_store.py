@@ -0,0 +1,131 @@
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.document import DocumentChunk, ChunkEmbedding
+from app.services.document_service import compute_content_hash
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def content_defined_chunks(text: str, max_size: int, min_size: int, divisor: int = 3) -> List[str]:
+    """
+    按内容决定边界的切分.
+    以段落为单位装箱，片段达到 min_size 后，是否在某段之后切开只取决于该段内容的哈希，
+    只有超过 max_size 时才被迫切开；因此修改一段只会改变它附近的片段，后面的边界很快重新对齐，
+    不会像顺序装箱那样让之后所有片段整体错位。超长的段落单独按 max_size 再切。
+    """
+    paragraphs = []
+    for paragraph in (text or "").split("\n\n"):
+        paragraph = paragraph.strip()
+        if len(paragraph) > max_size:
+            paragraphs.extend(RecursiveCharacterTextSplitter(chunk_size=max_size, chunk_overlap=0)
+                              .split_text(paragraph))
+        elif paragraph:
+            paragraphs.append(paragraph)
+
+    chunks, current, size = [], [], 0
+    for paragraph in paragraphs:
+        if current and size + 2 + len(paragraph) > max_size:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + (2 if size else 0)
+        digest = hashlib.md5(paragraph.encode("utf-8")).digest()
+        if size >= min_size and int.from_bytes(digest[:4], "little") % divisor == 0:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def split_for_embedding(content: str) -> List[str]:
+    """向量检索的切分方式；片段按内容指纹寻址，修改文档只影响改动所在的片段"""
+    return content_defined_chunks(content, max_size=1000, min_size=300)
+
+
+def embed_chunks(chunks: List[str], embeddings, model: str) -> List[List[float]]:
+    """
+    返回与 chunks 一一对应的向量.
+    向量按 (模型名, 片段指纹) 缓存，已缓存的片段直接读取，只有新片段调用 embedding 模型，新向量写回 chunk_embeddings。
+    使用独立的短会话：多文档对比等场景会在多个线程中同时调用，不能共用调用方 (请求) 的会话。
+    """
+    hashes = [compute_content_hash(chunk) for chunk in chunks]
+    cached: Dict[str, np.ndarray] = {}
+    unique = list(set(hashes))
+    db = SessionLocal()
+    try:
+        for start in range(0, len(unique), 500):
+            for chunk_hash, blob in db.query(ChunkEmbedding.chunk_hash, ChunkEmbedding.vector).filter(
+                    ChunkEmbedding.model == model, ChunkEmbedding.chunk_hash.in_(unique[start:start + 500])):
+                cached[chunk_hash] = np.frombuffer(blob, dtype=np.float32)
+        # 计算向量期间不占用连接
+        db.rollback()
+
+        missing: Dict[str, str] = {}
+        for chunk_hash, chunk in zip(hashes, chunks):
+            if chunk_hash not in cached:
+                missing.setdefault(chunk_hash, chunk)
+        if missing:
+            vectors = embeddings.embed_documents(list(missing.values()))
+            fresh = {chunk_hash: np.asarray(vector, dtype=np.float32) for chunk_hash, vector in zip(missing, vectors)}
+            db.execute(sqlite_insert(ChunkEmbedding).values([
+                {"model": model, "chunk_hash": chunk_hash, "vector": vector.tobytes()}
+                for chunk_hash, vector in fresh.items()
+            ]).on_conflict_do_nothing(index_elements=["model", "chunk_hash"]))
+            db.commit()
+            cached.update(fresh)
+    finally:
+        db.close()
+    logger.info(f"片段向量: {len(chunks)} 个片段, 新计算 {len(missing)} 个")
+    return [cached[chunk_hash].tolist() for chunk_hash in hashes]
+
+
+def chunk_rows(document_id: int, content: str) -> List[DocumentChunk]:
+    return [
+        DocumentChunk(document_id=document_id, chunk_index=index, chunk_hash=compute_content_hash(chunk))
+        for index, chunk in enumerate(split_for_embedding(content))
+    ]
+
+
+def chunk_hashes(content: Optional[str]) -> Set[str]:
+    return {compute_content_hash(chunk) for chunk in split_for_embedding(content)}
+
+
+def sync_document_chunks(db: Session, document_id: int, content: str,
+                         previous_content: Optional[str] = None) -> Dict[str, Set[str]]:
+    """
+    按新内容重写文档的片段清单，返回新增、不再被该文档引用和未变的片段指纹.
+    旧片段取清单与 previous_content 切分结果的并集，清单缺失的旧文档同样能回收。
+    """
+    old = {row.chunk_hash for row in db.query(DocumentChunk.chunk_hash).filter(DocumentChunk.document_id == document_id)}
+    if previous_content is not None:
+        old |= chunk_hashes(previous_content)
+    rows = chunk_rows(document_id, content)
+    new = {row.chunk_hash for row in rows}
+    db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete(synchronize_session=False)
+    db.add_all(rows)
+    db.commit()
+    return {"added": new - old, "removed": old - new, "unchanged": old & new}
+
+
+def release_chunk_embeddings(db: Session, hashes: Iterable[str]) -> int:
+    """删除不再被任何文档清单引用的片段向量，返回删除的片段数"""
+    hashes = list(set(hashes))
+    if not hashes:
+        return 0
+    referenced = {row.chunk_hash for row in db.query(DocumentChunk.chunk_hash).filter(DocumentChunk.chunk_hash.in_(hashes))}
+    orphaned = [chunk_hash for chunk_hash in hashes if chunk_hash not in referenced]
+    if orphaned:
+        db.query(ChunkEmbedding).filter(ChunkEmbedding.chunk_hash.in_(orphaned)).delete(synchronize_session=False)
+        db.commit()
+    return len(orphaned)
@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.tokens import estimate_tokens
+
+
+class ConversationState:
+    """
+    单个会话在服务端保存的状态.
+    较早的轮次被折叠进 summary，turns 只保留最近的原文，整体受 token 预算约束。
+    """
+
+    def __init__(self, conversation_id: str, document_id: Optional[int]):
+        self.conversation_id = conversation_id
+        self.document_id = document_id
+        self.summary = ""
+        self.turns: List[Dict[str, str]] = []
+        self.updated_at = time.time()
+        self.lock = threading.Lock()
+        # 串行化摘要折叠，避免并发折叠互相覆盖
+        self.summary_lock = threading.Lock()
+
+    def append(self, role: str, content: str):
+        self.turns.append({"role": role, "content": content})
+        self.updated_at = time.time()
+
+    def turns_tokens(self) -> int:
+        return sum(estimate_tokens(turn["content"]) for turn in self.turns)
+
+    def pop_overflow(self, token_budget: int) -> List[Dict[str, str]]:
+        """取出超出预算的最早轮次 (成对的问答一起取出)，留给调用方折叠进摘要"""
+        overflow = []
+        while len(self.turns) > 2 and self.turns_tokens() > token_budget:
+            overflow.extend(self.turns[:2])
+            del self.turns[:2]
+        return overflow
+
+
+class ConversationStore:
+    """进程内的会话状态存储，按最近使用淘汰并在超时后过期"""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "ConversationStore":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        max_conversations=settings.QA_MAX_CONVERSATIONS,
+                        ttl_seconds=settings.QA_CONVERSATION_TTL_SECONDS,
+                    )
+        return cls._instance
+
+    def __init__(self, max_conversations: int, ttl_seconds: int):
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        self._states: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: Optional[str], document_id: Optional[int]) -> Optional[ConversationState]:
+        if not conversation_id:
+            return None
+        with self._lock:
+            self._expire()
+            state = self._states.get(conversation_id)
+            if state is None or state.document_id != document_id:
+                return None
+            self._states.move_to_end(conversation_id)
+            return state
+
+    def create(self, document_id: Optional[int]) -> ConversationState:
+        state = ConversationState(uuid.uuid4().hex, document_id)
+        with self._lock:
+            self._states[state.conversation_id] = state
+            while len(self._states) > self.max_conversations:
+                self._states.popitem(last=False)
+        return state
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            return self._states.pop(conversation_id, None) is not None
+
+    def _expire(self):
+        deadline = time.time() - self.ttl_seconds
+        while self._states:
+            oldest_id, oldest = next(iter(self._states.items()))
+            if oldest.updated_at >= deadline:
+                break
+            del self._states[oldest_id]
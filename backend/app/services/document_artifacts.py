@@ -0,0 +1,104 @@
+"""
+文档派生数据 (片段向量、向量索引、图谱抽取与索引、问答记录) 的增量维护与回收.
+片段都按内容指纹寻址：修改文档时未变的片段复用已有向量和抽取结果，
+不再被任何文档引用的片段向量、抽取结果和向量索引随之删除。
+"""
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.models.document import Document, DocumentChunk
+from app.models.question import Question
+from app.models.knowledge_graph import GraphExtraction, GraphChunk, EntityMention, GraphRelation
+from app.services import chunk_store, embedding_migration
+from app.services.document_service import compute_content_hash
+from app.services.vector_index_cache import VectorIndexCache
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _graph_chunk_hashes(db: Session, document_id: int) -> Set[str]:
+    return {row.chunk_hash for row in db.query(GraphChunk.chunk_hash).filter(GraphChunk.document_id == document_id)}
+
+
+def release_graph_extractions(db: Session, hashes: Iterable[str]) -> int:
+    """删除不再被任何文档图谱片段引用的抽取结果，返回删除数"""
+    hashes = list(set(hashes))
+    if not hashes:
+        return 0
+    referenced = {row.chunk_hash for row in db.query(GraphChunk.chunk_hash).filter(GraphChunk.chunk_hash.in_(hashes))}
+    orphaned = [chunk_hash for chunk_hash in hashes if chunk_hash not in referenced]
+    if orphaned:
+        db.query(GraphExtraction).filter(GraphExtraction.chunk_hash.in_(orphaned)).delete(synchronize_session=False)
+        db.commit()
+    return len(orphaned)
+
+
+def release_vector_index(db: Session, document_id: int, content: Optional[str]) -> bool:
+    """没有其他文档使用相同内容时，删除该内容对应的持久化向量索引"""
+    shared = db.query(Document.id).filter(Document.id != document_id, Document.content == content).first()
+    if shared:
+        return False
+    # 迁移前后各模型的索引都要删除
+    content_hash = compute_content_hash(content)
+    for model in embedding_migration.known_models(db):
+        VectorIndexCache.get_instance().remove(VectorIndexCache.key_for(content_hash, model))
+    return True
+
+
+def refresh_document(db: Session, document: Document, old_content: Optional[str]) -> Dict:
+    """
+    文档内容修改后的增量更新 (不调用 LLM):
+    片段清单按新内容重写，向量索引用缓存的片段向量重建，只为新增或改动的片段计算向量；
+    已构建过图谱的文档按缓存的抽取结果重建图谱索引，改动的片段在下次构建图谱时才抽取；
+    最后回收旧内容独有的片段向量、抽取结果和向量索引。
+    """
+    # 延迟导入，避免与 qa_service / knowledge_graph_service 循环依赖
+    from app.services.qa_service import QAService
+    from app.services.knowledge_graph_service import KnowledgeGraphService
+
+    chunks = chunk_store.sync_document_chunks(db, document.id, document.content, previous_content=old_content)
+    stats = {key: len(hashes) for key, hashes in chunks.items()}
+    try:
+        QAService(db)._build_vector_store(document.content)
+    except Exception as e:
+        # 向量索引会在下次问答时按需构建
+        logger.error(f"文档 {document.id} 的向量索引重建失败: {e}")
+
+    old_graph_hashes = _graph_chunk_hashes(db, document.id)
+    if old_graph_hashes:
+        KnowledgeGraphService(db)._extract_document(document, use_llm=False, force_index=True)
+        stats["graph_extractions_released"] = release_graph_extractions(
+            db, old_graph_hashes - _graph_chunk_hashes(db, document.id))
+
+    stats["embeddings_released"] = chunk_store.release_chunk_embeddings(db, chunks["removed"])
+    stats["vector_index_released"] = release_vector_index(db, document.id, old_content)
+    logger.info(f"文档 {document.id} 增量更新: {stats}")
+    return stats
+
+
+def purge_document(db: Session, document: Document) -> Dict:
+    """删除文档前清理它的问答记录、图谱索引和片段清单，并回收不再被引用的派生数据 (不提交文档删除)"""
+    chunk_hashes = chunk_store.chunk_hashes(document.content) | {
+        row.chunk_hash for row in db.query(DocumentChunk.chunk_hash).filter(DocumentChunk.document_id == document.id)
+    }
+    graph_hashes = _graph_chunk_hashes(db, document.id)
+
+    questions = db.query(Question).filter(Question.document_id == document.id).delete(synchronize_session=False)
+    db.query(EntityMention).filter(EntityMention.document_id == document.id).delete(synchronize_session=False)
+    db.query(GraphRelation).filter(GraphRelation.document_id == document.id).delete(synchronize_session=False)
+    db.query(GraphChunk).filter(GraphChunk.document_id == document.id).delete(synchronize_session=False)
+    db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).delete(synchronize_session=False)
+    db.commit()
+
+    stats = {
+        "questions": questions,
+        "embeddings_released": chunk_store.release_chunk_embeddings(db, chunk_hashes),
+        "graph_extractions_released": release_graph_extractions(db, graph_hashes),
+        "vector_index_released": release_vector_index(db, document.id, document.content),
+    }
+    logger.info(f"文档 {document.id} 删除，回收派生数据: {stats}")
+    return stats
@@ -1,6 +1,15 @@
+import hashlib
+from typing import Optional
 from sqlalchemy.orm import Session
 from app.models.document import Document
 from app.schemas.document import DocumentCreate, DocumentUpdate
+from app.services.semantic_cache import SemanticAnswerCache
+from app.services import search_index
+
+
+def compute_content_hash(content: Optional[str]) -> str:
+    """文档内容指纹，用于判断缓存及派生数据是否过期"""
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
 
 
 def get_document(db: Session, document_id: int):
@@ -12,26 +21,46 @@ def get_documents(db: Session, skip: int = 0, limit: int = 100):
 
 
 def create_document(db: Session, document: DocumentCreate):
+    from app.services import chunk_store
+
     db_document = Document(filename=document.filename, content=document.content)
     db.add(db_document)
+    db.flush()
+    # 同一事务写入片段清单和全文索引
+    db.add_all(chunk_store.chunk_rows(db_document.id, document.content))
+    search_index.index_documents(db, [(db_document.id, document.filename, document.content)])
     db.commit()
     db.refresh(db_document)
     return db_document
 
 
 def update_document(db: Session, document_id: int, document: DocumentUpdate):
+    # 延迟导入：document_artifacts 依赖 qa_service，而 qa_service 依赖本模块
+    from app.services import document_artifacts
+
     db_document = db.query(Document).filter(Document.id == document_id).first()
     if db_document:
+        old_content = db_document.content
         db_document.filename = document.filename
         db_document.content = document.content
+        search_index.index_documents(db, [(document_id, document.filename, document.content)])
         db.commit()
         db.refresh(db_document)
+        SemanticAnswerCache.get_instance().invalidate_document(document_id)
+        if old_content != document.content:
+            # 只为改动的片段重新计算向量，并回收旧内容独有的派生数据
+            document_artifacts.refresh_document(db, db_document, old_content)
     return db_document
 
 
 def delete_document(db: Session, document_id: int):
+    from app.services import document_artifacts
+
     db_document = db.query(Document).filter(Document.id == document_id).first()
     if db_document:
+        document_artifacts.purge_document(db, db_document)
         db.delete(db_document)
+        search_index.remove_documents(db, [document_id])
         db.commit()
+        SemanticAnswerCache.get_instance().invalidate_document(document_id)
     return db_document
\ No newline at end of file
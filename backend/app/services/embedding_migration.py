@@ -0,0 +1,361 @@
+"""
+Embedding 模型的在线迁移.
+片段向量按 (模型, 片段指纹) 存储、向量索引按 (内容指纹, 模型) 存储，新旧模型的数据互不覆盖。
+迁移任务在后台线程中按 document_chunks 顺序分批为目标模型计算片段向量，每批一个事务并记录检查点，
+批与批之间休眠限流；期间问答始终使用旧模型和旧索引。全部片段完成后，在同一事务中
+更新规范实体向量并把任务标记为 completed，即原子地切换生效模型；新模型的向量索引在首次访问时
+直接由已算好的片段向量组装，不再调用模型。其他 worker 按 EMBEDDING_MODEL_SYNC_SECONDS 跟进切换。
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import exists, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.document import Document, DocumentChunk
+from app.models.embedding_migration import EmbeddingMigration
+from app.models.knowledge_graph import CanonicalEntity
+from app.services import chunk_store
+from app.services.document_service import compute_content_hash
+from app.services.entity_canonicalizer import EntityCanonicalizer
+from app.services.semantic_cache import SemanticAnswerCache
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 执行线程每批片段 (完成阶段每块规范实体) 更新一次心跳，超过该时间没有心跳的 running 任务视为执行进程已退出，由其他 worker 接管
+_LEASE_SECONDS = 120
+_ENTITY_BATCH_SIZE = 256
+
+_sync_lock = threading.Lock()
+_last_sync: Optional[float] = None
+
+
+def active_model_in_db(db: Session) -> str:
+    """最近一次完成的迁移的目标模型；从未迁移过时为 EMBEDDING_MODEL_NAME"""
+    row = db.query(EmbeddingMigration.target_model).filter(EmbeddingMigration.status == "completed") \
+        .order_by(EmbeddingMigration.finished_at.desc(), EmbeddingMigration.id.desc()).first()
+    return row.target_model if row else settings.EMBEDDING_MODEL_NAME
+
+
+def known_models(db: Session) -> Set[str]:
+    """可能存有向量或索引的所有模型 (生效模型和所有迁移涉及的模型)"""
+    # 延迟导入，避免与 qa_service 循环依赖
+    from app.services.qa_service import EmbeddingManager
+    models = {settings.EMBEDDING_MODEL_NAME, EmbeddingManager.active_model()}
+    for source, target in db.query(EmbeddingMigration.source_model, EmbeddingMigration.target_model):
+        models.update((source, target))
+    return models
+
+
+def _switch_local(model: str):
+    """在当前进程中切换生效模型，并丢弃与旧模型向量绑定的内存状态"""
+    from app.services.qa_service import EmbeddingManager
+    EmbeddingManager.activate(model)
+    SemanticAnswerCache.get_instance().clear()
+    EntityCanonicalizer.get_instance().reset()
+
+
+def sync_active_model(db: Session, force: bool = False):
+    """按间隔检查数据库中的生效模型，其他 worker 完成迁移后在本进程跟进切换"""
+    global _last_sync
+    from app.services.qa_service import EmbeddingManager
+    now = time.monotonic()
+    if not force and _last_sync is not None and now - _last_sync < settings.EMBEDDING_MODEL_SYNC_SECONDS:
+        return
+    with _sync_lock:
+        if not force and _last_sync is not None and now - _last_sync < settings.EMBEDDING_MODEL_SYNC_SECONDS:
+            return
+        _last_sync = now
+        model = active_model_in_db(db)
+        if model != EmbeddingManager.active_model():
+            try:
+                _switch_local(model)
+            except Exception as e:
+                # 加载失败时继续使用当前模型，下个间隔再试
+                logger.error(f"切换到 embedding 模型 {model} 失败: {e}")
+
+
+def backfill_chunk_manifests(db: Session) -> int:
+    """为还没有片段清单的文档 (清单引入之前导入的) 补写清单，返回补写的文档数"""
+    count = 0
+    while True:
+        documents = db.query(Document.id, Document.content).filter(
+            ~exists().where(DocumentChunk.document_id == Document.id)
+        ).limit(200).all()
+        documents = [(document_id, content) for document_id, content in documents if content]
+        if not documents:
+            return count
+        for document_id, content in documents:
+            db.add_all(chunk_store.chunk_rows(document_id, content))
+        db.commit()
+        count += len(documents)
+
+
+def describe(row: EmbeddingMigration) -> Dict:
+    """迁移任务的进度：完成比例、平均速度 (片段/秒) 和预计剩余时间"""
+    total = max(row.total_chunks or 0, row.done_chunks or 0)
+    end = row.finished_at or row.updated_at or row.created_at
+    elapsed = (end - row.created_at).total_seconds() if end and row.created_at else 0.0
+    rate = row.done_chunks / elapsed if elapsed > 0 else 0.0
+    remaining = total - row.done_chunks
+    return {
+        "id": row.id,
+        "source_model": row.source_model,
+        "target_model": row.target_model,
+        "status": row.status,
+        "total_chunks": total,
+        "done_chunks": row.done_chunks,
+        "percent": round(100.0 * row.done_chunks / total, 1) if total else 100.0,
+        "chunks_per_second": round(rate, 2),
+        "eta_seconds": round(remaining / rate, 1) if row.status == "running" and rate > 0 else None,
+        "checkpoint": row.checkpoint,
+        "error": row.error,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "finished_at": row.finished_at,
+    }
+
+
+class EmbeddingMigrator:
+    """
+    迁移任务的执行者 (每个进程一个).
+    任务状态保存在 embedding_migrations 表中，暂停、继续和取消只修改状态，执行线程每批开始前检查；
+    认领任务时写入新的 owner，旧线程发现 owner 不是自己即退出，保证同一任务只有一个线程在执行。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "EmbeddingMigrator":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._watchdog: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def overview(self, db: Session) -> Dict:
+        from app.services.qa_service import EmbeddingManager
+        sync_active_model(db)
+        rows = db.query(EmbeddingMigration).order_by(EmbeddingMigration.id.desc()).all()
+        return {"active_model": EmbeddingManager.active_model(), "migrations": [describe(row) for row in rows]}
+
+    def get(self, db: Session, migration_id: int) -> Optional[Dict]:
+        row = db.get(EmbeddingMigration, migration_id)
+        return describe(row) if row else None
+
+    def start(self, db: Session, target_model: str) -> Dict:
+        """创建迁移任务并在后台开始执行；已有未结束的任务或目标就是当前模型时抛出 ValueError"""
+        target_model = (target_model or "").strip()
+        if not target_model:
+            raise ValueError("target_model is required")
+        source_model = active_model_in_db(db)
+        if target_model == source_model:
+            raise ValueError(f"{target_model} is already the active embedding model")
+        unfinished = db.query(EmbeddingMigration.id).filter(
+            EmbeddingMigration.status.in_(("running", "paused"))).first()
+        if unfinished:
+            raise ValueError(f"Embedding migration {unfinished.id} is still unfinished")
+
+        backfill_chunk_manifests(db)
+        now = datetime.utcnow()
+        owner = uuid.uuid4().hex
+        row = EmbeddingMigration(
+            source_model=source_model, target_model=target_model, status="running", owner=owner,
+            total_chunks=db.query(DocumentChunk.id).count(), created_at=now, updated_at=now,
+        )
+        db.add(row)
+        db.commit()
+        logger.info(f"开始 embedding 迁移 {row.id}: {source_model} -> {target_model}, 共 {row.total_chunks} 个片段")
+        self._launch(row.id, owner)
+        return describe(row)
+
+    def pause(self, db: Session, migration_id: int) -> Optional[Dict]:
+        return self._transition(db, migration_id, ("running",), "paused")
+
+    def cancel(self, db: Session, migration_id: int) -> Optional[Dict]:
+        # 已为目标模型算好的片段向量保留，之后再迁移到同一模型时直接复用
+        return self._transition(db, migration_id, ("running", "paused", "failed"), "cancelled")
+
+    def resume(self, db: Session, migration_id: int) -> Optional[Dict]:
+        """从检查点继续暂停或失败的任务"""
+        owner = uuid.uuid4().hex
+        result = self._transition(db, migration_id, ("paused", "failed"), "running", owner=owner, error=None)
+        if result is not None:
+            self._launch(migration_id, owner)
+        return result
+
+    def _transition(self, db: Session, migration_id: int, allowed, status: str, **values) -> Optional[Dict]:
+        row = db.get(EmbeddingMigration, migration_id)
+        if row is None:
+            return None
+        updated = db.query(EmbeddingMigration).filter(
+            EmbeddingMigration.id == migration_id, EmbeddingMigration.status.in_(allowed)
+        ).update({"status": status, "owner": values.pop("owner", None), "updated_at": datetime.utcnow(), **values},
+                 synchronize_session=False)
+        db.commit()
+        if not updated:
+            raise ValueError(f"Cannot change embedding migration {migration_id} from {row.status} to {status}")
+        db.refresh(row)
+        logger.info(f"embedding 迁移 {migration_id} 状态变为 {status}")
+        return describe(row)
+
+    def start_watchdog(self):
+        """启动守护线程：定期接管心跳超时的 running 任务 (执行它的进程已退出，例如服务重启)"""
+        with self._lock:
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch, name="embedding-migration-watchdog", daemon=True)
+                self._watchdog.start()
+
+    def _watch(self):
+        while True:
+            try:
+                self._claim_stale()
+            except Exception as e:
+                logger.error(f"检查中断的 embedding 迁移失败: {e}")
+            time.sleep(_LEASE_SECONDS / 2)
+
+    def _claim_stale(self):
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=_LEASE_SECONDS)
+            stale = db.query(EmbeddingMigration.id).filter(
+                EmbeddingMigration.status == "running",
+                or_(EmbeddingMigration.updated_at.is_(None), EmbeddingMigration.updated_at < cutoff),
+            ).all()
+            for (migration_id,) in stale:
+                owner = uuid.uuid4().hex
+                # 条件更新保证多个 worker 同时检查时只有一个认领成功
+                claimed = db.query(EmbeddingMigration).filter(
+                    EmbeddingMigration.id == migration_id, EmbeddingMigration.status == "running",
+                    or_(EmbeddingMigration.updated_at.is_(None), EmbeddingMigration.updated_at < cutoff),
+                ).update({"owner": owner, "updated_at": datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    logger.info(f"接管中断的 embedding 迁移 {migration_id}，从检查点继续")
+                    self._launch(migration_id, owner)
+        finally:
+            db.close()
+
+    def _launch(self, migration_id: int, owner: str):
+        threading.Thread(target=self._run, args=(migration_id, owner),
+                         name=f"embedding-migration-{migration_id}", daemon=True).start()
+
+    def _run(self, migration_id: int, owner: str):
+        from app.services.qa_service import EmbeddingManager
+        db = SessionLocal()
+        try:
+            row = db.get(EmbeddingMigration, migration_id)
+            embeddings = EmbeddingManager.get_embeddings(row.target_model)
+            while True:
+                db.refresh(row)
+                if row.status != "running" or row.owner != owner:
+                    logger.info(f"embedding 迁移 {migration_id} 状态为 {row.status}，执行线程退出")
+                    return
+                batch = db.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.chunk_hash) \
+                    .filter(DocumentChunk.id > row.checkpoint).order_by(DocumentChunk.id) \
+                    .limit(settings.EMBEDDING_MIGRATION_BATCH_SIZE).all()
+                if not batch:
+                    self._complete(db, row, owner, embeddings)
+                    return
+                self._embed_batch(db, batch, embeddings, row.target_model)
+                # 检查点、进度和心跳与本批向量分开提交；中断后重做的一批向量会被 on_conflict 忽略
+                checkpoint = batch[-1].id
+                remaining = db.query(DocumentChunk.id).filter(DocumentChunk.id > checkpoint).count()
+                done = EmbeddingMigration.done_chunks + len(batch)
+                if not self._renew(db, migration_id, owner, checkpoint=checkpoint, done_chunks=done,
+                                   total_chunks=done + remaining):
+                    logger.info(f"embedding 迁移 {migration_id} 已被暂停、取消或由其他 worker 接管，执行线程退出")
+                    return
+                time.sleep(settings.EMBEDDING_MIGRATION_THROTTLE_SECONDS)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"embedding 迁移 {migration_id} 失败: {e}")
+            db.query(EmbeddingMigration).filter(
+                EmbeddingMigration.id == migration_id, EmbeddingMigration.owner == owner
+            ).update({"status": "failed", "owner": None, "error": str(e) or type(e).__name__,
+                      "updated_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _renew(db: Session, migration_id: int, owner: str, **values) -> bool:
+        """更新心跳 (及检查点等字段)；条件更新只作用于仍由 owner 执行的 running 任务，返回是否仍持有任务"""
+        updated = db.query(EmbeddingMigration).filter(
+            EmbeddingMigration.id == migration_id, EmbeddingMigration.status == "running",
+            EmbeddingMigration.owner == owner,
+        ).update({"updated_at": datetime.utcnow(), **values}, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+
+    @staticmethod
+    def _embed_entities(names: List[str], embeddings) -> List[Dict]:
+        vectors = EntityCanonicalizer._embed(names, embeddings)
+        if vectors is None:
+            raise RuntimeError("实体名向量化失败")
+        return [{"name": name, "vector": vector.tobytes()} for name, vector in zip(names, vectors)]
+
+    @staticmethod
+    def _embed_batch(db: Session, batch: List, embeddings, model: str):
+        """按清单行找回片段原文 (重新切分所属文档)，为目标模型计算并写入还没有的片段向量"""
+        document_ids = {row.document_id for row in batch}
+        texts: Dict[str, str] = {}
+        for _, content in db.query(Document.id, Document.content).filter(Document.id.in_(document_ids)):
+            for chunk in chunk_store.split_for_embedding(content or ""):
+                texts.setdefault(compute_content_hash(chunk), chunk)
+        # 文档在读取清单后被修改时，旧片段已不在原文中，新片段会以新的清单行出现在检查点之后
+        chunks = list({texts[row.chunk_hash] for row in batch if row.chunk_hash in texts})
+        if chunks:
+            chunk_store.embed_chunks(chunks, embeddings, model)
+
+    @classmethod
+    def _complete(cls, db: Session, row: EmbeddingMigration, owner: str, embeddings):
+        """用目标模型重新计算规范实体向量，与任务完成状态在同一事务中提交，即切换生效模型"""
+        names = [name for (name,) in db.query(CanonicalEntity.name).order_by(CanonicalEntity.name)]
+        updates = []
+        for start in range(0, len(names), _ENTITY_BATCH_SIZE):
+            updates.extend(cls._embed_entities(names[start:start + _ENTITY_BATCH_SIZE], embeddings))
+            # 实体很多时计算耗时可能超过租约，每块续约一次，避免被其他 worker 当作中断的任务接管
+            if not cls._renew(db, row.id, owner):
+                logger.info(f"embedding 迁移 {row.id} 在计算实体向量期间被暂停、取消或接管")
+                return
+
+        now = datetime.utcnow()
+        completed = db.query(EmbeddingMigration).filter(
+            EmbeddingMigration.id == row.id, EmbeddingMigration.status == "running", EmbeddingMigration.owner == owner
+        ).update({"status": "completed", "owner": None, "finished_at": now, "updated_at": now,
+                  "total_chunks": EmbeddingMigration.done_chunks}, synchronize_session=False)
+        if not completed:
+            # 计算实体向量期间任务被暂停或取消
+            db.rollback()
+            return
+        # 上面的更新已让本事务持有写锁，其他 worker 不能再插入规范实体；
+        # 重新读取并补算计算期间新增的实体，保证提交后表中只有目标模型的向量
+        covered = set(names)
+        added = [name for (name,) in db.query(CanonicalEntity.name).order_by(CanonicalEntity.name)
+                 if name not in covered]
+        try:
+            for start in range(0, len(added), _ENTITY_BATCH_SIZE):
+                updates.extend(cls._embed_entities(added[start:start + _ENTITY_BATCH_SIZE], embeddings))
+        except Exception:
+            db.rollback()
+            raise
+        if updates:
+            db.bulk_update_mappings(CanonicalEntity, updates)
+        db.commit()
+        db.refresh(row)
+        logger.info(f"embedding 迁移 {row.id} 完成: {row.source_model} -> {row.target_model}, "
+                    f"{row.done_chunks} 个片段, {len(updates)} 个规范实体 (其中 {len(added)} 个在完成前新增)")
+        _switch_local(row.target_model)
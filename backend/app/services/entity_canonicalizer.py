@@ -0,0 +1,261 @@
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.knowledge_graph import CanonicalEntity, EntityAlias
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 规范化时去掉的机构后缀 (转小写之后匹配)
+ENTITY_SUFFIXES = (
+    "股份有限公司", "有限责任公司", "有限公司", "集团公司", "集团", "公司",
+    "incorporated", "corporation", "company", "limited", "inc", "corp", "co", "ltd", "llc", "group",
+)
+# 中文后缀直接接在名称后面；英文后缀必须是独立的词 (前面有空白或标点)，"Costco" 不会被截成 "cost"
+_SUFFIX_PATTERN = re.compile(
+    r"(?:(?:" + "|".join(s for s in ENTITY_SUFFIXES if not s.isascii()) + r")"
+    r"|[\s\W_]+(?:" + "|".join(s for s in ENTITY_SUFFIXES if s.isascii()) + r"))[\s\W_]*$"
+)
+# 去除标点时保留的字符，"C++" / "C#" / "C" 是不同的实体
+_KEPT_SYMBOLS = "+#"
+_BLOCK_ROWS = 256
+
+
+def _compact(text: str) -> str:
+    return "".join(c for c in text if not c.isspace()
+                   and (c in _KEPT_SYMBOLS or unicodedata.category(c)[0] not in "PS"))
+
+
+def normalize_entity(name: str) -> str:
+    """
+    全角转半角 (NFKC)、转小写，逐个去掉末尾的机构后缀 ("Acme Co., Ltd.")，再去掉空白和标点 (保留 + 和 #)；
+    结果过短时保留后缀
+    """
+    text = unicodedata.normalize("NFKC", name).lower().strip()
+    stripped = text
+    while True:
+        shorter = _SUFFIX_PATTERN.sub("", stripped)
+        if shorter == stripped:
+            break
+        stripped = shorter
+    key = _compact(stripped)
+    return key if len(key) >= 2 else _compact(text)
+
+
+def char_overlap(a: str, b: str) -> float:
+    """较短字符串中出现在较长字符串里的字符比例 (按多重集计数)"""
+    shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+    if not shorter:
+        return 0.0
+    return sum((Counter(shorter) & Counter(longer)).values()) / len(shorter)
+
+
+class EntityCanonicalizer:
+    """
+    知识图谱实体规范化.
+    先按 normalize_entity 的结果精确合并 ("OpenAI" / "OpenAI公司" / "ｏｐｅｎａｉ")，
+    剩余的新名称批量计算向量，与已有规范实体做一次矩阵乘法求余弦相似度，
+    相似度和字符重合度都达到阈值才合并。别名映射和规范实体向量持久化，
+    之后的抽取结果只需处理没见过的名称，合并是增量的。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "EntityCanonicalizer":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._aliases: Dict[str, str] = {}
+        self._by_key: Dict[str, str] = {}
+        self._names: List[str] = []
+        self._keys: List[str] = []
+        self._buffer = self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._stamp: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _embed(names: List[str], embeddings=None) -> Optional[np.ndarray]:
+        """归一化的实体名向量，默认使用当前生效的 embedding 模型"""
+        # 延迟导入，避免与 qa_service 循环依赖
+        from app.services.qa_service import EmbeddingManager
+        try:
+            embeddings = embeddings or EmbeddingManager.get_embeddings()
+            vectors = np.asarray(embeddings.embed_documents(names), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"实体名向量化失败，只做规则合并: {e}")
+            return None
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    @staticmethod
+    def _current_stamp(db: Session) -> Tuple:
+        return (db.query(func.count(EntityAlias.alias)).scalar(),
+                db.query(func.count(CanonicalEntity.name)).scalar())
+
+    def _refresh(self, db: Session):
+        """其他进程写入了新的别名时重新加载"""
+        stamp = self._current_stamp(db)
+        if stamp == self._stamp:
+            return
+        self._aliases = dict(db.query(EntityAlias.alias, EntityAlias.canonical))
+        self._names, self._keys = [], []
+        self._buffer = self._matrix = np.zeros((0, 0), dtype=np.float32)
+        rows = db.query(CanonicalEntity.name, CanonicalEntity.norm_key, CanonicalEntity.vector).all()
+        self._append_canonicals([
+            (name, key, np.frombuffer(blob, dtype=np.float32) if blob else None) for name, key, blob in rows
+        ])
+        self._by_key = dict(zip(self._keys, self._names))
+        self._stamp = stamp
+
+    def reset(self):
+        """丢弃内存状态 (例如规范实体向量已换成新模型的向量)，下次调用时重新加载"""
+        with self._lock:
+            self._stamp = None
+
+    def clear(self, db: Session):
+        """删除所有别名映射和规范实体，之后遇到的名称按当前规则重新规范化 (重建图谱索引前调用)"""
+        with self._lock:
+            db.query(EntityAlias).delete(synchronize_session=False)
+            db.query(CanonicalEntity).delete(synchronize_session=False)
+            db.commit()
+            self._stamp = None
+
+    def _append_canonicals(self, canonicals: List[Tuple]):
+        """
+        把 (name, key, vector) 追加到内存中的规范实体表和向量矩阵.
+        矩阵按容量倍增预分配，追加时不复制整个矩阵；缺失的向量记为零向量，不参与相似度合并。
+        """
+        if not canonicals:
+            return
+        if not self._names:
+            dim = next((len(v) for _, _, v in canonicals if v is not None), 0)
+            self._buffer = np.zeros((max(len(canonicals), 1024), dim), dtype=np.float32)
+        start, end = len(self._names), len(self._names) + len(canonicals)
+        if end > len(self._buffer):
+            grown = np.zeros((max(end, 2 * len(self._buffer)), self._buffer.shape[1]), dtype=np.float32)
+            grown[:start] = self._buffer[:start]
+            self._buffer = grown
+        for i, (name, key, vector) in enumerate(canonicals, start):
+            self._names.append(name)
+            self._keys.append(key)
+            if vector is not None and len(vector) == self._buffer.shape[1]:
+                self._buffer[i] = vector
+        self._matrix = self._buffer[:end]
+
+    def canonicalize(self, db: Session, names: Iterable[str]) -> Dict[str, str]:
+        """返回 原始名称 -> 规范名称 的映射，新名称的合并结果会被持久化"""
+        names = {name.strip() for name in names if isinstance(name, str) and name.strip()}
+        with self._lock:
+            self._refresh(db)
+            mapping = {name: self._aliases[name] for name in names if name in self._aliases}
+            unknown = sorted(names - mapping.keys())
+            if not unknown:
+                return mapping
+
+            new_aliases: Dict[str, str] = {}
+            pending: Dict[str, List[str]] = {}
+            for name in unknown:
+                key = normalize_entity(name)
+                if key in self._by_key:
+                    new_aliases[name] = self._by_key[key]
+                else:
+                    pending.setdefault(key, []).append(name)
+
+            new_canonicals = self._merge_by_similarity(pending, new_aliases)
+            self._persist(db, new_aliases, new_canonicals)
+            mapping.update(new_aliases)
+            return mapping
+
+    def _merge_by_similarity(self, pending: Dict[str, List[str]], new_aliases: Dict[str, str]) -> List[Tuple]:
+        """对规则合并后仍未知的名称做批量向量相似度合并，返回新建的规范实体 (name, key, vector)"""
+        if not pending:
+            return []
+        keys = list(pending)
+        # 同一规范化结果的多个写法中，取最短的作为规范名称 ("OpenAI" 而不是 "OpenAI Inc.")
+        representatives = [min(pending[key], key=lambda name: (len(name), name)) for key in keys]
+        vectors = self._embed(representatives)
+        threshold = settings.ENTITY_MERGE_THRESHOLD
+        min_overlap = settings.ENTITY_MERGE_MIN_OVERLAP
+
+        targets: List[Optional[str]] = [None] * len(keys)
+        neighbors: Dict[int, List[int]] = {}
+        if vectors is not None:
+            for start in range(0, len(keys), _BLOCK_ROWS):
+                block = vectors[start:start + _BLOCK_ROWS]
+                if len(self._names) and self._matrix.shape[1] == vectors.shape[1]:
+                    # 新名称 × 已有规范实体，分块矩阵乘法限制内存占用
+                    similarity = block @ self._matrix.T
+                    best = similarity.argmax(axis=1)
+                    for offset, j in enumerate(best.tolist()):
+                        i = start + offset
+                        if similarity[offset, j] >= threshold and char_overlap(keys[i], self._keys[j]) >= min_overlap:
+                            targets[i] = self._names[j]
+                # 同一批新名称之间只记录超过阈值的 (i, j>i) 对
+                within = block @ vectors.T
+                for offset, j in zip(*np.nonzero(within >= threshold)):
+                    i = start + int(offset)
+                    if int(j) > i:
+                        neighbors.setdefault(i, []).append(int(j))
+
+        created = []
+        # 按顺序贪心：没有并入已有实体的名称成为新的规范实体，并吸收其后相似的名称
+        for i, key in enumerate(keys):
+            if targets[i] is None:
+                targets[i] = representatives[i]
+                created.append((representatives[i], key, vectors[i] if vectors is not None else None))
+                for j in neighbors.get(i, []):
+                    if targets[j] is None and char_overlap(key, keys[j]) >= min_overlap:
+                        targets[j] = representatives[i]
+            for name in pending[key]:
+                new_aliases[name] = targets[i]
+
+        merged = sum(len(names) for names in pending.values()) - len(created)
+        if merged:
+            logger.info(f"实体规范化: {merged} 个新名称合并到已有实体，新建 {len(created)} 个规范实体")
+        return created
+
+    def _persist(self, db: Session, new_aliases: Dict[str, str], new_canonicals: List[Tuple]):
+        if new_canonicals:
+            db.execute(sqlite_insert(CanonicalEntity).values([
+                {"name": name, "norm_key": key, "vector": vector.tobytes() if vector is not None else None}
+                for name, key, vector in new_canonicals
+            ]).on_conflict_do_nothing(index_elements=["name"]))
+        if new_aliases:
+            db.execute(sqlite_insert(EntityAlias).values([
+                {"alias": alias, "canonical": canonical} for alias, canonical in new_aliases.items()
+            ]).on_conflict_do_nothing(index_elements=["alias"]))
+        db.commit()
+
+        # 增量更新内存状态；表的行数与预期不符说明其他进程也写入了，下次调用时整体重新加载
+        expected = (self._stamp[0] + len(new_aliases), self._stamp[1] + len(new_canonicals))
+        self._aliases.update(new_aliases)
+        self._append_canonicals(new_canonicals)
+        for name, key, _ in new_canonicals:
+            self._by_key.setdefault(key, name)
+        self._stamp = expected if self._current_stamp(db) == expected else None
+
+    def aliases_of(self, db: Session, canonicals: Iterable[str]) -> Dict[str, str]:
+        """规范实体的所有别名 (包括自身)，用于把问题中的别名链接到规范实体"""
+        canonicals = list(set(canonicals))
+        result = {name: name for name in canonicals}
+        if canonicals:
+            for alias, canonical in db.query(EntityAlias.alias, EntityAlias.canonical) \
+                    .filter(EntityAlias.canonical.in_(canonicals)):
+                result[alias] = canonical
+        return result
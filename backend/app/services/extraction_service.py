@@ -0,0 +1,81 @@
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import Callable, Dict, Optional
+
+import docx2txt
+from pypdf import PdfReader
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedFileTypeError(ValueError):
+    pass
+
+
+def extract_text_from_pdf(path: str) -> str:
+    """从PDF文件中提取文本"""
+    # 传入文件句柄而不是路径：pypdf 收到路径时会把整个文件读进内存
+    with open(path, "rb") as f:
+        pdf_reader = PdfReader(f)
+        # 逐页收集后一次拼接，避免 += 反复复制大字符串
+        return "".join(page.extract_text() or "" for page in pdf_reader.pages)
+
+
+def extract_text_from_docx(path: str) -> str:
+    """从DOCX文件中提取文本"""
+    return docx2txt.process(path)
+
+
+def extract_text_from_txt(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+EXTRACTORS: Dict[str, Callable[[str], str]] = {
+    "application/pdf": extract_text_from_pdf,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": extract_text_from_docx,
+    "application/msword": extract_text_from_docx,
+    "text/plain": extract_text_from_txt,
+}
+
+
+def extract_text(path: str, content_type: str) -> str:
+    extractor = EXTRACTORS.get(content_type)
+    if extractor is None:
+        raise UnsupportedFileTypeError(f"Unsupported file type: {content_type}")
+    return extractor(path)
+
+
+# 压缩包内的文件没有 Content-Type，按扩展名推断
+EXTENSION_CONTENT_TYPES: Dict[str, str] = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".doc": "application/msword",
+    ".txt": "text/plain",
+}
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "application/x-zip"}
+
+
+def guess_content_type(filename: str) -> Optional[str]:
+    return EXTENSION_CONTENT_TYPES.get(os.path.splitext(filename or "")[1].lower())
+
+
+def extract_text_from_archive(zip_path: str, member: str, content_type: str, tmp_dir: Optional[str] = None) -> str:
+    """
+    把压缩包中的一个文件解压到临时文件后提取文本.
+    在工作进程中执行，解压和解析都不占用主进程。
+    """
+    suffix = os.path.splitext(member)[1]
+    with zipfile.ZipFile(zip_path) as archive, archive.open(member) as source, \
+            tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=tmp_dir) as tmp:
+        shutil.copyfileobj(source, tmp, 1024 * 1024)
+    try:
+        return extract_text(tmp.name, content_type)
+    finally:
+        os.remove(tmp.name)
@@ -0,0 +1,83 @@
+import logging
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.single_flight import single_flight
+from app.models.knowledge_graph import EntityMention, GraphRelation
+from app.services.graph_store import CompactGraph
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class GraphIndex:
+    """
+    持久化图谱 (kg_relations + kg_entity_mentions) 在进程内的只读紧凑图.
+    每次查询先比较两张表的 (行数, 最大 id) 戳记，表有变化时才重新加载；
+    两张表都使用 AUTOINCREMENT，删除后重建的行不会复用旧 id，戳记一定会变化。
+    PageRank 结果随图一起缓存。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "GraphIndex":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._graph: Optional[CompactGraph] = None
+        self._stamp: Optional[Tuple] = None
+        self._pagerank: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _current_stamp(db: Session) -> Tuple:
+        relations = db.query(func.count(GraphRelation.id), func.max(GraphRelation.id)).one()
+        mentions = db.query(func.count(EntityMention.id), func.max(EntityMention.id)).one()
+        return tuple(relations) + tuple(mentions)
+
+    def get_graph(self, db: Session) -> CompactGraph:
+        stamp = self._current_stamp(db)
+        with self._lock:
+            if self._graph is not None and stamp == self._stamp:
+                return self._graph
+        # 多个请求同时发现图已过期时只加载一次
+        graph = single_flight.do(("kg_index", stamp), self._load, db)
+        with self._lock:
+            if stamp != self._stamp:
+                self._graph, self._stamp, self._pagerank = graph, stamp, None
+            return self._graph
+
+    def pagerank(self, db: Session) -> np.ndarray:
+        graph = self.get_graph(db)
+        with self._lock:
+            if self._graph is graph and self._pagerank is not None:
+                return self._pagerank
+        scores = graph.pagerank()
+        with self._lock:
+            if self._graph is graph:
+                self._pagerank = scores
+        return scores
+
+    @staticmethod
+    def _load(db: Session) -> CompactGraph:
+        graph = CompactGraph()
+        # 节点出现次数 = 提到该实体的片段数
+        for entity, count in db.query(EntityMention.entity, func.count(EntityMention.id)) \
+                .group_by(EntityMention.entity):
+            graph.add_node(entity, count)
+        rows = db.query(GraphRelation.source, GraphRelation.target, GraphRelation.relation) \
+            .order_by(GraphRelation.id).yield_per(10000)
+        for source, target, relation in rows:
+            graph.add_edge(source, target, relation)
+        logger.info(f"图谱索引已加载: {graph.number_of_nodes} 个实体, {graph.number_of_edges} 条边")
+        return graph
@@ -0,0 +1,329 @@
+import logging
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _to_numpy(buffer: array, dtype) -> np.ndarray:
+    # 复制一份而不是 frombuffer 视图：array 被导出缓冲区期间无法再 append
+    return np.array(np.frombuffer(buffer, dtype=dtype)) if len(buffer) else np.zeros(0, dtype=dtype)
+
+
+class _Interner:
+    """字符串 <-> 连续整数 id 的双向映射"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def intern(self, name: str) -> int:
+        idx = self.ids.get(name)
+        if idx is None:
+            idx = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return idx
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class CompactGraph:
+    """
+    以整数 id + CSR 数组存储的有向图，用于语料级的知识图谱.
+    节点名和关系名各自驻留为整数 id，边先追加到紧凑的 array 缓冲区，
+    需要计算时再一次性去重并压缩为 CSR (indptr / indices)；
+    度、PageRank、连通分量均用 NumPy 向量化计算。
+    重复的 (source, target) 边保留第一次出现的关系名，权重累加，与原先 DiGraph 的行为一致。
+    只有调用 to_networkx() 时才会生成 networkx 图。
+    """
+
+    def __init__(self):
+        self._nodes = _Interner()
+        self._relations = _Interner()
+        self._counts = array("q")
+        self._src = array("q")
+        self._dst = array("q")
+        self._rel = array("q")
+        self._weight = array("d")
+        self._csr: Optional[Dict[str, np.ndarray]] = None
+        self._centrality: Optional[np.ndarray] = None
+
+    # --- 构建 ---
+
+    def _invalidate(self):
+        self._csr = None
+        self._centrality = None
+
+    def add_node(self, name: str, count: int = 1) -> int:
+        """添加节点；已存在时把 count 累加到出现次数上"""
+        idx = self._nodes.intern(name)
+        if idx == len(self._counts):
+            self._counts.append(count)
+        else:
+            self._counts[idx] += count
+        self._invalidate()
+        return idx
+
+    def _ensure_node(self, name: str) -> int:
+        idx = self._nodes.intern(name)
+        if idx == len(self._counts):
+            self._counts.append(1)
+        return idx
+
+    def add_edge(self, source: str, target: str, relation: str, weight: float = 1.0):
+        self._src.append(self._ensure_node(source))
+        self._dst.append(self._ensure_node(target))
+        self._rel.append(self._relations.intern(relation))
+        self._weight.append(weight)
+        self._invalidate()
+
+    def clear(self):
+        self.__init__()
+
+    # --- CSR 压缩 ---
+
+    def _compile(self) -> Dict[str, np.ndarray]:
+        if self._csr is not None:
+            return self._csr
+        n = max(len(self._nodes), 1)
+        src, dst = _to_numpy(self._src, np.int64), _to_numpy(self._dst, np.int64)
+
+        # 按 (source, target) 去重：np.unique 返回的是排好序的键，正好就是 CSR 的行序
+        unique_keys, first, inverse = np.unique(src * n + dst, return_index=True, return_inverse=True)
+        edge_src = (unique_keys // n).astype(np.int32)
+
+        self._csr = {
+            "indptr": np.concatenate(([0], np.cumsum(np.bincount(edge_src, minlength=len(self._nodes))))),
+            "src": edge_src,
+            "indices": (unique_keys % n).astype(np.int32),
+            "weights": np.bincount(inverse, weights=_to_numpy(self._weight, np.float64),
+                                   minlength=len(unique_keys)).astype(np.float32),
+            "relations": _to_numpy(self._rel, np.int64)[first].astype(np.int32),
+            "counts": _to_numpy(self._counts, np.int64),
+        }
+        return self._csr
+
+    # --- 基本属性 ---
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self._nodes)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self._compile()["indices"])
+
+    def __bool__(self) -> bool:
+        return self.number_of_nodes > 0
+
+    def node_names(self) -> List[str]:
+        return self._nodes.names
+
+    def node_counts(self) -> np.ndarray:
+        return self._compile()["counts"]
+
+    def edges(self) -> Iterator[Tuple[str, str, str, float]]:
+        """依次产出 (source, target, relation, weight)"""
+        csr = self._compile()
+        names, relations = self._nodes.names, self._relations.names
+        for s, t, r, w in zip(csr["src"].tolist(), csr["indices"].tolist(),
+                              csr["relations"].tolist(), csr["weights"].tolist()):
+            yield names[s], names[t], relations[r], w
+
+    def node_id(self, name: str) -> Optional[int]:
+        return self._nodes.ids.get(name)
+
+    def edges_within(self, keep: np.ndarray) -> Iterator[Tuple[str, str, str, float]]:
+        """两端都在布尔掩码 keep 内的边"""
+        csr = self._compile()
+        mask = keep[csr["src"]] & keep[csr["indices"]]
+        names, relations = self._nodes.names, self._relations.names
+        for s, t, r, w in zip(csr["src"][mask].tolist(), csr["indices"][mask].tolist(),
+                              csr["relations"][mask].tolist(), csr["weights"][mask].tolist()):
+            yield names[s], names[t], relations[r], w
+
+    def relation_between(self, source: int, target: int) -> Optional[str]:
+        """source -> target 边的关系名；每行的 indices 已排序，用二分查找"""
+        csr = self._compile()
+        start, end = csr["indptr"][source], csr["indptr"][source + 1]
+        pos = start + np.searchsorted(csr["indices"][start:end], target)
+        if pos < end and csr["indices"][pos] == target:
+            return self._relations.names[csr["relations"][pos]]
+        return None
+
+    def nbytes(self) -> int:
+        """CSR 数组与驻留字符串的近似内存占用"""
+        csr = self._compile()
+        array_bytes = sum(a.nbytes for a in csr.values())
+        string_bytes = sum(len(name.encode("utf-8")) + 8 for name in self._nodes.names + self._relations.names)
+        return array_bytes + string_bytes
+
+    # --- 图算法 ---
+
+    def in_degree(self) -> np.ndarray:
+        csr = self._compile()
+        return np.bincount(csr["indices"], minlength=self.number_of_nodes)
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self._compile()["indptr"])
+
+    def degree(self) -> np.ndarray:
+        return self.in_degree() + self.out_degree()
+
+    def degree_centrality(self) -> np.ndarray:
+        """与 nx.degree_centrality 相同：(入度 + 出度) / (n - 1)，结果缓存到图下一次修改为止"""
+        if self._centrality is None:
+            n = self.number_of_nodes
+            if n <= 1:
+                self._centrality = np.ones(n, dtype=np.float64)
+            else:
+                self._centrality = self.degree() / (n - 1)
+        return self._centrality
+
+    def pagerank(self, alpha: float = 0.85, max_iter: int = 100, tol: float = 1.0e-6) -> np.ndarray:
+        """按边权重的幂迭代 PageRank，悬挂节点的得分均匀分配，收敛判据与 networkx 相同"""
+        n = self.number_of_nodes
+        if n == 0:
+            return np.zeros(0)
+        csr = self._compile()
+        src, dst, weights = csr["src"], csr["indices"], csr["weights"].astype(np.float64)
+        out_weight = np.bincount(src, weights=weights, minlength=n)
+        dangling = out_weight == 0
+        edge_share = weights / np.where(out_weight[src] > 0, out_weight[src], 1.0)
+
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            previous = rank
+            flow = np.bincount(dst, weights=previous[src] * edge_share, minlength=n)
+            rank = alpha * (flow + previous[dangling].sum() / n) + (1.0 - alpha) / n
+            if np.abs(rank - previous).sum() < n * tol:
+                return rank
+        logger.warning(f"PageRank 在 {max_iter} 次迭代内未收敛")
+        return rank
+
+    def connected_components(self) -> np.ndarray:
+        """弱连通分量标签 (每个分量取其中最小的节点 id)，使用最小标签传播 + 指针跳跃"""
+        n = self.number_of_nodes
+        labels = np.arange(n)
+        csr = self._compile()
+        src, dst = csr["src"], csr["indices"]
+        if len(src) == 0:
+            return labels
+        while True:
+            updated = labels.copy()
+            np.minimum.at(updated, src, labels[dst])
+            np.minimum.at(updated, dst, labels[src])
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                return labels
+            labels = updated
+
+    def _reverse(self) -> Tuple[np.ndarray, np.ndarray]:
+        """入边的 CSR (按 target 分行)，首次使用时构建并缓存"""
+        csr = self._compile()
+        if "rev_indptr" not in csr:
+            order = np.argsort(csr["indices"], kind="stable")
+            counts = np.bincount(csr["indices"], minlength=self.number_of_nodes)
+            csr["rev_indptr"] = np.concatenate(([0], np.cumsum(counts)))
+            csr["rev_indices"] = csr["src"][order]
+        return csr["rev_indptr"], csr["rev_indices"]
+
+    @staticmethod
+    def _gather(indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """一次性取出 frontier 中所有节点的邻居，返回 (邻居, 对应的来源节点)"""
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        return indices[offsets].astype(np.int64), np.repeat(frontier, counts)
+
+    def _expand(self, frontier: np.ndarray, directed: bool) -> Tuple[np.ndarray, np.ndarray]:
+        csr = self._compile()
+        neighbors, parents = self._gather(csr["indptr"], csr["indices"], frontier)
+        if not directed:
+            rev_indptr, rev_indices = self._reverse()
+            back, back_parents = self._gather(rev_indptr, rev_indices, frontier)
+            neighbors = np.concatenate((neighbors, back))
+            parents = np.concatenate((parents, back_parents))
+        return neighbors, parents
+
+    def bfs(self, source: int, max_hops: Optional[int] = None, target: Optional[int] = None,
+            directed: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        逐层向量化的广度优先搜索.
+        返回 (distance, parent) 两个数组，未到达的节点为 -1；找到 target 后提前结束。
+        """
+        n = self.number_of_nodes
+        distance = np.full(n, -1, dtype=np.int64)
+        parent = np.full(n, -1, dtype=np.int64)
+        distance[source] = 0
+        frontier = np.array([source], dtype=np.int64)
+        hop = 0
+        while len(frontier) and (max_hops is None or hop < max_hops):
+            if target is not None and distance[target] >= 0:
+                break
+            hop += 1
+            neighbors, parents = self._expand(frontier, directed)
+            fresh = distance[neighbors] < 0
+            neighbors, first = np.unique(neighbors[fresh], return_index=True)
+            distance[neighbors] = hop
+            parent[neighbors] = parents[fresh][first]
+            frontier = neighbors
+        return distance, parent
+
+    def shortest_path(self, source: int, target: int, directed: bool = False) -> Optional[List[int]]:
+        distance, parent = self.bfs(source, target=target, directed=directed)
+        if distance[target] < 0:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(parent[path[-1]]))
+        return path[::-1]
+
+    def subgraph(self, keep: np.ndarray) -> "CompactGraph":
+        """按布尔掩码保留节点，返回重新编号后的新图"""
+        csr = self._compile()
+        kept = np.flatnonzero(keep)
+        remap = np.full(self.number_of_nodes, -1, dtype=np.int64)
+        remap[kept] = np.arange(len(kept))
+        edge_mask = keep[csr["src"]] & keep[csr["indices"]]
+
+        result = CompactGraph()
+        for idx in kept.tolist():
+            result._nodes.intern(self._nodes.names[idx])
+        # 关系表原样共享 id，边直接以数组形式写入缓冲区
+        result._relations.ids = dict(self._relations.ids)
+        result._relations.names = list(self._relations.names)
+        result._counts.frombytes(csr["counts"][kept].astype(np.int64).tobytes())
+        result._src.frombytes(remap[csr["src"][edge_mask]].tobytes())
+        result._dst.frombytes(remap[csr["indices"][edge_mask]].tobytes())
+        result._rel.frombytes(csr["relations"][edge_mask].astype(np.int64).tobytes())
+        result._weight.frombytes(csr["weights"][edge_mask].astype(np.float64).tobytes())
+        return result
+
+    def remove_isolates(self, min_count: int = 2) -> "CompactGraph":
+        """移除没有任何边且出现次数少于 min_count 的节点"""
+        keep = (self.degree() > 0) | (self.node_counts() >= min_count)
+        if keep.all():
+            return self
+        return self.subgraph(keep)
+
+    # --- 转换 ---
+
+    def to_networkx(self) -> nx.DiGraph:
+        graph = nx.DiGraph()
+        counts = self.node_counts().tolist()
+        graph.add_nodes_from((name, {"count": count}) for name, count in zip(self._nodes.names, counts))
+        graph.add_edges_from(
+            (source, target, {"relation": relation, "weight": int(weight)})
+            for source, target, relation, weight in self.edges()
+        )
+        return graph
@@ -0,0 +1,209 @@
+import logging
+import multiprocessing
+import os
+import posixpath
+import threading
+import time
+import zipfile
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.document import Document
+from app.services import extraction_service, chunk_store, search_index
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 解压后不超过该大小的 ZIP 成员不检查压缩比，小文件 (空白、重复内容) 的压缩比本来就可能很高
+_RATIO_CHECK_MIN_BYTES = 1024 * 1024
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> Executor:
+    """
+    文本提取共享的进程池 (spawn 方式启动，不继承数据库连接和线程).
+    PDF/DOCX 解析是纯 Python 的 CPU 密集任务，用进程才能真正并行；无法创建进程时退回线程池。
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                try:
+                    _executor = ProcessPoolExecutor(max_workers=settings.BULK_INGEST_WORKERS,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+                except (OSError, NotImplementedError) as e:
+                    logger.warning(f"无法创建提取进程池，改用线程池: {e}")
+                    _executor = ThreadPoolExecutor(max_workers=settings.BULK_INGEST_WORKERS)
+    return _executor
+
+
+def reset_executor(broken: Executor):
+    """有工作进程异常退出后整个进程池不可再用：丢弃它，下次 get_executor 时重建"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _is_zip(filename: str, content_type: Optional[str]) -> bool:
+    return content_type in extraction_service.ZIP_CONTENT_TYPES or (filename or "").lower().endswith(".zip")
+
+
+def _entry(filename: str, source: Optional[str] = None, status: str = "pending", error: Optional[str] = None) -> Dict:
+    return {"filename": filename, "source": source, "status": status, "document_id": None,
+            "content_length": None, "error": error}
+
+
+def plan_uploads(uploads: List[Tuple[str, str, Optional[str]]]) -> List[Tuple[Dict, Optional[tuple]]]:
+    """
+    把上传的文件 (文件名, 临时文件路径, Content-Type) 展开为待提取的任务列表.
+    ZIP 按成员展开，跳过目录和隐藏文件；不支持的类型、超限和压缩比异常的文件直接记入清单，不提交任务。
+    解压后的总大小按成员声明的大小累计 (zipfile 解压时不会输出超过声明大小的数据)，超过上限时整个请求拒绝。
+    返回 (清单条目, 提取参数)，提取参数为 None 表示不需要提取。
+    """
+    plan: List[Tuple[Dict, Optional[tuple]]] = []
+    total_bytes = 0
+    for filename, path, content_type in uploads:
+        if not _is_zip(filename, content_type):
+            if content_type not in extraction_service.EXTRACTORS:
+                content_type = extraction_service.guess_content_type(filename)
+            if content_type is None:
+                plan.append((_entry(filename, status="skipped", error="Unsupported file type"), None))
+            else:
+                total_bytes += os.path.getsize(path)
+                plan.append((_entry(filename), (extraction_service.extract_text, path, content_type)))
+            continue
+
+        try:
+            with zipfile.ZipFile(path) as archive:
+                members = archive.infolist()
+        except zipfile.BadZipFile as e:
+            plan.append((_entry(filename, status="failed", error=f"Invalid ZIP archive: {e}"), None))
+            continue
+        for info in members:
+            name = info.filename
+            basename = posixpath.basename(name.rstrip("/"))
+            if info.is_dir() or not basename or basename.startswith(".") or name.startswith("__MACOSX/"):
+                continue
+            member_type = extraction_service.guess_content_type(basename)
+            if member_type is None:
+                plan.append((_entry(name, filename, "skipped", "Unsupported file type"), None))
+            elif info.file_size > settings.UPLOAD_MAX_BYTES:
+                plan.append((_entry(name, filename, "failed",
+                                    f"File too large: limit is {settings.UPLOAD_MAX_BYTES} bytes"), None))
+            elif info.file_size > _RATIO_CHECK_MIN_BYTES \
+                    and info.file_size > settings.BULK_ZIP_MAX_COMPRESSION_RATIO * max(info.compress_size, 1):
+                plan.append((_entry(name, filename, "failed",
+                                    f"Compression ratio too high: limit is {settings.BULK_ZIP_MAX_COMPRESSION_RATIO}"),
+                             None))
+            else:
+                total_bytes += info.file_size
+                plan.append((_entry(name, filename), (extraction_service.extract_text_from_archive, path, name,
+                                                      member_type, settings.UPLOAD_TMP_DIR)))
+
+    jobs = sum(1 for _, job in plan if job is not None)
+    if jobs > settings.BULK_UPLOAD_MAX_FILES:
+        raise ValueError(f"Too many files: {jobs} (limit is {settings.BULK_UPLOAD_MAX_FILES})")
+    if total_bytes > settings.BULK_UPLOAD_MAX_UNCOMPRESSED_BYTES:
+        raise ValueError(f"Uncompressed size too large: {total_bytes} bytes "
+                         f"(limit is {settings.BULK_UPLOAD_MAX_UNCOMPRESSED_BYTES} bytes)")
+    return plan
+
+
+def _flush(db: Session, pending: List[Tuple[Dict, Document]]):
+    """一个事务批量插入一批文档，并把 id 回填到清单"""
+    if not pending:
+        return
+    try:
+        db.add_all(document for _, document in pending)
+        db.flush()
+        ids = [document.id for _, document in pending]
+        for (_, document), document_id in zip(pending, ids):
+            db.add_all(chunk_store.chunk_rows(document_id, document.content))
+        search_index.index_documents(db, [(document_id, document.filename, document.content)
+                                          for (_, document), document_id in zip(pending, ids)])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"批量写入 {len(pending)} 个文档失败: {e}")
+        for entry, _ in pending:
+            entry.update(status="failed", error=f"Database error: {e}")
+    else:
+        for (entry, document), document_id in zip(pending, ids):
+            entry.update(status="created", document_id=document_id)
+    pending.clear()
+
+
+def _extract_round(db: Session, jobs: List[Tuple[Dict, tuple]],
+                   pending: List[Tuple[Dict, Document]]) -> List[Tuple[Dict, tuple]]:
+    """在共享进程池中并行提取一批文件，成功的加入 pending 并按批提交；返回因进程池损坏而失败的任务"""
+    executor = get_executor()
+    crashed: List[Tuple[Dict, tuple]] = []
+    futures = {}
+    for entry, job in jobs:
+        try:
+            futures[executor.submit(*job)] = (entry, job)
+        except BrokenExecutor:
+            crashed.append((entry, job))
+    for future in as_completed(futures):
+        entry, job = futures[future]
+        try:
+            content = future.result()
+        except BrokenExecutor:
+            crashed.append((entry, job))
+            continue
+        except Exception as e:
+            entry.update(status="failed", error=str(e) or type(e).__name__)
+            continue
+        entry["content_length"] = len(content)
+        pending.append((entry, Document(filename=posixpath.basename(entry["filename"]), content=content)))
+        if len(pending) >= settings.BULK_INGEST_BATCH_SIZE:
+            _flush(db, pending)
+    if crashed:
+        reset_executor(executor)
+    return crashed
+
+
+def ingest_uploads(db: Session, uploads: List[Tuple[str, str, Optional[str]]]) -> Dict:
+    """
+    批量导入：文本提取在进程池中并行执行，按完成顺序每 BULK_INGEST_BATCH_SIZE 个文档提交一次事务.
+    返回逐文件的结果清单，单个文件失败不影响其他文件。
+    """
+    started = time.perf_counter()
+    plan = plan_uploads(uploads)
+    manifest = [entry for entry, _ in plan]
+
+    jobs = [(entry, job) for entry, job in plan if job is not None]
+    pending: List[Tuple[Dict, Document]] = []
+    # 进程池损坏时其上所有未完成的任务都会失败：受影响的文件先换新进程池并行重试一次，
+    # 仍然失败的逐个单独提交，只有确实导致工作进程退出的文件记为失败
+    crashed = _extract_round(db, jobs, pending)
+    if crashed:
+        logger.warning(f"提取进程异常退出，已重建进程池，重试 {len(crashed)} 个受影响的文件")
+        crashed = _extract_round(db, crashed, pending)
+    for entry, job in crashed:
+        if _extract_round(db, [(entry, job)], pending):
+            logger.warning(f"文件 {entry['filename']} 导致提取进程异常退出")
+            entry.update(status="failed", error="Extraction worker crashed")
+    _flush(db, pending)
+
+    elapsed = time.perf_counter() - started
+    counts = {status: sum(1 for entry in manifest if entry["status"] == status)
+              for status in ("created", "failed", "skipped")}
+    logger.info(f"批量导入完成: {counts}, 耗时 {elapsed:.2f}s")
+    return {"total": len(manifest), **counts, "elapsed_seconds": round(elapsed, 3), "files": manifest}
@@ -1,25 +1,35 @@
 import networkx as nx
+import numpy as np
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import re
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import json
 import logging
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from io import BytesIO
 import base64
+import hashlib
 import os
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from matplotlib import font_manager
 
 # LangChain imports
-from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import Runnable
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from app.models.document import Document
+from app.models.knowledge_graph import GraphExtraction, GraphChunk, EntityMention, GraphRelation
 from app.core.config import settings
+from app.core.single_flight import single_flight
+from app.core.tokens import estimate_tokens
+from app.services.document_service import compute_content_hash
+from app.services.graph_store import CompactGraph
+from app.services.graph_index import GraphIndex
+from app.services.entity_canonicalizer import EntityCanonicalizer
+from app.services.chunk_store import content_defined_chunks
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -28,6 +38,7 @@ logger = logging.getLogger(__name__)
 # 条件导入不同平台的模块
 try:
     from langchain_openai import ChatOpenAI
+    from openai import BadRequestError, UnprocessableEntityError
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
@@ -57,13 +68,17 @@ CHINESE_FONT_PROP = get_chinese_font()
 class KnowledgeGraphService:
     def __init__(self, db: Session):
         self.db = db
-        self.graph = nx.DiGraph()
+        self.graph = CompactGraph()
 
-    def build_knowledge_graph(self, document_id: Optional[int] = None) -> Dict:
+    def build_knowledge_graph(self, document_id: Optional[int] = None,
+                              document_ids: Optional[List[int]] = None) -> Dict:
+        """为单个文档、一组文档 (document_ids，合并为一张图) 或全部文档构建图谱"""
         self.graph.clear()
         
         documents = []
-        if document_id:
+        if document_ids:
+            documents = self.db.query(Document).filter(Document.id.in_(document_ids)).order_by(Document.id).all()
+        elif document_id:
             doc = self.db.query(Document).filter(Document.id == document_id).first()
             if doc:
                 documents.append(doc)
@@ -75,83 +90,326 @@ class KnowledgeGraphService:
 
         # 使用 LLM 提取图谱数据
         for doc in documents:
-            self._extract_graph_from_llm(doc)
+            for result_json in self._extract_graph_from_llm(doc):
+                self._parse_and_add_to_graph(result_json)
 
-        if not self.graph.nodes:
+        if not self.graph:
             return {"nodes": [], "edges": [], "node_count": 0, "edge_count": 0}
 
         # 移除孤立节点
-        node_counts = nx.get_node_attributes(self.graph, 'count')
-        isolates = list(nx.isolates(self.graph))
-        for node in isolates:
-            if node_counts.get(node, 1) < 2:
-                self.graph.remove_node(node)
-
-        # 计算中心性并生成返回数据
-        centrality = nx.degree_centrality(self.graph)
-        nodes = []
-        for node, data in self.graph.nodes(data=True):
-            nodes.append({
-                "id": node,
-                "label": node,
-                "size": (centrality.get(node, 0) * 50) + (data.get("count", 1) * 2)
-            })
-            
-        edges = []
-        for source, target, data in self.graph.edges(data=True):
-            edges.append({
-                "source": source,
-                "target": target,
-                "label": data.get('relation', '相关')
-            })
+        self.graph = self.graph.remove_isolates(min_count=2)
+
+        # 计算中心性并生成返回数据 (结果缓存在图上，渲染时直接复用)
+        sizes = self.graph.degree_centrality() * 50 + self.graph.node_counts() * 2
+        nodes = [
+            {"id": node, "label": node, "size": float(size)}
+            for node, size in zip(self.graph.node_names(), sizes.tolist())
+        ]
+
+        edges = [
+            {"source": source, "target": target, "label": relation or '相关'}
+            for source, target, relation, _ in self.graph.edges()
+        ]
 
         return {"nodes": nodes, "edges": edges, "node_count": len(nodes), "edge_count": len(edges)}
 
-    def _extract_graph_from_llm(self, document: Document):
-        text = document.content
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
-        chunks = text_splitter.split_text(text)
+    def _extract_graph_from_llm(self, document: Document) -> List[Dict]:
+        return self._extract_document(document)
+
+    @staticmethod
+    def _split_chunks(text: str) -> List[str]:
+        # 按内容决定边界，文档修改后未变的片段指纹不变，可以复用缓存的抽取结果
+        chunks = content_defined_chunks(text, max_size=800, min_size=250)
         
         max_chunks = 6
-        chunks = chunks[:max_chunks]
+        return chunks[:max_chunks]
+
+    def _extract_document(self, document: Document, use_llm: bool = True, force_index: bool = False) -> List[Dict]:
+        """
+        逐片段抽取并持久化.
+        抽取结果按片段内容指纹缓存在 kg_extractions 中，只有新片段才调用 LLM；
+        实体名经过规范化后，片段、实体倒排索引和边写入 kg_* 表，供图谱查询接口使用。
+        """
+        chunks = self._split_chunks(document.content)
+        hashes = [compute_content_hash(chunk) for chunk in chunks]
+        content_hash = compute_content_hash(document.content)
+        if use_llm:
+            # 多个请求同时为同一内容构建图谱时，只调用一次 LLM 抽取 (内容相同的不同文档也共享)
+            extractions, fresh = single_flight.do(("kg_extract", content_hash), self._load_or_extract, chunks, hashes)
+        else:
+            extractions, fresh = self._load_extractions(hashes), {}
+
+        # kg_extractions 中保存原始抽取结果，规范化只作用于索引和图谱
+        results = self._canonicalize_results([extractions.get(chunk_hash) for chunk_hash in hashes])
+        # 索引按文档写入，每个文档都要索引；同一文档的并发构建只写一次，避免重复的片段行
+        single_flight.do(("kg_index", document.id, content_hash), self._index_document,
+                         document.id, chunks, hashes, results, force=force_index or bool(fresh))
+        return [result for result in results if result]
+
+    def _load_or_extract(self, chunks: List[str], hashes: List[str]) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """读取缓存的抽取结果，只为缺失的片段调用 LLM；返回 (全部结果, 新抽取的结果)"""
+        extractions = self._load_extractions(hashes)
+        missing = [i for i, chunk_hash in enumerate(hashes) if chunk_hash not in extractions]
+        fresh = {}
+        if missing:
+            for i, result in zip(missing, self._extract_chunks_with_llm([chunks[i] for i in missing])):
+                # 空结果 (没有可用的 LLM 或解析失败) 不缓存，下次重新抽取
+                if result and (result.get("entities") or result.get("relations")):
+                    fresh[hashes[i]] = result
+            self._save_extractions(fresh)
+            extractions.update(fresh)
+        return extractions, fresh
+
+    def _canonicalize_results(self, results: List[Optional[Dict]]) -> List[Optional[Dict]]:
+        """把抽取结果中的实体名替换为规范实体名，合并后首尾相同的关系丢弃"""
+        normalized = [self._normalize_result(result) if result else None for result in results]
+        names = {entity for item in normalized if item for entity in item[0]}
+        mapping = EntityCanonicalizer.get_instance().canonicalize(self.db, names) if names else {}
+
+        canonical = []
+        for item in normalized:
+            if item is None:
+                canonical.append(None)
+                continue
+            entities, relations = item
+            relations = [(mapping.get(source, source), mapping.get(target, target), relation)
+                         for source, target, relation in relations]
+            canonical.append({
+                "entities": sorted({mapping.get(entity, entity) for entity in entities}),
+                "relations": [{"source": source, "target": target, "relation": relation}
+                              for source, target, relation in relations if source != target],
+            })
+        return canonical
+
+    def reindex_documents(self) -> Dict:
+        """用已缓存的抽取结果重建所有文档的图谱索引 (不调用 LLM)，例如实体规范化规则调整之后"""
+        # 已持久化的别名映射会被直接复用，必须先清空，新规则才会作用到所有名称
+        EntityCanonicalizer.get_instance().clear(self.db)
+        count = 0
+        for document in self.db.query(Document).all():
+            self._extract_document(document, use_llm=False, force_index=True)
+            count += 1
+        return {"documents": count}
+
+    def _load_extractions(self, hashes: List[str]) -> Dict[str, Dict]:
+        if not hashes:
+            return {}
+        rows = self.db.query(GraphExtraction).filter(GraphExtraction.chunk_hash.in_(set(hashes))).all()
+        return {row.chunk_hash: json.loads(row.result) for row in rows}
+
+    def _save_extractions(self, extractions: Dict[str, Dict]):
+        if not extractions:
+            return
+        stmt = sqlite_insert(GraphExtraction).values([
+            {"chunk_hash": chunk_hash, "result": json.dumps(result, ensure_ascii=False)}
+            for chunk_hash, result in extractions.items()
+        ]).on_conflict_do_nothing(index_elements=["chunk_hash"])
+        self.db.execute(stmt)
+        self.db.commit()
 
-        # --- 优化后的并行处理 ---
+    def _index_document(self, document_id: int, chunks: List[str], hashes: List[str],
+                        results: List[Optional[Dict]], force: bool = False):
+        """重建文档的片段、实体倒排索引和边；片段未变且没有新抽取结果时跳过"""
+        indexed = [row.chunk_hash for row in self.db.query(GraphChunk.chunk_hash)
+                   .filter(GraphChunk.document_id == document_id).order_by(GraphChunk.chunk_index)]
+        if indexed == hashes and not force:
+            return
+
+        chunk_ids = [row.id for row in self.db.query(GraphChunk.id).filter(GraphChunk.document_id == document_id)]
+        if chunk_ids:
+            self.db.query(EntityMention).filter(EntityMention.chunk_id.in_(chunk_ids)).delete(synchronize_session=False)
+            self.db.query(GraphRelation).filter(GraphRelation.chunk_id.in_(chunk_ids)).delete(synchronize_session=False)
+            self.db.query(GraphChunk).filter(GraphChunk.id.in_(chunk_ids)).delete(synchronize_session=False)
+
+        for index, (chunk, chunk_hash, result) in enumerate(zip(chunks, hashes, results)):
+            db_chunk = GraphChunk(document_id=document_id, chunk_index=index, chunk_hash=chunk_hash, content=chunk)
+            self.db.add(db_chunk)
+            self.db.flush()
+            entities, relations = self._normalize_result(result or {})
+            self.db.add_all(
+                EntityMention(entity=entity, document_id=document_id, chunk_id=db_chunk.id) for entity in entities
+            )
+            self.db.add_all(
+                GraphRelation(document_id=document_id, chunk_id=db_chunk.id,
+                              source=source, target=target, relation=relation)
+                for source, target, relation in relations
+            )
+        self.db.commit()
+
+    @staticmethod
+    def _normalize_result(data: Dict):
+        """返回 (片段中提到的实体集合, 关系三元组列表)，实体包括关系两端"""
+        entities = {entity.strip() for entity in data.get("entities", []) if isinstance(entity, str) and entity.strip()}
+        relations = []
+        for rel in data.get("relations", []):
+            if not isinstance(rel, dict): continue
+            source, target, relation = (str(rel.get(key) or "").strip() for key in ("source", "target", "relation"))
+            if source and target and relation:
+                relations.append((source, target, relation))
+                entities.update((source, target))
+        return sorted(entities), relations
+
+    @staticmethod
+    def _pack_batches(chunks: List[str]) -> List[List[int]]:
+        """按 token 预算把片段顺序装箱，每批对应一次 LLM 调用；单个超预算的片段独占一批"""
+        budget = settings.KG_EXTRACT_BATCH_TOKENS
+        max_chunks = max(1, settings.KG_EXTRACT_BATCH_MAX_CHUNKS)
+        batches: List[List[int]] = []
+        used = 0
+        for i, chunk in enumerate(chunks):
+            tokens = estimate_tokens(chunk)
+            if not batches or len(batches[-1]) >= max_chunks or used + tokens > budget:
+                batches.append([])
+                used = 0
+            batches[-1].append(i)
+            used += tokens
+        return batches
+
+    def _extract_chunks_with_llm(self, chunks: List[str]) -> List[Optional[Dict]]:
+        """按 token 预算分批并行抽取，返回与 chunks 一一对应的结果，失败的片段为 None"""
+        results: List[Optional[Dict]] = [None] * len(chunks)
+        batches = self._pack_batches(chunks)
         # 降级并发数到 2，以保证稳定性
         with ThreadPoolExecutor(max_workers=2) as executor:
-            futures = []
-            for chunk in chunks:
-                # 提交任务
-                future = executor.submit(self._llm_call, chunk)
-                futures.append(future)
-                # 关键修改：错峰提交，避免瞬间拥堵
-                time.sleep(0.5)
-            
-            # 获取结果
+            futures = {}
+            for n, batch in enumerate(batches):
+                futures[executor.submit(self._extract_batch, [chunks[i] for i in batch])] = batch
+                # 错峰提交，避免瞬间拥堵
+                if n < len(batches) - 1:
+                    time.sleep(0.5)
+
             for future in as_completed(futures):
+                batch = futures[future]
                 try:
-                    result_json = future.result()
-                    self._parse_and_add_to_graph(result_json)
+                    for i, result in zip(batch, future.result()):
+                        results[i] = result
                 except Exception as e:
-                    logger.error(f"Error extracting graph from chunk: {e}")
-                    continue
+                    logger.error(f"Error extracting graph from chunks: {e}")
+        logger.info(f"图谱抽取: {len(chunks)} 个片段, {len(batches)} 批")
+        return results
 
-    def _llm_call(self, text: str) -> Dict:
-        prompt_template = """
-        你是一位友好的数据分析师。请帮我从下面的文本中识别出关键的实体和它们之间的关系，并以JSON格式返回。
+    def _extract_batch(self, texts: List[str]) -> List[Optional[Dict]]:
+        """
+        一次调用抽取多个片段，结果按片段编号归属.
+        输出不是合法 JSON 时先在本地修复 (代码块标记、尾逗号、被截断的括号)，
+        仍失败再请模型只修正 JSON；部分片段没有返回结果时，把这些片段合并再请求一次。
+        """
+        results = self._attribute(self._call_and_parse(self._batch_prompt(texts)), len(texts))
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing and len(missing) < len(texts):
+            retried = self._attribute(self._call_and_parse(self._batch_prompt([texts[i] for i in missing])),
+                                      len(missing))
+            for i, result in zip(missing, retried):
+                results[i] = result
+        return results
 
-        JSON的结构应该包含两个键：
-        - "entities": 一个包含所有实体名称的字符串列表。
-        - "relations": 一个对象列表，每个对象包含 "source", "target", 和 "relation" 三个键。
+    @staticmethod
+    def _batch_prompt(texts: List[str]) -> str:
+        sections = "\n\n".join(f"[片段 {i}]\n{text}" for i, text in enumerate(texts, 1))
+        return f"""你是一位友好的数据分析师。请从下面每个编号的文本片段中分别识别出关键的实体和它们之间的关系，并以JSON格式返回。
 
-        请确保你的回答只包含纯粹的JSON内容，不要有任何额外的解释或Markdown标记。
+JSON的结构为 {{"chunks": [{{"id": 片段编号, "entities": [实体名称字符串], "relations": [{{"source": 实体, "target": 实体, "relation": 关系}}]}}]}}，
+每个片段对应 "chunks" 中的一个对象，"id" 为片段编号 (整数)，没有实体的片段也要返回空列表。
 
-        这是文本：
-        {text}
-        """
-        
-        prompt = PromptTemplate(template=prompt_template, input_variables=["text"])
-        
-        llm: Optional[Runnable] = None
+请确保你的回答只包含纯粹的JSON内容，不要有任何额外的解释或Markdown标记。
+
+{sections}"""
+
+    @staticmethod
+    def _attribute(data: Any, count: int) -> List[Optional[Dict]]:
+        """把模型输出按片段编号 (从 1 开始) 对应回片段；单片段时也接受直接返回的 {entities, relations}"""
+        results: List[Optional[Dict]] = [None] * count
+        if not isinstance(data, dict):
+            return results
+        items = data.get("chunks")
+        if isinstance(items, dict):
+            items = [dict(value, id=key) for key, value in items.items() if isinstance(value, dict)]
+        if not isinstance(items, list):
+            if count == 1 and ("entities" in data or "relations" in data):
+                items = [dict(data, id=1)]
+            else:
+                return results
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(str(item.get("id")).strip()) - 1
+            except ValueError:
+                continue
+            if 0 <= index < count and results[index] is None:
+                results[index] = {"entities": item.get("entities") or [], "relations": item.get("relations") or []}
+        return results
+
+    def _call_and_parse(self, prompt: str) -> Optional[Dict]:
+        raw = self._llm_call(prompt)
+        if raw is None:
+            return None
+        data = self._parse_json(raw)
+        if data is not None:
+            return data
+        logger.warning("图谱抽取输出不是合法 JSON，尝试修复")
+        repaired = self._llm_call(
+            "下面的内容应当是一个 JSON 对象，但格式有误。请修正格式后原样输出，不要增删内容，"
+            f"只输出 JSON:\n\n{raw}"
+        )
+        data = self._parse_json(repaired) if repaired is not None else None
+        if data is None:
+            logger.error(f"Failed to decode JSON from LLM response: {raw[:500]}")
+        return data
+
+    @staticmethod
+    def _parse_json(text: str) -> Optional[Dict]:
+        text = text.strip()
+        if text.startswith("```"):
+            text = re.sub(r"^```(?:json)?\s*", "", text)
+            text = re.sub(r"\s*```$", "", text)
+        start = text.find("{")
+        if start < 0:
+            return None
+        end = text.rfind("}")
+        candidates = [text[start:end + 1]] if end > start else []
+        candidates.append(KnowledgeGraphService._repair_json(text[start:]))
+        for candidate in candidates:
+            try:
+                data = json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(data, dict):
+                return data
+        return None
+
+    @staticmethod
+    def _repair_json(text: str) -> str:
+        """本地修复：去掉尾逗号；输出被截断时回退到最后一个完整的片段结果，再补齐未闭合的括号"""
+        text = re.sub(r",\s*([}\]])", r"\1", text.rstrip())
+        stack, in_string, escaped = [], False, False
+        last_complete, open_at_last = 0, []
+        for i, c in enumerate(text):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif c == "\\":
+                    escaped = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c in "{[":
+                stack.append("}" if c == "{" else "]")
+            elif c in "}]" and stack:
+                stack.pop()
+                if not stack:
+                    return text[:i + 1]
+                # 只在第一、二层 (片段列表中的一项或某个列表) 结束处截断，被截断的片段整体丢弃
+                if len(stack) <= 2:
+                    last_complete, open_at_last = i + 1, list(stack)
+        return text[:last_complete] + "".join(reversed(open_at_last))
+
+    # JSON 模式被后端拒绝的模型，之后不再请求 JSON 模式
+    _json_mode_unsupported: set = set()
+
+    def _llm_call(self, prompt: str) -> Optional[str]:
+        """调用抽取模型，返回原始文本；没有可用的 LLM 时返回 None"""
         if OPENAI_AVAILABLE and settings.OPENAI_API_KEY:
             llm_kwargs = {
                 "openai_api_key": settings.OPENAI_API_KEY,
@@ -161,36 +419,31 @@ class KnowledgeGraphService:
             }
             if settings.OPENAI_API_BASE:
                 llm_kwargs["openai_api_base"] = settings.OPENAI_API_BASE
-            llm = ChatOpenAI(**llm_kwargs)
-            
-        elif QWEN_AVAILABLE and settings.QWEN_API_KEY:
+            llm: Runnable = ChatOpenAI(**llm_kwargs)
+            model = settings.OPENAI_MODEL_NAME
+            if settings.KG_EXTRACT_JSON_MODE and model not in self._json_mode_unsupported:
+                try:
+                    return (llm.bind(response_format={"type": "json_object"}) | StrOutputParser()).invoke(prompt)
+                except (BadRequestError, UnprocessableEntityError) as e:
+                    # 只有后端明确拒绝 response_format 参数时才退回普通输出，靠提示词和修复保证格式；
+                    # 超时、限流、网络错误等照常抛出，不能据此把模型永久标记为不支持
+                    if "response_format" not in str(e):
+                        raise
+                    logger.warning(f"模型 {model} 不支持 JSON 模式，改用普通输出: {e}")
+                    self._json_mode_unsupported.add(model)
+            return (llm | StrOutputParser()).invoke(prompt)
+
+        if QWEN_AVAILABLE and settings.QWEN_API_KEY:
             llm = Tongyi(
                 model_name="qwen-turbo",
                 dashscope_api_key=settings.QWEN_API_KEY,
                 temperature=0,
                 request_timeout=60
             )
-            
-        if not llm:
-            logger.warning("No LLM available for knowledge graph extraction.")
-            return {"entities": [], "relations": []}
+            return (llm | StrOutputParser()).invoke(prompt)
 
-        chain = prompt | llm | StrOutputParser()
-        result_str = chain.invoke({"text": text})
-        
-        json_str = result_str.strip()
-        if json_str.startswith("```json"):
-            json_str = json_str[7:]
-        if json_str.startswith("```"):
-            json_str = json_str[3:]
-        if json_str.endswith("```"):
-            json_str = json_str[:-3]
-            
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError:
-            logger.error(f"Failed to decode JSON from LLM response: {json_str}")
-            return {"entities": [], "relations": []}
+        logger.warning("No LLM available for knowledge graph extraction.")
+        return None
 
     def _parse_and_add_to_graph(self, data: Dict):
         entities = data.get("entities", [])
@@ -198,53 +451,169 @@ class KnowledgeGraphService:
         
         for entity in entities:
             if not isinstance(entity, str): continue
-            if self.graph.has_node(entity):
-                self.graph.nodes[entity]['count'] += 1
-            else:
-                self.graph.add_node(entity, count=1)
+            self.graph.add_node(entity)
                 
         for rel in relations:
+            if not isinstance(rel, dict): continue
             source = rel.get("source")
             target = rel.get("target")
             relation = rel.get("relation")
             
             if source and target and relation:
-                if not self.graph.has_node(source): self.graph.add_node(source, count=1)
-                if not self.graph.has_node(target): self.graph.add_node(target, count=1)
-                    
-                if self.graph.has_edge(source, target):
-                    self.graph[source][target]['weight'] += 1
-                else:
-                    self.graph.add_edge(source, target, relation=relation, weight=1)
+                # 重复的边保留首次的关系名并累加权重
+                self.graph.add_edge(str(source), str(target), str(relation))
 
-    def generate_graph_image_base64(self) -> Optional[str]:
-        if not self.graph.nodes:
+    # --- 图谱查询 (基于持久化的图谱和实体倒排索引) ---
+
+    def top_entities(self, order_by: str = "pagerank", query: Optional[str] = None,
+                     skip: int = 0, limit: int = 20) -> Dict:
+        index = GraphIndex.get_instance()
+        graph = index.get_graph(self.db)
+        degree = graph.degree()
+        mentions = graph.node_counts()
+        if order_by == "degree":
+            scores = degree.astype(np.float64)
+        elif order_by == "mentions":
+            scores = mentions.astype(np.float64)
+        else:
+            scores = index.pagerank(self.db)
+
+        names = graph.node_names()
+        candidates = np.arange(graph.number_of_nodes)
+        if query:
+            needle = query.lower()
+            candidates = np.array([i for i, name in enumerate(names) if needle in name.lower()], dtype=np.int64)
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")] if len(candidates) else candidates
+        page = ranked[skip:skip + limit].tolist()
+        return {
+            "total": len(ranked),
+            "skip": skip,
+            "limit": limit,
+            "items": [
+                {"id": names[i], "label": names[i], "score": float(scores[i]),
+                 "degree": int(degree[i]), "mentions": int(mentions[i])}
+                for i in page
+            ],
+        }
+
+    def neighborhood(self, entity: str, hops: int = 1, skip: int = 0, limit: int = 50,
+                     directed: bool = False) -> Optional[Dict]:
+        graph = GraphIndex.get_instance().get_graph(self.db)
+        center = graph.node_id(entity)
+        if center is None:
             return None
+        distance, _ = graph.bfs(center, max_hops=hops, directed=directed)
+        degree = graph.degree()
+        reached = np.flatnonzero(distance > 0)
+        # 近的在前，同一层按度数从大到小
+        reached = reached[np.lexsort((-degree[reached], distance[reached]))]
+        page = reached[skip:skip + limit]
+
+        names = graph.node_names()
+        keep = np.zeros(graph.number_of_nodes, dtype=bool)
+        keep[page] = True
+        keep[center] = True
+        nodes = [{"id": entity, "label": entity, "distance": 0, "degree": int(degree[center])}]
+        nodes += [{"id": names[i], "label": names[i], "distance": int(distance[i]), "degree": int(degree[i])}
+                  for i in page.tolist()]
+        edges = [{"source": source, "target": target, "label": relation}
+                 for source, target, relation, _ in graph.edges_within(keep)]
+        return {"entity": entity, "hops": hops, "total": len(reached), "skip": skip, "limit": limit,
+                "nodes": nodes, "edges": edges}
+
+    def shortest_path(self, source: str, target: str, directed: bool = False) -> Optional[Dict]:
+        graph = GraphIndex.get_instance().get_graph(self.db)
+        source_id, target_id = graph.node_id(source), graph.node_id(target)
+        if source_id is None or target_id is None:
+            return None
+        path = graph.shortest_path(source_id, target_id, directed=directed)
+        if path is None:
+            return {"source": source, "target": target, "found": False, "length": None, "nodes": [], "edges": []}
+
+        names = graph.node_names()
+        edges = []
+        for u, v in zip(path, path[1:]):
+            relation = graph.relation_between(u, v)
+            if relation is not None:
+                edges.append({"source": names[u], "target": names[v], "label": relation})
+            else:
+                # 无向搜索时沿反向边走过来的
+                edges.append({"source": names[v], "target": names[u], "label": graph.relation_between(v, u)})
+        return {"source": source, "target": target, "found": True, "length": len(path) - 1,
+                "nodes": [names[i] for i in path], "edges": edges}
+
+    def entity_mentions(self, entity: str, skip: int = 0, limit: int = 20) -> Dict:
+        base = self.db.query(EntityMention).filter(EntityMention.entity == entity)
+        total = base.count()
+        rows = (
+            self.db.query(GraphChunk, Document.filename)
+            .join(EntityMention, EntityMention.chunk_id == GraphChunk.id)
+            .join(Document, Document.id == GraphChunk.document_id)
+            .filter(EntityMention.entity == entity)
+            .order_by(GraphChunk.document_id, GraphChunk.chunk_index)
+            .offset(skip).limit(limit)
+            .all()
+        )
+        items = [
+            {"document_id": chunk.document_id, "filename": filename, "chunk_index": chunk.chunk_index,
+             "snippet": self._snippet(chunk.content, entity)}
+            for chunk, filename in rows
+        ]
+        return {"entity": entity, "total": total, "skip": skip, "limit": limit, "items": items}
+
+    @staticmethod
+    def _snippet(text: str, entity: str, radius: int = 60) -> str:
+        pos = (text or "").find(entity)
+        if pos < 0:
+            return (text or "")[:radius * 2]
+        start = max(0, pos - radius)
+        end = min(len(text), pos + len(entity) + radius)
+        return ("..." if start > 0 else "") + text[start:end] + ("..." if end < len(text) else "")
+
+    def generate_graph_image(self) -> Optional[bytes]:
+        """当前图谱的 PNG 图像 (原始字节)"""
+        if not self.graph:
+            return None
+        # 相同图谱的并发渲染请求共享同一次绘制
+        return single_flight.do(("kg_image", self._graph_fingerprint()), self._render_graph_image)
+
+    def generate_graph_image_base64(self) -> Optional[str]:
+        """供 JSON 接口返回的 base64 图像"""
+        image = self.generate_graph_image()
+        return base64.b64encode(image).decode("ascii") if image else None
+
+    def _graph_fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for node in sorted(self.graph.node_names()):
+            digest.update(f"n:{node}\x00".encode("utf-8"))
+        for source, target, relation in sorted((u, v, r) for u, v, r, _ in self.graph.edges()):
+            digest.update(f"e:{source}\x00{target}\x00{relation}\x00".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _render_graph_image(self) -> bytes:
+        # 使用面向对象的 Figure 接口而不是 pyplot 全局状态，多线程同时渲染互不干扰
+        fig = Figure(figsize=(16, 12), dpi=150)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        # 布局和绘制需要 networkx 图，只在这里转换一次；中心性复用紧凑图上的缓存结果
+        graph = self.graph.to_networkx()
+        pos = nx.spring_layout(graph, k=0.8, iterations=50)
         
-        plt.figure(figsize=(16, 12), dpi=150)
-        pos = nx.spring_layout(self.graph, k=0.8, iterations=50)
-        
-        centrality = nx.degree_centrality(self.graph)
-        node_sizes = [(centrality.get(node, 0) * 2000) + 500 for node in self.graph.nodes()]
+        node_sizes = (self.graph.degree_centrality() * 2000 + 500).tolist()
 
         font_family = CHINESE_FONT_PROP.get_name() if CHINESE_FONT_PROP else 'sans-serif'
         
-        nx.draw_networkx_nodes(self.graph, pos, node_size=node_sizes, node_color='#5470C6', alpha=0.8)
-        nx.draw_networkx_labels(self.graph, pos, font_size=10, font_color='white', font_family=font_family)
+        nx.draw_networkx_nodes(graph, pos, ax=ax, node_size=node_sizes, node_color='#5470C6', alpha=0.8)
+        nx.draw_networkx_labels(graph, pos, ax=ax, font_size=10, font_color='white', font_family=font_family)
         
-        nx.draw_networkx_edges(self.graph, pos, edge_color='gray', alpha=0.6, arrows=True)
-        edge_labels = nx.get_edge_attributes(self.graph, 'relation')
-        nx.draw_networkx_edge_labels(self.graph, pos, edge_labels=edge_labels, font_size=8, font_family=font_family)
+        nx.draw_networkx_edges(graph, pos, ax=ax, edge_color='gray', alpha=0.6, arrows=True)
+        edge_labels = nx.get_edge_attributes(graph, 'relation')
+        nx.draw_networkx_edge_labels(graph, pos, ax=ax, edge_labels=edge_labels, font_size=8, font_family=font_family)
         
         title_font_kwargs = {'fontproperties': CHINESE_FONT_PROP} if CHINESE_FONT_PROP else {}
-        plt.title("文档知识图谱 (AI生成)", fontsize=20, **title_font_kwargs)
-        plt.axis('off')
+        ax.set_title("文档知识图谱 (AI生成)", fontsize=20, **title_font_kwargs)
+        ax.axis('off')
         
         buffer = BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        buffer.close()
-        plt.close()
-        
-        return image_base64
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        return buffer.getvalue()
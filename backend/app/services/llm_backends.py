@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from typing import Dict, List
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def get_arena_backends() -> List[Dict]:
+    """多模型竞技场配置的全部后端，BASE / KEY 为空时复用全局配置"""
+    return [
+        {"name": settings.ARENA_MODEL_1_NAME, "base": settings.ARENA_MODEL_1_BASE, "key": settings.ARENA_MODEL_1_KEY},
+        {"name": settings.ARENA_MODEL_2_NAME, "base": settings.ARENA_MODEL_2_BASE, "key": settings.ARENA_MODEL_2_KEY},
+        {"name": settings.ARENA_MODEL_3_NAME, "base": settings.ARENA_MODEL_3_BASE, "key": settings.ARENA_MODEL_3_KEY},
+        {"name": settings.ARENA_MODEL_4_NAME, "base": settings.ARENA_MODEL_4_BASE, "key": settings.ARENA_MODEL_4_KEY},
+    ]
+
+
+def get_all_backends() -> List[Dict]:
+    """默认单模型与竞技场模型合并后的全部后端，按模型名去重"""
+    backends = [{"name": settings.OPENAI_MODEL_NAME, "base": settings.OPENAI_API_BASE, "key": settings.OPENAI_API_KEY}]
+    backends += get_arena_backends()
+    unique = {}
+    for backend in backends:
+        unique.setdefault(backend["name"], backend)
+    return list(unique.values())
+
+
+class CircuitBreaker:
+    """
+    单个后端的熔断器.
+    连续失败或慢调用达到阈值后断开，冷却期内直接跳过该后端；
+    冷却结束后放行一次试探调用 (half_open)，成功则恢复，失败则重新断开；
+    试探调用被取消时归还名额，超过冷却时间仍未有结果的试探视为丢失，重新放行。
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, cooldown_seconds: float, slow_call_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def _probe_busy(self) -> bool:
+        return self._probe_in_flight and time.monotonic() - self._probe_started_at < self.cooldown_seconds
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_busy():
+                self._probe_in_flight = True
+                self._probe_started_at = time.monotonic()
+                return True
+            return False
+
+    def is_available(self) -> bool:
+        """只查看状态、不占用试探名额，供路由排序使用"""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.cooldown_seconds
+            if self.state == self.HALF_OPEN:
+                return not self._probe_busy()
+            return True
+
+    def record_success(self, latency: float):
+        if latency > self.slow_call_seconds:
+            self.record_failure(reason=f"slow call {latency:.1f}s")
+            return
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """调用在真正请求后端之前被取消：归还试探名额，不计成功也不计失败"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, reason: str = ""):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"熔断器断开: {self.name} ({reason})")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.state != self.CLOSED else 0.0,
+            }
+
+
+class CircuitBreakerRegistry:
+    _breakers: Dict[str, CircuitBreaker] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name: str) -> CircuitBreaker:
+        with cls._lock:
+            breaker = cls._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold=settings.ARENA_BREAKER_FAILURE_THRESHOLD,
+                    cooldown_seconds=settings.ARENA_BREAKER_COOLDOWN_SECONDS,
+                    slow_call_seconds=settings.ARENA_SLOW_CALL_SECONDS,
+                )
+                cls._breakers[name] = breaker
+            return breaker
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Dict]:
+        with cls._lock:
+            breakers = dict(cls._breakers)
+        return {name: breaker.snapshot() for name, breaker in breakers.items()}
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.llm_backends import get_all_backends, CircuitBreakerRegistry
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OBJECTIVES = ("fastest", "cheapest", "capable")
+
+
+class _BackendStats:
+    """单个后端最近 ROUTER_WINDOW_SIZE 次调用的滚动窗口"""
+
+    def __init__(self, window_size: int):
+        self.latencies: Deque[float] = deque(maxlen=window_size)
+        self.outcomes: Deque[bool] = deque(maxlen=window_size)
+        self.tokens: Deque[int] = deque(maxlen=window_size)
+        self.total_calls = 0
+        self.total_tokens = 0
+
+    def record(self, latency: float, ok: bool, tokens: int):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+            self.tokens.append(tokens)
+        self.total_calls += 1
+        self.total_tokens += tokens
+
+    @property
+    def samples(self) -> int:
+        return len(self.outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        return float(np.percentile(self.latencies, q)) if self.latencies else None
+
+    @property
+    def avg_tokens(self) -> Optional[float]:
+        return (sum(self.tokens) / len(self.tokens)) if self.tokens else None
+
+
+class ModelRouter:
+    """
+    单模型问答的后端路由.
+    按后端记录滚动的 p50/p95 延迟、错误率和 token 用量，根据请求的目标
+    (fastest / cheapest / capable) 给出候选顺序，调用方依次尝试实现故障转移。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "ModelRouter":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(window_size=settings.ROUTER_WINDOW_SIZE)
+        return cls._instance
+
+    def __init__(self, window_size: int):
+        self.window_size = window_size
+        self._stats: Dict[str, _BackendStats] = {}
+        self._decisions: Deque[Dict] = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def _get_stats(self, name: str) -> _BackendStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _BackendStats(self.window_size)
+        return stats
+
+    def record(self, name: str, latency: float, ok: bool, tokens: int = 0):
+        with self._lock:
+            self._get_stats(name).record(latency, ok, tokens)
+
+    @staticmethod
+    def _price(name: str) -> Optional[float]:
+        return settings.MODEL_COST_PER_1K_TOKENS.get(name)
+
+    def rank(self, objective: Optional[str] = None) -> List[Dict]:
+        """返回按目标排序的候选后端，熔断中或错误率过高的后端排在最后"""
+        objective = objective if objective in OBJECTIVES else settings.ROUTER_DEFAULT_OBJECTIVE
+        backends = get_all_backends()
+
+        with self._lock:
+            def sort_key(backend: Dict):
+                stats = self._get_stats(backend["name"])
+                healthy = (CircuitBreakerRegistry.get(backend["name"]).is_available()
+                           and stats.error_rate <= settings.ROUTER_MAX_ERROR_RATE)
+                # 样本不足的后端视为最优，先试探几次以获得统计
+                exploring = stats.samples < settings.ROUTER_MIN_SAMPLES
+                p95 = stats.latency_percentile(95)
+                latency = 0.0 if exploring or p95 is None else p95
+                if objective == "cheapest":
+                    price = self._price(backend["name"])
+                    cost = (price if price is not None else float("inf")) * (stats.avg_tokens or 1000) / 1000
+                    primary = cost
+                elif objective == "capable":
+                    primary = -settings.MODEL_CAPABILITY_RANK.get(backend["name"], 0)
+                else:
+                    primary = latency
+                return (not healthy, primary, latency)
+
+            ranked = sorted(backends, key=sort_key)
+        return ranked
+
+    def record_decision(self, objective: Optional[str], attempts: List[Dict]):
+        with self._lock:
+            self._decisions.append({
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "objective": objective or settings.ROUTER_DEFAULT_OBJECTIVE,
+                "attempts": attempts,
+                "chosen": next((a["model"] for a in attempts if a["ok"]), None),
+            })
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            backends = {}
+            for backend in get_all_backends():
+                name = backend["name"]
+                stats = self._get_stats(name)
+                p50, p95 = stats.latency_percentile(50), stats.latency_percentile(95)
+                price = self._price(name)
+                backends[name] = {
+                    "samples": stats.samples,
+                    "total_calls": stats.total_calls,
+                    "p50_latency": round(p50, 3) if p50 is not None else None,
+                    "p95_latency": round(p95, 3) if p95 is not None else None,
+                    "error_rate": round(stats.error_rate, 3),
+                    "avg_tokens": round(stats.avg_tokens, 1) if stats.avg_tokens is not None else None,
+                    "total_tokens": stats.total_tokens,
+                    "cost_per_1k_tokens": price,
+                    "estimated_cost": round(stats.total_tokens / 1000 * price, 4) if price is not None else None,
+                    "capability_rank": settings.MODEL_CAPABILITY_RANK.get(name, 0),
+                    "circuit": CircuitBreakerRegistry.get(name).snapshot(),
+                }
+            decisions = list(self._decisions)
+        return {
+            "default_objective": settings.ROUTER_DEFAULT_OBJECTIVE,
+            "objectives": list(OBJECTIVES),
+            "backends": backends,
+            "ranking": {objective: [b["name"] for b in self.rank(objective)] for objective in OBJECTIVES},
+            "recent_decisions": decisions,
+        }
@@ -3,21 +3,34 @@ import os
 os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
 # ------------------------------------------
 
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Tuple
 from sqlalchemy.orm import Session
 import re
+import time
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 from langchain.chains import RetrievalQA
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
 from langchain_core.documents import Document as LangchainDocument
 
 from app.models.document import Document
 from app.models.question import Question
 from app.schemas.question import QuestionCreate
 from app.core.config import settings
+from app.core.batch_writer import batch_writer
+from app.core.single_flight import single_flight
+from app.services.document_service import compute_content_hash
+from app.services.semantic_cache import SemanticAnswerCache
+from app.services.conversation_store import ConversationStore, ConversationState
+from app.core.tokens import estimate_tokens, truncate_to_tokens
+from app.services.llm_backends import get_arena_backends, CircuitBreakerRegistry
+from app.services.model_router import ModelRouter
+from app.services.vector_index_cache import VectorIndexCache
+from app.services import chunk_store, embedding_migration
+from app.services.graph_retrieval import GraphRetriever
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -25,24 +38,87 @@ logger = logging.getLogger(__name__)
 
 # --- 架构优化：单例模式管理 Embedding 模型 ---
 class EmbeddingManager:
+    """
+    按模型名管理共享的 Embedding 实例.
+    _instance 始终是当前生效模型的实例；迁移期间目标模型另外加载，
+    迁移完成时 activate 一次性替换 (生效模型, 实例)，之前已取得旧实例的请求不受影响。
+    """
     _instance = None
+    _active_model: Optional[str] = None
+    _models: Dict[str, Any] = {}
+    # _lock 只保护上面的状态，从不在加载模型时持有；同一模型的并发加载由各自的加载锁串行化
+    _lock = threading.RLock()
+    _load_locks: Dict[str, threading.Lock] = {}
 
     @classmethod
-    def get_embeddings(cls):
-        if cls._instance is None:
-            logger.info("首次初始化 HuggingFaceEmbeddings 模型...")
+    def active_model(cls) -> str:
+        return cls._active_model or settings.EMBEDDING_MODEL_NAME
+
+    @classmethod
+    def get_embeddings(cls, model_name: Optional[str] = None):
+        if model_name is not None and model_name != cls.active_model():
+            return cls._load(model_name)
+        return cls.current()[1]
+
+    @classmethod
+    def current(cls) -> Tuple[str, Any]:
+        """原子地取得 (生效模型名, 实例)，二者总是对应的"""
+        while True:
+            with cls._lock:
+                if cls._instance is not None:
+                    return cls.active_model(), cls._instance
+                model_name = cls.active_model()
+            embeddings = cls._load(model_name)
+            with cls._lock:
+                # 加载期间生效模型可能已被切换，此时按新的生效模型重试
+                if cls._instance is None and cls.active_model() == model_name:
+                    cls._instance = embeddings
+
+    @classmethod
+    def register(cls, model_name: str, embeddings):
+        """登记已构造好的实例 (例如本地模型或测试用的假模型)，之后按该模型名取用"""
+        with cls._lock:
+            cls._models[model_name] = embeddings
+
+    @classmethod
+    def activate(cls, model_name: str):
+        """切换生效模型；目标模型尚未加载时先加载"""
+        embeddings = cls._load(model_name)
+        with cls._lock:
+            if cls._instance is not None:
+                cls._models.setdefault(cls.active_model(), cls._instance)
+            cls._active_model, cls._instance = model_name, embeddings
+        logger.info(f"生效的 embedding 模型切换为 {model_name}")
+
+    @classmethod
+    def _load(cls, model_name: str):
+        """
+        取得指定模型的实例，首次使用时加载.
+        加载 (可能需要下载模型) 时不持有 _lock，迁移线程加载目标模型期间，使用当前模型的请求不受影响。
+        """
+        with cls._lock:
+            if model_name in cls._models:
+                return cls._models[model_name]
+            load_lock = cls._load_locks.setdefault(model_name, threading.Lock())
+        with load_lock:
+            with cls._lock:
+                if model_name in cls._models:
+                    return cls._models[model_name]
+            logger.info(f"首次初始化 HuggingFaceEmbeddings 模型 {model_name}...")
             try:
-                cls._instance = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+                embeddings = HuggingFaceEmbeddings(model_name=model_name)
                 logger.info("HuggingFaceEmbeddings 模型加载成功。")
             except Exception as e:
                 logger.error(f"加载 HuggingFaceEmbeddings 模型失败: {e}")
                 raise e
-        return cls._instance
+            with cls._lock:
+                return cls._models.setdefault(model_name, embeddings)
 # ------------------------------------------
 
 # 条件导入不同平台的模块
 try:
     from langchain_openai import ChatOpenAI
+    from langchain_community.callbacks import get_openai_callback
     OPENAI_AVAILABLE = True
     logger.info("OpenAI模块导入成功")
 except ImportError as e:
@@ -59,116 +135,554 @@ except ImportError as e:
     Tongyi = None
     logger.info(f"通义千问(Tongyi)模块导入失败: {e}")
 
+# 会话摘要折叠在后台执行，不占用回答路径
+_history_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="qa-history")
+# 竞技场调用使用进程级共享线程池，超时返回时不必等待挂起的调用结束
+_arena_executor = ThreadPoolExecutor(max_workers=settings.ARENA_MAX_WORKERS, thread_name_prefix="arena")
+
 
 class QAService:
     def __init__(self, db: Session):
         self.db = db
-        # 在服务初始化时就准备好 embedding 模型
-        self.embeddings = EmbeddingManager.get_embeddings()
+        # 在服务初始化时就准备好 embedding 模型；其他 worker 完成模型迁移后在这里跟进切换
+        embedding_migration.sync_active_model(db)
+        self.embedding_model, self.embeddings = EmbeddingManager.current()
 
     def multi_model_qa(self, document_id: int, question: str) -> Dict:
         document = self.db.query(Document).filter(Document.id == document_id).first()
         if not document:
             return {"error": "文档未找到"}
 
-        models_config = [
-            {"name": settings.ARENA_MODEL_1_NAME, "base": settings.ARENA_MODEL_1_BASE, "key": settings.ARENA_MODEL_1_KEY},
-            {"name": settings.ARENA_MODEL_2_NAME, "base": settings.ARENA_MODEL_2_BASE, "key": settings.ARENA_MODEL_2_KEY},
-            {"name": settings.ARENA_MODEL_3_NAME, "base": settings.ARENA_MODEL_3_BASE, "key": settings.ARENA_MODEL_3_KEY},
-            {"name": settings.ARENA_MODEL_4_NAME, "base": settings.ARENA_MODEL_4_BASE, "key": settings.ARENA_MODEL_4_KEY},
-        ]
+        cached, question_vector = self._lookup_cached_answer(document, question, "multi_model")
+        if cached:
+            return {
+                "document_id": document_id,
+                "question": question,
+                "answers": cached["answer"],
+                "cached": True,
+                "cached_question": cached["question"],
+            }
 
         results = {}
-        
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            future_to_model = {
-                executor.submit(
-                    self._llm_qa, 
-                    document.content, 
-                    question, 
-                    document.filename, 
-                    model_config
-                ): model_config["name"] 
-                for model_config in models_config
+        statuses = {}
+        for event in self.iter_multi_model_answers(document, question):
+            model_name = event["model"]
+            results[model_name] = event["answer"]
+            statuses[model_name] = {"status": event["status"], "latency": event["latency"]}
+
+        if all(status["status"] == "ok" for status in statuses.values()):
+            self._store_cached_answer(document, question, question_vector, "multi_model", results)
+
+        return {
+            "document_id": document_id,
+            "question": question,
+            "answers": results,
+            "statuses": statuses
+        }
+
+    def iter_multi_model_answers(self, document: Document, question: str) -> Iterator[Dict]:
+        """
+        多模型竞技场的核心调度，按完成顺序逐个产出各模型的结果.
+        - 整个请求受 ARENA_DEADLINE_SECONDS 约束，超时的模型标记为 timeout，其余照常返回；
+        - 某个模型超过 ARENA_HEDGE_DELAY_SECONDS 仍未返回时，再发起一次对冲请求，先到先用；
+        - 熔断器断开的模型直接标记为 skipped，不再占用线程。
+        调用放在共享线程池中执行，超时后不等待挂起的线程，挂起调用由 LLM 客户端超时自行结束。
+        """
+        started = time.monotonic()
+        deadline = started + settings.ARENA_DEADLINE_SECONDS
+        hedge_delay = settings.ARENA_HEDGE_DELAY_SECONDS
+
+        pending: Dict[Future, str] = {}
+        configs: Dict[str, Dict] = {}
+        hedged = set()
+        finished = set()
+        # 已有调用真正执行过的模型 (对冲请求仍在进行时先失败的那次调用)
+        failed_calls = set()
+
+        for backend in get_arena_backends():
+            model_name = backend["name"]
+            if not CircuitBreakerRegistry.get(model_name).allow():
+                finished.add(model_name)
+                yield {"model": model_name, "status": "skipped", "latency": 0.0,
+                       "answer": "模型近期失败或响应过慢，已暂时跳过"}
+                continue
+            # 竞技场由本方法负责对冲和超时，关闭客户端自带的重试
+            configs[model_name] = {
+                **backend,
+                "timeout": settings.ARENA_DEADLINE_SECONDS,
+                "max_retries": 0,
             }
-            
-            for future in as_completed(future_to_model):
-                model_name = future_to_model[future]
+            pending[self._submit_arena_call(document, question, configs[model_name])] = model_name
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait_until = deadline
+            if hedge_delay > 0 and set(pending.values()) - hedged:
+                wait_until = min(wait_until, max(started + hedge_delay, now))
+            done, _ = wait(list(pending), timeout=max(0.0, wait_until - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                model_name = pending.pop(future)
+                if model_name in finished:
+                    continue
+                latency = round(time.monotonic() - started, 2)
+                breaker = CircuitBreakerRegistry.get(model_name)
                 try:
                     answer = future.result()
-                    results[model_name] = answer
                 except Exception as e:
+                    # 对冲请求仍在进行时，等它的结果再下结论
+                    if model_name in pending.values():
+                        failed_calls.add(model_name)
+                        continue
                     logger.error(f"Model {model_name} failed: {e}")
-                    results[model_name] = f"模型调用失败: {str(e)}"
+                    breaker.record_failure(reason=str(e))
+                    finished.add(model_name)
+                    yield {"model": model_name, "status": "error", "latency": latency,
+                           "answer": f"模型调用失败: {str(e)}"}
+                    continue
+                breaker.record_success(latency)
+                finished.add(model_name)
+                self._save_question(QuestionCreate(
+                    document_id=document.id,
+                    question=question,
+                    answer=f"【{model_name}】{answer}"
+                ))
+                yield {"model": model_name, "status": "ok", "latency": latency, "answer": answer}
 
-        return {
-            "document_id": document_id,
-            "question": question,
-            "answers": results
-        }
+            if hedge_delay > 0 and time.monotonic() - started >= hedge_delay:
+                for model_name in set(pending.values()) - finished - hedged:
+                    hedged.add(model_name)
+                    logger.info(f"模型 {model_name} 超过 {hedge_delay}s 未返回，发起对冲请求")
+                    pending[self._submit_arena_call(document, question, configs[model_name])] = model_name
 
-    def _llm_qa(self, content: str, question: str, context: str, model_config: Dict = None) -> str:
+        # cancel() 只对还在线程池队列中、尚未开始执行的调用成功；
+        # 这些调用没有真正请求过模型，只报告超时，不计入熔断器，避免线程池拥塞时误熔断健康的后端；
+        # 但必须归还可能占用的试探名额，否则 half_open 的熔断器再也不会放行
+        started_calls = set(failed_calls)
+        for future, model_name in pending.items():
+            if not future.cancel():
+                started_calls.add(model_name)
+        for model_name in dict.fromkeys(pending.values()):
+            if model_name in finished:
+                continue
+            finished.add(model_name)
+            breaker = CircuitBreakerRegistry.get(model_name)
+            if model_name in started_calls:
+                breaker.record_failure(reason="deadline exceeded")
+            else:
+                breaker.release_probe()
+                logger.warning(f"模型 {model_name} 的调用在截止时间前未能开始执行 (竞技场线程池已满)")
+            yield {"model": model_name, "status": "timeout", "latency": settings.ARENA_DEADLINE_SECONDS,
+                   "answer": f"模型响应超时 (超过 {settings.ARENA_DEADLINE_SECONDS} 秒)"}
+
+    def _submit_arena_call(self, document: Document, question: str, model_config: Dict) -> Future:
+        return _arena_executor.submit(self._llm_qa, document.content, question, document.filename, model_config)
+
+    def _lookup_cached_answer(self, document: Document, question: str, mode: str):
+        """
+        在语义缓存中查找相近问题的答案.
+        返回 (命中结果或 None, 问题向量)，向量留给未命中时写回缓存复用。
+        """
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return None, None
+        try:
+            question_vector = self.embeddings.embed_query(question)
+        except Exception as e:
+            logger.error(f"语义缓存: 问题向量化失败: {e}")
+            return None, None
+        cached = SemanticAnswerCache.get_instance().lookup(
+            document.id, self._answer_fingerprint(document), mode, question_vector
+        )
+        if cached:
+            logger.info(f"语义缓存命中 (相似度 {cached['similarity']:.3f}): {question} -> {cached['question']}")
+        return cached, question_vector
+
+    def _answer_fingerprint(self, document: Document) -> str:
+        # 问题向量与 embedding 模型绑定，切换模型后旧模型下缓存的答案随之作废
+        return VectorIndexCache.key_for(compute_content_hash(document.content), self.embedding_model)
+
+    def _store_cached_answer(self, document: Document, question: str, question_vector, mode: str, answer: Any):
+        if question_vector is None:
+            return
+        SemanticAnswerCache.get_instance().store(
+            document.id, self._answer_fingerprint(document), mode, question, question_vector, answer
+        )
+
+    def _llm_qa(self, content: str, question: str, context: str, model_config: Dict = None,
+                objective: Optional[str] = None, graph_chunks: Optional[List[str]] = None) -> str:
         if model_config:
-            target_model_name = model_config.get("name")
-            target_model_base = model_config.get("base")
-            target_model_key = model_config.get("key")
-        else:
-            target_model_name = settings.OPENAI_MODEL_NAME
-            target_model_base = settings.OPENAI_API_BASE
-            target_model_key = settings.OPENAI_API_KEY
-        
+            return self._call_backend(content, question, model_config, graph_chunks)
+
+        # 未指定模型时由路由器按目标选择后端，失败时依次故障转移
+        router = ModelRouter.get_instance()
+        ranked = router.rank(objective)
+        attempts = []
+        last_error = None
+        for backend in ranked[:settings.ROUTER_MAX_ATTEMPTS]:
+            breaker = CircuitBreakerRegistry.get(backend["name"])
+            if not breaker.allow():
+                continue
+            started = time.monotonic()
+            try:
+                answer = self._call_backend(content, question, backend, graph_chunks)
+            except Exception as e:
+                breaker.record_failure(reason=str(e))
+                attempts.append({"model": backend["name"], "ok": False, "error": str(e)})
+                last_error = e
+                continue
+            breaker.record_success(time.monotonic() - started)
+            attempts.append({"model": backend["name"], "ok": True})
+            router.record_decision(objective, attempts)
+            return answer
+
+        if not attempts and ranked:
+            # 所有后端都在熔断中时，仍尝试排名第一的后端，而不是直接失败
+            try:
+                answer = self._call_backend(content, question, ranked[0], graph_chunks)
+                attempts.append({"model": ranked[0]["name"], "ok": True})
+                router.record_decision(objective, attempts)
+                return answer
+            except Exception as e:
+                attempts.append({"model": ranked[0]["name"], "ok": False, "error": str(e)})
+                last_error = e
+
+        router.record_decision(objective, attempts)
+        raise last_error or Exception("没有可用的LLM服务配置")
+
+    def _call_backend(self, content: str, question: str, model_config: Dict,
+                      graph_chunks: Optional[List[str]] = None) -> str:
+        target_model_name = model_config.get("name")
+        target_model_base = model_config.get("base")
+        target_model_key = model_config.get("key")
+
         logger.info(f"开始处理问答请求 - 模型: {target_model_name}")
 
+        # 超时、重试次数等客户端参数
+        llm_options = {k: model_config[k] for k in ("timeout", "max_retries") if k in model_config}
+
         if OPENAI_AVAILABLE:
+            started = time.monotonic()
             try:
-                return self._openai_qa(content, question, target_model_name, target_model_base, target_model_key)
+                with get_openai_callback() as usage:
+                    answer = self._openai_qa(content, question, target_model_name, target_model_base,
+                                             target_model_key, graph_chunks=graph_chunks, **llm_options)
             except Exception as e:
                 logger.error(f"OpenAI 兼容模型 {target_model_name} 调用失败: {e}")
+                ModelRouter.get_instance().record(target_model_name, time.monotonic() - started, ok=False)
                 raise e
+            tokens = usage.total_tokens or estimate_tokens(question) + estimate_tokens(answer)
+            ModelRouter.get_instance().record(target_model_name, time.monotonic() - started, ok=True, tokens=tokens)
+            return answer
 
         raise Exception("没有可用的LLM服务配置")
 
-    def _openai_qa(self, content: str, question: str, model_name: str, api_base: Optional[str], api_key: Optional[str]) -> str:
-        documents = [LangchainDocument(page_content=content)]
-        text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-        texts = text_splitter.split_documents(documents)
+    def _openai_qa(self, content: str, question: str, model_name: str, api_base: Optional[str], api_key: Optional[str],
+                   graph_chunks: Optional[List[str]] = None, **llm_options) -> str:
+        db = self._build_vector_store(content)
+
+        llm = self._create_llm(model_name, api_base, api_key, **llm_options)
+
+        qa = RetrievalQA.from_chain_type(
+            llm=llm,
+            chain_type="stuff",
+            retriever=db.as_retriever()
+        )
+
+        if graph_chunks is None:
+            result = qa.invoke({"query": question})
+            return result['result']
+
+        # 图谱增强检索：沿用同一个 stuff 提示词，只替换送入的片段
+        documents = self._merge_graph_context(db, question, graph_chunks)
+        result = qa.combine_documents_chain.invoke({"input_documents": documents, "question": question})
+        return result['output_text']
+
+    def _merge_graph_context(self, vector_store: FAISS, question: str, graph_chunks: List[str],
+                             max_chunks: Optional[int] = None) -> List[LangchainDocument]:
+        """图谱命中的片段在前，再用向量检索结果补足到 max_chunks，与已选片段重叠的向量片段跳过"""
+        max_chunks = max_chunks or settings.GRAPH_RETRIEVAL_MAX_CHUNKS
+        vector_k = min(settings.GRAPH_RETRIEVAL_VECTOR_K, max_chunks)
+        selected = list(graph_chunks[:max_chunks - vector_k])
+        for doc in vector_store.similarity_search(question, k=max_chunks):
+            if len(selected) >= max_chunks:
+                break
+            text = doc.page_content
+            if any(text in chunk or chunk in text for chunk in selected):
+                continue
+            selected.append(text)
+        # 向量检索不足时，用剩余的图谱片段填满
+        for chunk in graph_chunks[max_chunks - vector_k:]:
+            if len(selected) >= max_chunks:
+                break
+            selected.append(chunk)
+        return [LangchainDocument(page_content=text) for text in selected]
+    
+    def _build_vector_store(self, content: str) -> FAISS:
+        # 索引按内容指纹和 embedding 模型缓存并落盘；同一内容的并发请求 (例如竞技场的四个模型) 只加载/构建一次
+        key = VectorIndexCache.key_for(compute_content_hash(content), self.embedding_model)
+        return single_flight.do(
+            ("vector_index", key),
+            VectorIndexCache.get_instance().get_or_build,
+            key, self.embeddings, lambda: self._create_vector_store(content)
+        )
+
+    def _create_vector_store(self, content: str) -> FAISS:
+        # 片段向量按内容指纹缓存，文档修改后只为新增或改动的片段计算向量
+        texts = chunk_store.split_for_embedding(content)
+        vectors = chunk_store.embed_chunks(texts, self.embeddings, self.embedding_model)
 
         # 使用共享的 embedding 实例
-        db = FAISS.from_documents(texts, self.embeddings)
+        return FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings)
 
+    def _create_llm(self, model_name: str, api_base: Optional[str] = None, api_key: Optional[str] = None,
+                    **llm_options):
         final_api_key = api_key if api_key else settings.OPENAI_API_KEY
         if not final_api_key:
             raise ValueError(f"模型 {model_name} 缺少 API Key")
 
         final_api_base = api_base if api_base else settings.OPENAI_API_BASE
-        
+
         llm_kwargs = {
             "api_key": final_api_key,
             "model_name": model_name,
             "temperature": 0
         }
-        
+
         if final_api_base:
             llm_kwargs["base_url"] = final_api_base
+        llm_kwargs.update(llm_options)
 
-        llm = ChatOpenAI(**llm_kwargs)
+        return ChatOpenAI(**llm_kwargs)
 
-        qa = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=db.as_retriever()
+    def _invoke_llm(self, prompt: str, model_name: Optional[str] = None) -> str:
+        if not OPENAI_AVAILABLE:
+            raise Exception("没有可用的LLM服务配置")
+        llm = self._create_llm(model_name or settings.OPENAI_MODEL_NAME)
+        return llm.invoke(prompt).content.strip()
+
+    def _invoke_cheap_llm(self, prompt: str) -> str:
+        """问题改写、历史压缩等辅助任务使用的廉价模型"""
+        return self._invoke_llm(prompt, settings.QA_REWRITE_MODEL_NAME)
+
+    def single_document_qa(self, document_id: int, question: str, history: List[Dict] = [],
+                           conversation_id: Optional[str] = None, objective: Optional[str] = None,
+                           retrieval: Optional[str] = None) -> Dict:
+        document = self.db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            return {"error": "文档未找到"}
+
+        # 会话状态保存在服务端，客户端回传 conversation_id；history 只在服务端没有该会话时使用
+        store = ConversationStore.get_instance()
+        state = store.get(conversation_id, document_id)
+        # 会话已过期、被淘汰或保存在其他 worker 上时，用客户端携带的历史重建并在响应中告知
+        conversation_reset = False
+        if state is None:
+            conversation_reset = bool(conversation_id)
+            state = store.create(document_id)
+            self._seed_conversation(state, question, history)
+
+        standalone_question = self._format_query_with_history(question, state)
+
+        # 图谱模式下问题没有链接到任何实体 (或文档尚未构建图谱) 时退回向量检索
+        retrieval = retrieval or settings.QA_DEFAULT_RETRIEVAL
+        graph_chunks, linked_entities = None, []
+        if retrieval == "graph":
+            graph_context = GraphRetriever(self.db).retrieve(document_id, standalone_question)
+            linked_entities = graph_context["entities"]
+            graph_chunks = graph_context["chunks"] or None
+        retrieval = "graph" if graph_chunks else "vector"
+        cache_mode = "single_graph" if graph_chunks else "single"
+
+        cached, question_vector = self._lookup_cached_answer(document, standalone_question, cache_mode)
+        if cached:
+            answer = cached["answer"]
+        else:
+            try:
+                answer = self._llm_qa(document.content, standalone_question, document.filename,
+                                      objective=objective, graph_chunks=graph_chunks)
+            except Exception as e:
+                logger.error(f"单文档问答失败: {e}")
+                return {"error": f"问答失败: {str(e)}", "conversation_id": state.conversation_id,
+                        "conversation_reset": conversation_reset}
+            self._store_cached_answer(document, standalone_question, question_vector, cache_mode, answer)
+
+        self._save_question(QuestionCreate(document_id=document_id, question=question, answer=answer))
+        self._remember_turn(state, question, answer)
+
+        return {
+            "document_id": document_id,
+            "question": question,
+            "standalone_question": standalone_question,
+            "answer": answer,
+            "conversation_id": state.conversation_id,
+            "conversation_reset": conversation_reset,
+            "cached": bool(cached),
+            "retrieval": retrieval,
+            "linked_entities": linked_entities,
+        }
+
+    def _seed_conversation(self, state: ConversationState, question: str, history: List[Dict]):
+        """用请求中携带的 history 初始化新会话 (新会话、服务端会话已丢失或旧客户端)"""
+        turns = [
+            turn for turn in (history or [])
+            if turn.get("role") in ("user", "assistant") and turn.get("content")
+        ]
+        # 前端会把当前问题作为最后一条 user 消息一并发送
+        if turns and turns[-1]["role"] == "user" and turns[-1]["content"] == question:
+            turns = turns[:-1]
+        with state.lock:
+            for turn in turns:
+                state.append(turn["role"], turn["content"])
+            overflow = state.pop_overflow(settings.QA_HISTORY_TOKEN_BUDGET)
+        if overflow:
+            self._compress_history(state, overflow)
+
+    def _remember_turn(self, state: ConversationState, question: str, answer: str):
+        with state.lock:
+            state.append("user", question)
+            state.append("assistant", answer)
+            overflow = state.pop_overflow(settings.QA_HISTORY_TOKEN_BUDGET)
+        if overflow:
+            _history_executor.submit(self._compress_history, state, overflow)
+
+    def _compress_history(self, state: ConversationState, overflow: List[Dict]):
+        """把超出预算的早期轮次折叠进滚动摘要，摘要长度受 QA_SUMMARY_MAX_TOKENS 限制"""
+        folded = "\n".join(
+            f"{'用户' if turn['role'] == 'user' else '助手'}: {turn['content']}" for turn in overflow
         )
+        with state.summary_lock:
+            previous = state.summary
+            prompt = (
+                "请把已有对话摘要和新增的对话内容合并为一段简洁的摘要，保留关键事实、实体和用户关注的问题，"
+                f"不超过{settings.QA_SUMMARY_MAX_TOKENS}字。只输出摘要本身。\n\n"
+                f"已有摘要：{previous or '无'}\n\n新增对话：\n{folded}"
+            )
+            try:
+                summary = self._invoke_cheap_llm(prompt)
+            except Exception as e:
+                logger.error(f"对话历史压缩失败，退化为截断拼接: {e}")
+                summary = f"{previous}\n{folded}".strip()
+            state.summary = truncate_to_tokens(summary, settings.QA_SUMMARY_MAX_TOKENS)
+
+    def _format_query_with_history(self, question: str, state: ConversationState) -> str:
+        """结合摘要和最近轮次，用廉价模型把追问改写成可独立检索的问题"""
+        with state.lock:
+            summary = state.summary
+            turns = list(state.turns)
+        if not summary and not turns:
+            return question
+
+        # 单条回答可能很长，改写时只需要其开头部分
+        per_turn_budget = max(64, settings.QA_HISTORY_TOKEN_BUDGET // max(len(turns), 1))
+        recent = "\n".join(
+            f"{'用户' if turn['role'] == 'user' else '助手'}: {truncate_to_tokens(turn['content'], per_turn_budget)}"
+            for turn in turns
+        )
+        prompt = (
+            "根据对话背景，把用户的最新问题改写为一个不依赖上下文、可以独立理解的完整问题。"
+            "如果最新问题本身已经完整，原样输出。只输出改写后的问题。\n\n"
+            f"对话摘要：{summary or '无'}\n\n最近对话：\n{recent or '无'}\n\n最新问题：{question}"
+        )
+        try:
+            rewritten = self._invoke_cheap_llm(prompt)
+        except Exception as e:
+            logger.error(f"问题改写失败，使用原问题: {e}")
+            return question
+        if not rewritten or estimate_tokens(rewritten) > estimate_tokens(question) + 200:
+            return question
+        return rewritten
+
+    def multi_document_comparison(self, document_ids: List[int], question: str = "") -> Dict:
+        """
+        多文档对比.
+        先并行地在每篇文档的索引中检索与问题最相关的 k 个片段并各自抽取要点，
+        再用一次 LLM 调用汇总对比，成本只与文档数 × k 有关，与文档总长度无关。
+        """
+        documents = self.db.query(Document).filter(Document.id.in_(document_ids)).all()
+        if len(documents) < 2:
+            return {"error": "请至少选择两个文档进行对比"}
+
+        focus = question or "请比较这些文档的核心观点、数据细节和叙述结构的异同。"
+        query_vector = self.embeddings.embed_query(focus)
+
+        with ThreadPoolExecutor(max_workers=settings.COMPARISON_MAX_WORKERS) as executor:
+            extracted = list(executor.map(
+                lambda doc: self._extract_document_points(doc, focus, query_vector), documents
+            ))
+
+        try:
+            ai_analysis = self._aggregate_comparison(focus, extracted)
+        except Exception as e:
+            logger.error(f"多文档对比汇总失败: {e}")
+            ai_analysis = f"对比分析生成失败: {str(e)}"
+
+        self._save_question(QuestionCreate(question=focus, answer=ai_analysis))
+
+        return {
+            "question": focus,
+            "documents": extracted,
+            "comparison": self._compare_documents(documents),
+            "ai_analysis": ai_analysis,
+        }
+
+    def _extract_document_points(self, document: Document, question: str, query_vector: List[float]) -> Dict:
+        """检索单篇文档的 top-k 片段，并抽取该文档针对问题的要点"""
+        result = {"id": document.id, "filename": document.filename, "answer": ""}
+        try:
+            db = self._build_vector_store(document.content)
+            chunks = db.similarity_search_by_vector(query_vector, k=settings.COMPARISON_CHUNKS_PER_DOCUMENT)
+            context = "\n\n".join(chunk.page_content for chunk in chunks)
+            prompt = (
+                f"以下是文档《{document.filename}》中与问题最相关的片段。"
+                "请仅依据这些片段，简明列出该文档对问题的回答要点；片段未涉及的内容请说明未提及。\n\n"
+                f"问题：{question}\n\n片段：\n{context}"
+            )
+            result["answer"] = self._invoke_llm(prompt)
+        except Exception as e:
+            logger.error(f"文档 {document.id} 要点抽取失败: {e}")
+            result["error"] = str(e)
+        return result
+
+    def _aggregate_comparison(self, question: str, extracted: List[Dict]) -> str:
+        sections = []
+        for item in extracted:
+            points = item["answer"] or f"(抽取失败: {item.get('error', '无内容')})"
+            points = truncate_to_tokens(points, settings.COMPARISON_ANSWER_MAX_TOKENS)
+            sections.append(f"### 文档《{item['filename']}》\n{points}")
+        prompt = (
+            "你是一位严谨的文档分析师。下面是从多篇文档中分别抽取的要点，"
+            "请围绕问题对比它们的异同，先给出总体结论，再分点说明共同点和差异，并指出各自的出处文档。\n\n"
+            f"问题：{question}\n\n" + "\n\n".join(sections)
+        )
+        return self._invoke_llm(prompt)
+
+    def _compare_documents(self, documents: List[Document]) -> Dict:
+        """不依赖 LLM 的基础统计对比"""
+        lengths = {doc.filename: len(doc.content or "") for doc in documents}
+        total_length = sum(lengths.values())
+        return {
+            "length_comparison": {
+                "lengths": lengths,
+                "total_length": total_length,
+                "average_length": total_length // len(documents) if documents else 0,
+                "longest": max(lengths, key=lengths.get) if lengths else None,
+                "shortest": min(lengths, key=lengths.get) if lengths else None,
+            }
+        }
+
+    def _save_question(self, question: QuestionCreate):
+        """问答记录交给后台批量写入，不占用回答路径的时间"""
+        batch_writer.submit(Question.__table__, {
+            "document_id": question.document_id,
+            "question": question.question,
+            "answer": question.answer,
+            "created_at": datetime.utcnow(),
+        })
 
-        result = qa.invoke({"query": question})
-        return result['result']
-    
     # 其他辅助方法保持不变
     def generate_summary_for_documents(self, document_ids: List[int]) -> str: return ""
-    def single_document_qa(self, document_id: int, question: str, history: List[Dict] = []) -> Dict: return {}
-    def _format_query_with_history(self, question: str, history: List[Dict]) -> str: return ""
-    def _compare_documents(self, documents: List[Document]) -> Dict: return {}
-    def _save_question(self, question: QuestionCreate): pass
     def knowledge_base_qa(self, question: str, history: List[Dict] = []) -> Dict: return {}
-    def multi_document_comparison(self, document_ids: List[int], question: str = "") -> Dict: return {}
     def _improved_simple_qa(self, content: str, question: str) -> str: return ""
     def _qwen_qa(self, content: str, question: str) -> str: return ""
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    """
+    生成好的报告文件缓存.
+    key 由 (文档 id、文件名、内容指纹)、标题、格式和报告模板版本决定，任一变化都会生成新文件；
+    文件原子写入 REPORT_CACHE_DIR，命中时直接返回路径，由接口以文件流的方式发送。
+    总大小超过 REPORT_CACHE_MAX_BYTES 时按最近访问时间淘汰。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "ReportCache":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(cache_dir=settings.REPORT_CACHE_DIR, max_bytes=settings.REPORT_CACHE_MAX_BYTES)
+        return cls._instance
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(documents: List[Tuple[int, str, str]], title: str, format: str, template_version: int) -> str:
+        """documents 为 (id, 文件名, 内容指纹) 列表，与顺序无关"""
+        payload = json.dumps({
+            "documents": sorted(documents),
+            "title": title,
+            "format": format,
+            "template_version": template_version,
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str, extension: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def get(self, key: str, extension: str) -> Optional[str]:
+        path = self.path(key, extension)
+        try:
+            # 更新访问时间，供淘汰使用
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return path
+
+    def put(self, key: str, extension: str, writer: Callable[[BinaryIO], None]) -> str:
+        """调用 writer 把报告直接写入临时文件，完成后原子替换到缓存路径"""
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{key}-", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                writer(f)
+            os.replace(tmp_path, self.path(key, extension))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._prune()
+        return self.path(key, extension)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _prune(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        # 至少保留最新的文件，即使它单独超出预算
+        while total > self.max_bytes and len(entries) > 1:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self._stats["evictions"] += 1
+            logger.info(f"报告缓存淘汰 {os.path.basename(path)} ({size} bytes)")
+
+    def stats(self) -> Dict:
+        entries = self._entries()
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
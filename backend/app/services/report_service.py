@@ -7,8 +7,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
 from docx import Document as DocxDocument
 from docx.shared import Inches
-import base64
-from typing import List, Dict, Optional
+from typing import BinaryIO, List, Dict, Optional
 import os
 
 # 字体查找和注册
@@ -39,17 +38,27 @@ def register_chinese_font():
 
 CHINESE_FONT = register_chinese_font()
 
+# 报告版式版本，修改报告内容或排版后递增，使已缓存的旧报告失效
+REPORT_TEMPLATE_VERSION = 1
+
+# 报告格式 -> (缓存文件扩展名, MIME 类型)
+REPORT_FORMATS = {
+    "pdf": ("pdf", "application/pdf"),
+    "word": ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+}
+
 class ReportService:
-    def generate_report(self, format: str, content: Dict, selected_docs: List[Dict], kg_image_base64: Optional[str]) -> bytes:
+    def generate_report(self, format: str, content: Dict, selected_docs: List[Dict], kg_image: Optional[bytes],
+                        output: BinaryIO):
+        """把报告直接写入 output (文件对象)，kg_image 为 PNG 原始字节"""
         if format.lower() == 'pdf':
-            return self._generate_pdf(content, selected_docs, kg_image_base64)
+            self._generate_pdf(content, selected_docs, kg_image, output)
         elif format.lower() == 'word':
-            return self._generate_word(content, selected_docs, kg_image_base64)
+            self._generate_word(content, selected_docs, kg_image, output)
         else:
             raise ValueError("Unsupported report format")
 
-    def _generate_pdf(self, content: Dict, selected_docs: List[Dict], kg_image_base64: Optional[str]) -> bytes:
-        buffer = BytesIO()
+    def _generate_pdf(self, content: Dict, selected_docs: List[Dict], kg_image: Optional[bytes], output: BinaryIO):
         styles = getSampleStyleSheet()
         # 应用注册好的中文字体
         styles['Title'].fontName = CHINESE_FONT
@@ -57,7 +66,7 @@ class ReportService:
         styles['h2'].fontName = CHINESE_FONT
         styles['Normal'].fontName = CHINESE_FONT
         
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
+        doc = SimpleDocTemplate(output, pagesize=letter)
         story = []
 
         story.append(Paragraph(content.get('title', '分析报告'), styles['Title']))
@@ -73,19 +82,17 @@ class ReportService:
         story.append(Spacer(1, 12))
 
         story.append(Paragraph('3. 知识图谱分析', styles['h1']))
-        if kg_image_base64:
-            img_data = base64.b64decode(kg_image_base64)
+        if kg_image:
             # 修正：为 reportlab 使用 inch 单位
-            img = Image(BytesIO(img_data), width=6*inch, height=4.5*inch)
+            img = Image(BytesIO(kg_image), width=6*inch, height=4.5*inch)
             img.hAlign = 'CENTER'
             story.append(img)
         else:
             story.append(Paragraph("未能生成知识图谱图像。", styles['Normal']))
 
         doc.build(story)
-        return buffer.getvalue()
 
-    def _generate_word(self, content: Dict, selected_docs: List[Dict], kg_image_base64: Optional[str]) -> bytes:
+    def _generate_word(self, content: Dict, selected_docs: List[Dict], kg_image: Optional[bytes], output: BinaryIO):
         doc = DocxDocument()
         doc.add_heading(content.get('title', '分析报告'), 0)
 
@@ -97,14 +104,10 @@ class ReportService:
             doc.add_paragraph(doc_item['filename'], style='List Bullet')
 
         doc.add_heading('3. 知识图谱分析', level=1)
-        if kg_image_base64:
-            img_data = base64.b64decode(kg_image_base64)
+        if kg_image:
             # Word 文档使用 Inches 单位
-            doc.add_picture(BytesIO(img_data), width=Inches(6.0))
+            doc.add_picture(BytesIO(kg_image), width=Inches(6.0))
         else:
             doc.add_paragraph("未能生成知识图谱图像。")
 
-        buffer = BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-        return buffer.getvalue()
+        doc.save(output)
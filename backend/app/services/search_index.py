@@ -0,0 +1,194 @@
+"""
+文档全文检索 (SQLite FTS5).
+unicode61 分词器把连续的中日韩文字整体当作一个词，因此写入索引前把每段 CJK 文字改写为
+相邻二字组 ("知识图谱" -> "知识 识图 图谱")；查询时中文词转换为二字组短语，任意长度的词都能命中，
+二字组远比单字稀疏，短语匹配时需要比对的位置也少得多。索引表 documents_fts 的 rowid 即文档 id，
+随文档的创建、修改和删除在同一事务中维护；高亮片段按原文生成。
+"""
+import html
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "documents_fts"
+HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE = "<mark>", "</mark>"
+# 文件名命中的权重高于正文
+_BM25_WEIGHTS = (5.0, 1.0)
+_SNIPPET_CHARS = 120
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_CJK_RUN = re.compile(rf"[{_CJK}]+")
+# 字母数字 (不含 CJK) 组成的词
+_WORD_CHAR = rf"[^\W_{_CJK}]"
+_QUERY_TERM = re.compile(rf"[{_CJK}]+|{_WORD_CHAR}+")
+
+_available = True
+
+
+def _bigrams(run: str) -> List[str]:
+    return [run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def segment(value: Optional[str]) -> str:
+    """把每段连续的 CJK 文字改写为以空格分隔的相邻二字组，其余文本不变"""
+    return _CJK_RUN.sub(lambda match: " " + " ".join(_bigrams(match.group())) + " ", value or "")
+
+
+def ensure_schema(engine: Engine):
+    """创建全文索引表 (create_all 不处理虚拟表)；SQLite 未编译 FTS5 时全文检索不可用"""
+    global _available
+    try:
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"filename, body, tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+    except OperationalError as e:
+        _available = False
+        logger.error(f"SQLite 不支持 FTS5，全文检索不可用: {e}")
+
+
+def is_available() -> bool:
+    return _available
+
+
+def index_documents(db: Session, documents: Iterable[Tuple[int, str, Optional[str]]]):
+    """写入或替换文档 (id, 文件名, 内容) 的索引，不提交事务"""
+    rows = [{"id": document_id, "filename": segment(filename), "body": segment(content)}
+            for document_id, filename, content in documents]
+    if not rows or not _available:
+        return
+    db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), [{"id": row["id"]} for row in rows])
+    db.execute(text(f"INSERT INTO {FTS_TABLE} (rowid, filename, body) VALUES (:id, :filename, :body)"), rows)
+
+
+def remove_documents(db: Session, document_ids: Iterable[int]):
+    """删除文档的索引，不提交事务"""
+    params = [{"id": document_id} for document_id in document_ids]
+    if params and _available:
+        db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), params)
+
+
+def backfill(db: Session, batch_size: int = 500) -> int:
+    """为尚未建立索引的文档 (例如全文检索上线前导入的) 补建索引，返回补建的文档数"""
+    if not _available:
+        return 0
+    count = 0
+    while True:
+        rows = db.execute(text(
+            f"SELECT id, filename, content FROM documents "
+            f"WHERE id NOT IN (SELECT rowid FROM {FTS_TABLE}) ORDER BY id LIMIT :limit"
+        ), {"limit": batch_size}).all()
+        if not rows:
+            break
+        index_documents(db, rows)
+        db.commit()
+        count += len(rows)
+    if count:
+        logger.info(f"全文索引: 补建 {count} 个文档的索引")
+    return count
+
+
+def query_terms(query: str) -> List[str]:
+    """用户输入中的检索词：连续的中日韩文字或字母数字，其余字符 (包括 FTS5 语法字符) 一律视为分隔符"""
+    return _QUERY_TERM.findall(query or "")
+
+
+def build_match_query(terms: List[str]) -> Optional[str]:
+    """
+    每个词作为一个短语，多个词需同时命中.
+    单个汉字没有完整的二字组，按前缀匹配以它开头的二字组 (位于一段文字末尾的该字不会命中)。
+    """
+    phrases = []
+    for term in terms:
+        if _CJK_RUN.fullmatch(term):
+            phrases.append(f'"{term}"*' if len(term) == 1 else '"' + " ".join(_bigrams(term)) + '"')
+        else:
+            phrases.append(f'"{term}"')
+    return " ".join(phrases) or None
+
+
+def make_snippet(content: Optional[str], terms: List[str], width: int = _SNIPPET_CHARS) -> str:
+    """从原文中截取第一个命中词附近的片段，HTML 转义后用 <mark></mark> 标出所有命中词"""
+    content = content or ""
+    alternatives = []
+    for term in sorted(set(terms), key=len, reverse=True):
+        # 字母数字词按整词匹配，避免在更长的单词内部高亮
+        alternatives.append(re.escape(term) if _CJK_RUN.fullmatch(term)
+                            else rf"(?<!{_WORD_CHAR}){re.escape(term)}(?!{_WORD_CHAR})")
+    pattern = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+    match = pattern.search(content) if pattern else None
+    start = max(match.start() - width // 4, 0) if match else 0
+    end = min(start + width, len(content))
+    window = " ".join(content[start:end].split())
+    # 片段是 HTML：原文逐段转义后再插入高亮标签，文档中的标签不会被当作标记渲染
+    parts, last = [], 0
+    for hit in (pattern.finditer(window) if pattern else ()):
+        parts.append(html.escape(window[last:hit.start()]))
+        parts.append(f"{HIGHLIGHT_OPEN}{html.escape(hit.group())}{HIGHLIGHT_CLOSE}")
+        last = hit.end()
+    parts.append(html.escape(window[last:]))
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(content) else "")
+
+
+def search(db: Session, query: str, limit: int = 20, offset: int = 0) -> Dict:
+    """
+    按 bm25 排序返回命中的文档和高亮片段.
+    命中数不超过 SEARCH_RANK_WINDOW 时对全部命中计算相关度排序；常见词可能命中全部文档，
+    为了让耗时与命中数无关，此时只对最新的 SEARCH_RANK_WINDOW 个命中文档排序 (FTS5 按 rowid 倒序扫描，取够即停)，
+    并在结果中标记 truncated，调用方据此提示用户细化查询；片段只为返回的一页生成。
+    """
+    if not _available:
+        raise RuntimeError("Full-text search is not available: SQLite was built without FTS5")
+    terms = query_terms(query)
+    match = build_match_query(terms)
+    if match is None:
+        return {"query": query, "results": [], "truncated": False}
+
+    # 先数命中 (不算 bm25，最多数到窗口外一条)，判断排序是否覆盖了全部命中
+    window = settings.SEARCH_RANK_WINDOW
+    matched = db.execute(text(
+        f"SELECT count(*) FROM (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match LIMIT :probe)"
+    ), {"match": match, "probe": window + 1}).scalar()
+    truncated = matched > window
+
+    ranked = db.execute(text(
+        f"SELECT rowid, score FROM ("
+        f"SELECT rowid, bm25({FTS_TABLE}, {_BM25_WEIGHTS[0]}, {_BM25_WEIGHTS[1]}) AS score FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH :match ORDER BY rowid DESC LIMIT :window"
+        f") ORDER BY score LIMIT :limit OFFSET :offset"
+    ), {"match": match, "window": window, "limit": limit, "offset": offset}).all()
+    if not ranked:
+        return {"query": query, "results": [], "truncated": truncated}
+
+    ids = [row.rowid for row in ranked]
+    placeholders = ", ".join(f":id{i}" for i in range(len(ids)))
+    documents = {row.id: row for row in db.execute(text(
+        f"SELECT id, filename, content, created_at FROM documents WHERE id IN ({placeholders})"
+    ), {f"id{i}": document_id for i, document_id in enumerate(ids)})}
+
+    results: List[Dict] = []
+    for row in ranked:
+        document = documents.get(row.rowid)
+        if document is None:
+            continue
+        results.append({
+            "id": document.id,
+            "filename": document.filename,
+            # bm25 越小越相关，取相反数使分数越大越相关
+            "score": round(-row.score, 4),
+            "snippet": make_snippet(document.content, terms),
+            "created_at": document.created_at,
+        })
+    return {"query": query, "results": results, "truncated": truncated}
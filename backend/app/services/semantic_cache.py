@@ -0,0 +1,128 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _DocumentAnswers:
+    """单个 (文档, 问答模式) 下已缓存的问题向量矩阵及其答案"""
+
+    def __init__(self, fingerprint: str, dim: int):
+        self.fingerprint = fingerprint
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.questions: List[str] = []
+        self.answers: List[Any] = []
+
+
+class SemanticAnswerCache:
+    """
+    语义答案缓存.
+    按文档维护一个小型向量索引 (已归一化的问题向量矩阵)，新问题与之做一次矩阵乘法，
+    相似度超过阈值即直接返回历史答案，省去一次完整的 LLM 调用。
+    文档内容指纹变化或显式失效时，该文档下的所有缓存答案作废。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "SemanticAnswerCache":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                        max_entries_per_document=settings.SEMANTIC_CACHE_MAX_ENTRIES_PER_DOCUMENT,
+                    )
+        return cls._instance
+
+    def __init__(self, threshold: float, max_entries_per_document: int):
+        self.threshold = threshold
+        self.max_entries_per_document = max_entries_per_document
+        self._entries: Dict[Tuple[int, str], _DocumentAnswers] = {}
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def lookup(self, document_id: int, fingerprint: str, mode: str, question_vector) -> Optional[Dict]:
+        """返回 {"answer", "question", "similarity"}，未命中返回 None"""
+        query = self._normalize(question_vector)
+        with self._lock:
+            self._stats["lookups"] += 1
+            entry = self._entries.get((document_id, mode))
+            if entry is not None and entry.fingerprint != fingerprint:
+                # 文档内容已变化，旧答案全部作废
+                del self._entries[(document_id, mode)]
+                self._stats["invalidations"] += 1
+                entry = None
+            if entry is None or not entry.questions:
+                self._stats["misses"] += 1
+                return None
+
+            scores = entry.vectors @ query
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            self._stats["hits"] += 1
+            return {
+                "answer": entry.answers[best],
+                "question": entry.questions[best],
+                "similarity": similarity,
+            }
+
+    def store(self, document_id: int, fingerprint: str, mode: str, question: str, question_vector, answer: Any):
+        vec = self._normalize(question_vector)
+        with self._lock:
+            entry = self._entries.get((document_id, mode))
+            if entry is None or entry.fingerprint != fingerprint or entry.vectors.shape[1] != vec.shape[0]:
+                entry = _DocumentAnswers(fingerprint, vec.shape[0])
+                self._entries[(document_id, mode)] = entry
+
+            entry.vectors = np.vstack([entry.vectors, vec[None, :]])
+            entry.questions.append(question)
+            entry.answers.append(answer)
+            # 超出容量时丢弃最早的条目
+            overflow = len(entry.questions) - self.max_entries_per_document
+            if overflow > 0:
+                entry.vectors = entry.vectors[overflow:]
+                del entry.questions[:overflow]
+                del entry.answers[:overflow]
+            self._stats["stores"] += 1
+
+    def invalidate_document(self, document_id: int):
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == document_id]
+            for key in keys:
+                del self._entries[key]
+            if keys:
+                self._stats["invalidations"] += 1
+                logger.info(f"语义缓存: 文档 {document_id} 的缓存答案已失效。")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                **self._stats,
+                "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+                "documents": len({key[0] for key in self._entries}),
+                "entries": sum(len(entry.questions) for entry in self._entries.values()),
+                "threshold": self.threshold,
+            }
@@ -1,7 +1,21 @@
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Any
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
-from app.models.usage_stats import UsageStats
+
+from app.core.batch_writer import batch_writer
+from app.models.usage_stats import UsageStats, UsageCounter
 from app.schemas.usage_stats import UsageStatsCreate
 
+# 已提交到写入队列、但尚未落库的计数增量，用于汇总时补齐；写入事务结束 (提交或失败) 后扣减
+_pending_counts: Counter = Counter()
+_pending_lock = threading.Lock()
+
 
 def get_usage_stat(db: Session, usage_stat_id: int):
     return db.query(UsageStats).filter(UsageStats.id == usage_stat_id).first()
@@ -11,12 +25,71 @@ def get_usage_stats(db: Session, skip: int = 0, limit: int = 100):
     return db.query(UsageStats).offset(skip).limit(limit).all()
 
 
-def create_usage_stat(db: Session, usage_stat: UsageStatsCreate):
-    db_usage_stat = UsageStats(
-        user_id=usage_stat.user_id,
-        feature=usage_stat.feature
-    )
-    db.add(db_usage_stat)
+def create_usage_stat(usage_stat: UsageStatsCreate) -> bool:
+    """记录一次功能使用，写入由 batch_writer 在后台批量完成"""
+    row = {
+        "user_id": usage_stat.user_id,
+        "feature": usage_stat.feature,
+        "created_at": datetime.utcnow(),
+    }
+    with _pending_lock:
+        _pending_counts[usage_stat.feature] += 1
+    if not batch_writer.submit(UsageStats.__table__, row):
+        with _pending_lock:
+            _pending_counts[usage_stat.feature] -= 1
+        return False
+    return True
+
+
+def record_usage(user_id: str, feature: str) -> bool:
+    return create_usage_stat(UsageStatsCreate(user_id=user_id, feature=feature))
+
+
+def get_usage_summary(db: Session) -> Dict[str, Any]:
+    """从预聚合计数表读取汇总，不扫描 usage_stats 明细"""
+    by_feature: Dict[str, int] = {
+        counter.feature: counter.count for counter in db.query(UsageCounter).all()
+    }
+    with _pending_lock:
+        for feature, count in _pending_counts.items():
+            if count:
+                by_feature[feature] = by_feature.get(feature, 0) + count
+    return {
+        "total": sum(by_feature.values()),
+        "by_feature": by_feature,
+        "pending_writes": batch_writer.pending(),
+    }
+
+
+def rebuild_counters(db: Session):
+    """计数表为空而明细表有数据时 (例如首次升级)，从明细重建一次计数"""
+    if db.query(UsageCounter).first() is not None:
+        return
+    rows = db.query(UsageStats.feature, func.count(UsageStats.id)).group_by(UsageStats.feature).all()
+    for feature, count in rows:
+        if feature is not None:
+            db.add(UsageCounter(feature=feature, count=count))
     db.commit()
-    db.refresh(db_usage_stat)
-    return db_usage_stat
\ No newline at end of file
+
+
+def _update_counters(conn: Connection, rows: List[Dict[str, Any]]):
+    """batch_writer 回调：在插入明细的同一事务内累加计数"""
+    counts = Counter(row["feature"] for row in rows if row.get("feature") is not None)
+    if not counts:
+        return
+    stmt = sqlite_insert(UsageCounter.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UsageCounter.feature],
+        set_={"count": UsageCounter.count + stmt.excluded["count"], "updated_at": func.now()},
+    )
+    conn.execute(stmt, [{"feature": feature, "count": count} for feature, count in counts.items()])
+
+
+def _settle_pending(rows: List[Dict[str, Any]], committed: bool):
+    """batch_writer 回调：事务结束后扣减待写入计数 (已提交的计入计数表，失败的已丢弃)"""
+    with _pending_lock:
+        _pending_counts.subtract(row.get("feature") for row in rows)
+
+
+batch_writer.register_flush_hook(UsageStats.__table__, _update_counters)
+batch_writer.register_done_hook(UsageStats.__table__, _settle_pending)
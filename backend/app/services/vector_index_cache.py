@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document as LangchainDocument
+
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.json"
+
+
+class _CachedIndex:
+    def __init__(self, store: FAISS, nbytes: int, mmapped: bool):
+        self.store = store
+        self.nbytes = nbytes
+        self.mmapped = mmapped
+
+
+class VectorIndexCache:
+    """
+    已加载向量索引的进程内 LRU 缓存.
+    索引按内容指纹持久化在 VECTOR_INDEX_DIR 下 (faiss 索引 + 片段表)，
+    内存中按总字节数 (而不是个数) 淘汰最久未使用的索引；
+    加载时优先以内存映射方式打开，多个 uvicorn worker 可共享操作系统页缓存。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "VectorIndexCache":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        index_dir=settings.VECTOR_INDEX_DIR,
+                        max_bytes=settings.VECTOR_INDEX_CACHE_MAX_BYTES,
+                        use_mmap=settings.VECTOR_INDEX_MMAP,
+                    )
+        return cls._instance
+
+    def __init__(self, index_dir: str, max_bytes: int, use_mmap: bool = True):
+        self.index_dir = index_dir
+        self.max_bytes = max_bytes
+        self.use_mmap = use_mmap
+        self._entries: "OrderedDict[str, _CachedIndex]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "disk_loads": 0, "builds": 0, "evictions": 0}
+        os.makedirs(index_dir, exist_ok=True)
+
+    @staticmethod
+    def key_for(content_hash: str, model_name: str) -> str:
+        """索引 key 同时包含内容指纹和 embedding 模型，不同模型的索引互不覆盖，迁移期间新旧索引并存"""
+        return f"{content_hash}-{hashlib.sha256(model_name.encode('utf-8')).hexdigest()[:12]}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.index_dir, key)
+
+    def get_or_build(self, key: str, embeddings, builder: Callable[[], FAISS]) -> FAISS:
+        """
+        按 key 取索引：内存命中直接返回；否则从磁盘加载；磁盘也没有时调用 builder 构建并落盘。
+        并发的相同 key 请求应由调用方用 single_flight 合并。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry.store
+            self._stats["misses"] += 1
+
+        entry = self._load(key, embeddings)
+        if entry is None:
+            store = builder()
+            self._save(key, store)
+            with self._lock:
+                self._stats["builds"] += 1
+            # 重新从磁盘以内存映射方式打开，使新建索引同样可以跨进程共享
+            entry = self._load(key, embeddings) or _CachedIndex(store, self._estimate_bytes(store), False)
+        else:
+            with self._lock:
+                self._stats["disk_loads"] += 1
+
+        self._insert(key, entry)
+        return entry.store
+
+    def remove(self, key: str):
+        """从内存和磁盘中删除索引"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._resident_bytes -= entry.nbytes
+        shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def _insert(self, key: str, entry: _CachedIndex):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._resident_bytes -= previous.nbytes
+            self._entries[key] = entry
+            self._resident_bytes += entry.nbytes
+            # 至少保留刚放入的索引，即使它单独超出预算
+            while self._resident_bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._resident_bytes -= evicted.nbytes
+                self._stats["evictions"] += 1
+                logger.info(f"向量索引缓存淘汰 {evicted_key} ({evicted.nbytes} bytes)")
+
+    @staticmethod
+    def _estimate_bytes(store: FAISS, chunks: Optional[List[str]] = None) -> int:
+        index = store.index
+        vector_bytes = index.ntotal * index.d * 4
+        if chunks is None:
+            chunks = [doc.page_content for doc in store.docstore._dict.values()]
+        return vector_bytes + sum(len(chunk.encode("utf-8")) for chunk in chunks)
+
+    def _read_index(self, path: str):
+        if self.use_mmap:
+            # IO_FLAG_MMAP_IFC (faiss >= 1.8) 可映射 Flat 索引的向量数据，旧版本退回 IO_FLAG_MMAP
+            flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+            try:
+                return faiss.read_index(path, flag), True
+            except Exception as e:
+                logger.info(f"索引不支持内存映射加载，改为普通加载: {e}")
+        return faiss.read_index(path), False
+
+    def _load(self, key: str, embeddings) -> Optional[_CachedIndex]:
+        directory = self._path(key)
+        index_path = os.path.join(directory, INDEX_FILE)
+        chunks_path = os.path.join(directory, CHUNKS_FILE)
+        if not (os.path.exists(index_path) and os.path.exists(chunks_path)):
+            return None
+        try:
+            index, mmapped = self._read_index(index_path)
+            with open(chunks_path, "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+        except Exception as e:
+            logger.error(f"加载向量索引 {key} 失败，将重新构建: {e}")
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+
+        docstore = InMemoryDocstore({str(i): LangchainDocument(page_content=chunk) for i, chunk in enumerate(chunks)})
+        store = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id={i: str(i) for i in range(len(chunks))},
+        )
+        return _CachedIndex(store, self._estimate_bytes(store, chunks), mmapped)
+
+    def _save(self, key: str, store: FAISS):
+        # 片段表按索引内的向量顺序保存
+        chunks = [store.docstore.search(store.index_to_docstore_id[i]).page_content for i in range(store.index.ntotal)]
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=self.index_dir)
+        try:
+            faiss.write_index(store.index, os.path.join(tmp_dir, INDEX_FILE))
+            with open(os.path.join(tmp_dir, CHUNKS_FILE), "w", encoding="utf-8") as f:
+                json.dump(chunks, f, ensure_ascii=False)
+            # 整个目录原子替换，其他进程不会读到写了一半的索引
+            os.replace(tmp_dir, self._path(key))
+        except OSError as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(self._path(key), INDEX_FILE)):
+                logger.error(f"保存向量索引 {key} 失败: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+                "entries": len(self._entries),
+                "mmapped_entries": sum(1 for entry in self._entries.values() if entry.mmapped),
+                "resident_bytes": self._resident_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,120 @@
+"""
+知识图谱抽取基准：逐片段调用与按 token 预算分批调用的 LLM 调用次数、输入 token、耗时和抽取成功率.
+模拟模型按提示词中的片段编号返回 JSON，并按给定比例输出格式错误 (代码块 + 尾逗号) 或被截断的 JSON，
+用于检验本地修复和补抽。
+运行方式 (在 backend 目录下): python -m benchmarks.bench_graph_extraction
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+from benchmarks._common import Timer, synthetic_text, _WORDS
+
+from app.core.config import settings
+from app.core.tokens import estimate_tokens
+from app.services.knowledge_graph_service import KnowledgeGraphService
+
+_SECTION = re.compile(r"\[片段 (\d+)\]\n(.*?)(?=\n\n\[片段 \d+\]|\Z)", re.S)
+
+
+class FakeExtractor:
+    """按片段编号返回抽取结果的模拟模型，统计调用次数和输入 token"""
+
+    def __init__(self, latency: float, malformed_rate: float, seed: int = 0):
+        self.latency = latency
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.repair_calls = 0
+        self.prompt_tokens = 0
+        self._intended = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _extract(text: str):
+        entities = [word for word in _WORDS if word in text][:6]
+        relations = [{"source": a, "target": b, "relation": "相关"} for a, b in zip(entities, entities[1:])]
+        return {"entities": entities, "relations": relations}
+
+    def __call__(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += estimate_tokens(prompt)
+            roll = self.rng.random()
+        time.sleep(self.latency)
+
+        if prompt.startswith("下面的内容应当是"):
+            with self._lock:
+                self.repair_calls += 1
+            broken = prompt.split("只输出 JSON:\n\n", 1)[1]
+            return self._intended.get(broken, broken)
+
+        sections = _SECTION.findall(prompt)
+        reply = json.dumps({"chunks": [dict(self._extract(text), id=int(i)) for i, text in sections]},
+                           ensure_ascii=False)
+        if roll < self.malformed_rate / 2:
+            broken = "```json\n" + reply[:-2] + ",]}\n```"
+        elif roll < self.malformed_rate:
+            broken = reply[:int(len(reply) * 0.8)]
+        else:
+            return reply
+        with self._lock:
+            self._intended[broken] = reply
+        return broken
+
+
+def run(documents: int, paragraphs: int, latency: float, malformed_rate: float):
+    texts = [synthetic_text(paragraphs, seed=i) for i in range(documents)]
+    chunks_per_document = [KnowledgeGraphService._split_chunks(text) for text in texts]
+    total_chunks = sum(len(chunks) for chunks in chunks_per_document)
+
+    results = []
+    original = settings.KG_EXTRACT_BATCH_MAX_CHUNKS
+    for mode, max_chunks in (("per_chunk", 1), ("batched", original)):
+        settings.KG_EXTRACT_BATCH_MAX_CHUNKS = max_chunks
+        fake = FakeExtractor(latency, malformed_rate)
+        KnowledgeGraphService._llm_call = fake
+        service = KnowledgeGraphService(db=None)
+        extracted = 0
+        try:
+            with Timer() as timer:
+                for chunks in chunks_per_document:
+                    extracted += sum(1 for result in service._extract_chunks_with_llm(chunks) if result)
+        finally:
+            settings.KG_EXTRACT_BATCH_MAX_CHUNKS = original
+        results.append({
+            "mode": mode,
+            "documents": documents,
+            "chunks": total_chunks,
+            "llm_calls": fake.calls,
+            "repair_calls": fake.repair_calls,
+            "calls_per_document": round(fake.calls / documents, 2),
+            "prompt_tokens": fake.prompt_tokens,
+            "extracted_chunks": extracted,
+            "elapsed_s": round(timer.elapsed, 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--paragraphs", type=int, default=40, help="每篇文档的段落数 (决定片段数)")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟的单次 LLM 调用延迟 (秒)")
+    parser.add_argument("--malformed-rate", type=float, default=0.2, help="模拟模型输出非法 JSON 的比例")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    results = run(args.documents, args.paragraphs, args.latency, args.malformed_rate)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    for row in results:
+        print(", ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+知识图谱存储基准：对比 networkx.DiGraph 与 CSR 紧凑图在相同抽取结果上的内存和耗时.
+两边都按 _parse_and_add_to_graph 的语义构建 (重复边累加权重)，再计算度中心性、PageRank 和弱连通分量。
+networkx 的 PageRank 依赖 scipy，未安装时该项记为 null。
+运行方式 (在 backend 目录下): python -m benchmarks.bench_graph_store --edges 100000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from benchmarks._common import Timer, synthetic_extractions
+
+import networkx as nx
+
+from app.services.graph_store import CompactGraph
+
+
+def build_networkx(extractions):
+    graph = nx.DiGraph()
+    for data in extractions:
+        for entity in data["entities"]:
+            if graph.has_node(entity):
+                graph.nodes[entity]["count"] += 1
+            else:
+                graph.add_node(entity, count=1)
+        for rel in data["relations"]:
+            source, target = rel["source"], rel["target"]
+            if graph.has_edge(source, target):
+                graph[source][target]["weight"] += 1
+            else:
+                graph.add_edge(source, target, relation=rel["relation"], weight=1)
+    return graph
+
+
+def build_compact(extractions):
+    graph = CompactGraph()
+    for data in extractions:
+        for entity in data["entities"]:
+            graph.add_node(entity)
+        for rel in data["relations"]:
+            graph.add_edge(rel["source"], rel["target"], rel["relation"])
+    graph.number_of_edges  # 触发 CSR 压缩，计入构建耗时和内存
+    return graph
+
+
+def measure_build(builder, extractions):
+    gc.collect()
+    tracemalloc.start()
+    with Timer() as timer:
+        graph = builder(extractions)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return graph, {
+        "build_seconds": round(timer.elapsed, 3),
+        "retained_mb": round(retained / 1024 / 1024, 2),
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def timed(func):
+    with Timer() as timer:
+        result = func()
+    return result, round(timer.elapsed, 4)
+
+
+def networkx_pagerank(graph):
+    try:
+        return nx.pagerank(graph, weight="weight")
+    except ImportError:
+        return None
+
+
+def run(edges: int, nodes: int):
+    extractions = synthetic_extractions(edges, nodes)
+
+    nx_graph, nx_row = measure_build(build_networkx, extractions)
+    _, nx_row["degree_centrality_seconds"] = timed(lambda: nx.degree_centrality(nx_graph))
+    pagerank, seconds = timed(lambda: networkx_pagerank(nx_graph))
+    nx_row["pagerank_seconds"] = seconds if pagerank is not None else None
+    components, nx_row["components_seconds"] = timed(lambda: nx.number_weakly_connected_components(nx_graph))
+    nx_row.update(nodes=nx_graph.number_of_nodes(), edges=nx_graph.number_of_edges(), components=components)
+    del nx_graph
+
+    compact, compact_row = measure_build(build_compact, extractions)
+    _, compact_row["degree_centrality_seconds"] = timed(compact.degree_centrality)
+    _, compact_row["pagerank_seconds"] = timed(compact.pagerank)
+    labels, compact_row["components_seconds"] = timed(compact.connected_components)
+    compact_row.update(nodes=compact.number_of_nodes, edges=compact.number_of_edges,
+                       components=len(set(labels.tolist())), csr_mb=round(compact.nbytes() / 1024 / 1024, 2))
+    return {"networkx": nx_row, "compact": compact_row}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--edges", type=int, default=100_000, help="抽取出的关系条数")
+    parser.add_argument("--nodes", type=int, default=20_000, help="实体词表大小")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    results = run(args.edges, args.nodes)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    metrics = ["nodes", "edges", "components", "build_seconds", "retained_mb", "peak_mb",
+               "degree_centrality_seconds", "pagerank_seconds", "components_seconds"]
+    print(f"{'metric':>26} {'networkx':>12} {'compact':>12}")
+    for metric in metrics:
+        print(f"{metric:>26} {str(results['networkx'][metric]):>12} {str(results['compact'][metric]):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+批量导入基准：逐个调用 POST /documents/ 与一次 POST /documents/bulk (ZIP) 的导入吞吐 (文档/分钟).
+语料为 txt / docx / pdf 混合的合成文档，两种方式导入同一批文件。
+运行方式 (在 backend 目录下): python -m benchmarks.bench_ingest --files 300
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import zipfile
+
+from benchmarks._common import Timer, synthetic_text
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services import ingestion_service
+
+CONTENT_TYPES = {
+    ".txt": "text/plain",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".pdf": "application/pdf",
+}
+
+
+def make_corpus(directory: str, count: int, paragraphs: int):
+    from docx import Document as DocxDocument
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    paths = []
+    extensions = list(CONTENT_TYPES)
+    for i in range(count):
+        extension = extensions[i % len(extensions)]
+        text = synthetic_text(paragraphs, seed=i)
+        path = os.path.join(directory, f"doc_{i:05d}{extension}")
+        if extension == ".txt":
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        elif extension == ".docx":
+            document = DocxDocument()
+            for paragraph in text.split("\n\n"):
+                document.add_paragraph(paragraph)
+            document.save(path)
+        else:
+            # 内置字体不含中文，PDF 只保留 ASCII 部分，足以产生真实的解析开销
+            pdf = canvas.Canvas(path, pagesize=letter)
+            ascii_text = text.encode("ascii", "ignore").decode() or "page"
+            for page in range(max(1, paragraphs // 4)):
+                y = 750
+                for start in range(0, min(len(ascii_text), 4000), 90):
+                    pdf.drawString(40, y, ascii_text[start:start + 90])
+                    y -= 14
+                    if y < 40:
+                        break
+                pdf.showPage()
+            pdf.save()
+        paths.append(path)
+    return paths
+
+
+def warm_up_workers(workers: int):
+    """预先启动全部提取进程，计时只包含稳态的导入开销 (服务进程中进程池在首次批量导入时启动后常驻)"""
+    ingestion_service.shutdown_executor()
+    settings.BULK_INGEST_WORKERS = workers
+    list(ingestion_service.get_executor().map(time.sleep, [0.5] * workers))
+
+
+def run(count: int, paragraphs: int, workers: int):
+    warm_up_workers(workers)
+    client = TestClient(app)
+    with tempfile.TemporaryDirectory(prefix="docqa-ingest-") as directory:
+        paths = make_corpus(directory, count, paragraphs)
+        archive_path = os.path.join(directory, "corpus.zip")
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for path in paths:
+                archive.write(path, arcname=f"corpus/{os.path.basename(path)}")
+
+        results = []
+        with Timer() as timer:
+            created = 0
+            for path in paths:
+                with open(path, "rb") as f:
+                    response = client.post("/documents/", files={
+                        "file": (os.path.basename(path), f, CONTENT_TYPES[os.path.splitext(path)[1]])
+                    })
+                created += response.status_code == 200
+        results.append({"mode": "single", "files": count, "created": created, "requests": count,
+                        "elapsed_s": round(timer.elapsed, 2),
+                        "docs_per_minute": round(created / timer.elapsed * 60, 1)})
+
+        with Timer() as timer:
+            with open(archive_path, "rb") as f:
+                response = client.post("/documents/bulk", files=[("files", ("corpus.zip", f, "application/zip"))])
+        manifest = response.json()
+        results.append({"mode": "bulk_zip", "files": count, "created": manifest.get("created", 0), "requests": 1,
+                        "workers": workers, "elapsed_s": round(timer.elapsed, 2),
+                        "docs_per_minute": round(manifest.get("created", 0) / timer.elapsed * 60, 1)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--paragraphs", type=int, default=20, help="每个文档的段落数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="批量导入的提取进程数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    results = run(args.files, args.paragraphs, args.workers)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    for row in results:
+        print(", ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+多文档对比基准：2 / 10 / 50 篇文档下的耗时、LLM 调用次数与输入 token.
+运行方式 (在 backend 目录下): python -m benchmarks.bench_multi_document_comparison
+"""
+import argparse
+import json
+
+from benchmarks._common import FakeChatModel, FakeEmbeddings, Timer, synthetic_text
+
+from app.core.database import SessionLocal, Base, engine
+from app.core.tokens import estimate_tokens
+from app.models.document import Document
+from app.services import qa_service
+from app.services.qa_service import QAService
+
+
+def run(doc_counts, paragraphs: int, latency: float):
+    Base.metadata.create_all(bind=engine)
+    qa_service.EmbeddingManager._instance = FakeEmbeddings()
+    results = []
+    for count in doc_counts:
+        db = SessionLocal()
+        try:
+            db.query(Document).delete()
+            docs = [
+                Document(filename=f"doc_{i}.txt", content=synthetic_text(paragraphs, seed=i))
+                for i in range(count)
+            ]
+            db.add_all(docs)
+            db.commit()
+
+            fake_llm = FakeChatModel(latency=latency)
+            service = QAService(db)
+            service._create_llm = lambda *args, **kwargs: fake_llm
+            with Timer() as timer:
+                result = service.multi_document_comparison([doc.id for doc in docs], "这些文档对风险的看法有何不同？")
+            assert "error" not in result, result
+
+            results.append({
+                "documents": count,
+                "seconds": round(timer.elapsed, 3),
+                "llm_calls": fake_llm.calls,
+                "prompt_tokens": fake_llm.prompt_tokens,
+                # 把所有文档塞进一个提示词时需要的 token 数，作为对照
+                "stuff_all_tokens": sum(estimate_tokens(doc.content) for doc in docs),
+            })
+        finally:
+            db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, nargs="+", default=[2, 10, 50])
+    parser.add_argument("--paragraphs", type=int, default=40, help="每篇合成文档的段落数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟 LLM 单次调用延迟 (秒)")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    results = run(args.docs, args.paragraphs, args.latency)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(f"{'docs':>6} {'seconds':>9} {'llm_calls':>10} {'prompt_tok':>11} {'stuff_all_tok':>14}")
+    for row in results:
+        print(f"{row['documents']:>6} {row['seconds']:>9} {row['llm_calls']:>10} "
+              f"{row['prompt_tokens']:>11} {row['stuff_all_tokens']:>14}")
+
+
+if __name__ == "__main__":
+    main()
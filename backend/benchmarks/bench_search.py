@@ -0,0 +1,113 @@
+"""
+全文检索基准：GET /documents/search 背后的 FTS5 查询在大语料上的延迟 (p50 / p95)，
+并与 LIKE '%词%' 全表扫描对比。语料为合成的中英混合文档，另外按 Zipf 分布混入两万个生僻二字词，
+检索词覆盖命中全部文档的常见词、中频词、稀有词、多词组合和文件名。
+运行方式 (在 backend 目录下): python -m benchmarks.bench_search --docs 100000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks._common import synthetic_text
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine
+from app.models.document import Document
+from app.services import search_index
+
+
+def make_vocabulary(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    chars = [chr(code) for code in range(0x4e00, 0x4e00 + 3000)]
+    return ["".join(rng.choice(chars) for _ in range(2)) for _ in range(size)]
+
+
+def build_corpus(db, count: int, paragraphs: int, vocabulary, batch_size: int = 1000):
+    rng = random.Random(1)
+    for start in range(0, count, batch_size):
+        documents = []
+        for i in range(start, min(start + batch_size, count)):
+            rare = "".join(vocabulary[int(rng.paretovariate(0.8)) % len(vocabulary)] for _ in range(40))
+            documents.append(Document(filename=f"doc_{i:06d}.txt",
+                                      content=synthetic_text(paragraphs, seed=i) + "\n\n" + rare))
+        db.add_all(documents)
+        db.flush()
+        search_index.index_documents(db, [(doc.id, doc.filename, doc.content) for doc in documents])
+        db.commit()
+
+
+def measure(fn, repeat: int):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return result, {"p50_ms": round(statistics.median(samples), 2),
+                    "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2)}
+
+
+def run(count: int, paragraphs: int, repeat: int, rank_window: int):
+    Base.metadata.create_all(bind=engine)
+    search_index.ensure_schema(engine)
+    db = SessionLocal()
+    vocabulary = make_vocabulary(20000)
+    started = time.perf_counter()
+    build_corpus(db, count, paragraphs, vocabulary)
+    build_seconds = time.perf_counter() - started
+
+    queries = {
+        "common (all docs)": "知识图谱",
+        "two common terms": "数据 模型",
+        "latin term": "OpenAI",
+        "three terms": "人工智能 风险 latency",
+        "mid-frequency": vocabulary[20],
+        "rare": vocabulary[5000],
+        "filename": f"doc_{count // 2:06d}",
+    }
+    results = []
+    for label, query in queries.items():
+        row = {"query": label, "text": query}
+        settings.SEARCH_RANK_WINDOW = rank_window
+        hits, row["fts"] = measure(lambda: search_index.search(db, query, limit=20), repeat)
+        row["hits"] = len(hits["results"])
+        # 不限排序窗口：对全部命中文档计算 bm25
+        settings.SEARCH_RANK_WINDOW = count
+        _, row["fts_full_rank"] = measure(lambda: search_index.search(db, query, limit=20), repeat)
+        term = query.split()[0]
+        _, row["like_scan"] = measure(lambda: db.execute(text(
+            "SELECT id FROM documents WHERE content LIKE :pattern OR filename LIKE :pattern LIMIT 20"
+        ), {"pattern": f"%{term}%"}).all(), max(1, repeat // 5))
+        results.append(row)
+    db.close()
+    return {"documents": count, "index_build_seconds": round(build_seconds, 1), "rank_window": rank_window,
+            "queries": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--paragraphs", type=int, default=3, help="每个文档的段落数")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rank-window", type=int, default=settings.SEARCH_RANK_WINDOW)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    report = run(args.docs, args.paragraphs, args.repeat, args.rank_window)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print(f"documents={report['documents']}, index_build_s={report['index_build_seconds']}, "
+          f"rank_window={report['rank_window']}")
+    for row in report["queries"]:
+        print(f"{row['query']:>20}: hits={row['hits']:>2} fts={row['fts']} "
+              f"fts_full_rank={row['fts_full_rank']} like_scan={row['like_scan']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+上传解析峰值内存基准：对比旧的整包读入 (read + BytesIO) 与分块落盘后按路径解析.
+parser_only 一列是直接按路径解析的峰值，代表解析器自身的工作集。
+运行方式 (在 backend 目录下): python -m benchmarks.bench_upload_memory --mb 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+from benchmarks._common import Timer, synthetic_text
+
+import docx2txt
+import numpy as np
+from PIL import Image as PILImage
+from pypdf import PdfReader
+from starlette.datastructures import Headers, UploadFile
+
+from app.api.documents import spool_upload
+from app.services import extraction_service
+
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+
+
+def _noise_png(path: str, megabytes: float):
+    """随机噪声图几乎无法压缩，用来把文件撑到目标大小 (模拟扫描件/配图)"""
+    side = max(64, int((megabytes * 1024 * 1024 / 3) ** 0.5))
+    pixels = np.random.default_rng(0).integers(0, 255, size=(side, side, 3), dtype=np.uint8)
+    PILImage.fromarray(pixels).save(path)
+
+
+def make_pdf(path: str, megabytes: float):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    image_path = path + ".png"
+    _noise_png(image_path, megabytes)
+    pdf = canvas.Canvas(path, pagesize=letter)
+    text = synthetic_text(30, seed=1).replace("\n", " ")
+    for page in range(20):
+        y = 750
+        for start in range(0, 2000, 80):
+            pdf.drawString(40, y, text[start:start + 80].encode("ascii", "ignore").decode() or "page %d" % page)
+            y -= 14
+        pdf.showPage()
+    pdf.drawImage(image_path, 40, 200, width=500, height=500)
+    pdf.showPage()
+    pdf.save()
+    os.remove(image_path)
+
+
+def make_docx(path: str, megabytes: float):
+    from docx import Document as DocxDocument
+
+    image_path = path + ".png"
+    _noise_png(image_path, megabytes)
+    doc = DocxDocument()
+    for paragraph in synthetic_text(200, seed=2).split("\n\n"):
+        doc.add_paragraph(paragraph)
+    doc.add_picture(image_path)
+    doc.save(path)
+    os.remove(image_path)
+
+
+def make_txt(path: str, megabytes: float):
+    block = synthetic_text(50, seed=3)
+    target = int(megabytes * 1024 * 1024)
+    with open(path, "w", encoding="utf-8") as f:
+        written = 0
+        while written < target:
+            f.write(block)
+            written += len(block.encode("utf-8"))
+
+
+async def legacy_extract(upload: UploadFile, kind: str) -> str:
+    """旧实现：一次性读入全部字节，再复制一份 BytesIO 交给解析器"""
+    content = await upload.read()
+    if kind == "pdf":
+        return "".join(page.extract_text() or "" for page in PdfReader(BytesIO(content)).pages)
+    if kind == "docx":
+        return docx2txt.process(BytesIO(content))
+    return content.decode("utf-8")
+
+
+async def streaming_extract(upload: UploadFile, kind: str) -> str:
+    path = await spool_upload(upload, max_bytes=1 << 40)
+    try:
+        return extraction_service.extract_text(path, CONTENT_TYPES[kind])
+    finally:
+        os.remove(path)
+
+
+def measure(func):
+    tracemalloc.start()
+    with Timer() as timer:
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2), round(timer.elapsed, 3)
+
+
+def run(megabytes: float, kinds):
+    builders = {"pdf": make_pdf, "docx": make_docx, "txt": make_txt}
+    results = []
+    workdir = tempfile.mkdtemp(prefix="docqa-upload-bench-")
+    for kind in kinds:
+        path = os.path.join(workdir, f"sample.{kind}")
+        builders[kind](path, megabytes)
+        size_mb = round(os.path.getsize(path) / 1024 / 1024, 2)
+
+        def upload():
+            headers = Headers({"content-type": CONTENT_TYPES[kind]})
+            return UploadFile(file=open(path, "rb"), filename=os.path.basename(path), headers=headers)
+
+        row = {"kind": kind, "file_mb": size_mb}
+        for name, extractor in (("legacy", legacy_extract), ("streaming", streaming_extract)):
+            file = upload()
+            try:
+                row[f"{name}_peak_mb"], row[f"{name}_seconds"] = measure(lambda: asyncio.run(extractor(file, kind)))
+            finally:
+                file.file.close()
+        row["parser_only_peak_mb"], _ = measure(
+            lambda: extraction_service.extract_text(path, CONTENT_TYPES[kind])
+        )
+        results.append(row)
+        os.remove(path)
+    os.rmdir(workdir)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mb", type=float, default=20, help="合成文件的目标大小 (MB)")
+    parser.add_argument("--kinds", nargs="+", default=["pdf", "docx", "txt"])
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    results = run(args.mb, args.kinds)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(f"{'kind':>5} {'file_mb':>8} {'legacy_peak':>12} {'stream_peak':>12} {'parser_peak':>12}")
+    for row in results:
+        print(f"{row['kind']:>5} {row['file_mb']:>8} {row['legacy_peak_mb']:>12} "
+              f"{row['streaming_peak_mb']:>12} {row['parser_only_peak_mb']:>12}")
+
+
+if __name__ == "__main__":
+    main()
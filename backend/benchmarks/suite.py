@@ -0,0 +1,358 @@
+"""
+热点路径微基准套件：在固定的合成语料上测量各热点路径的耗时和峰值内存，完全离线运行.
+覆盖 PDF/DOCX 文本提取、两种切分、Embedding 吞吐 (经 EmbeddingManager)、FAISS 构建与查询、
+图谱构建 (_parse_and_add_to_graph) 与中心性、图谱渲染 (generate_graph_image_base64) 和 PDF/Word 报告生成。
+耗时取多次运行的中位数；峰值内存为单独一次运行中 tracemalloc 记录的 Python/numpy 分配峰值
+(faiss 等 C++ 扩展内部的分配不计入)。
+
+运行方式 (在 backend 目录下):
+    python -m benchmarks.suite --output bench.json                      # 运行并保存结果
+    python -m benchmarks.suite --baseline bench.json --threshold 0.2    # 与基线对比，出现回退时退出码为 1
+    python -m benchmarks.suite --only graph,report                      # 只运行名称以这些前缀开头的基准
+默认使用哈希假模型测量 Embedding 路径的开销；--real-embeddings 改用配置的 HuggingFace 模型。
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks._common import HashingEmbeddings, synthetic_extractions, synthetic_text
+
+from langchain_community.vectorstores import FAISS
+
+from app.core.config import settings
+from app.services import chunk_store, extraction_service
+from app.services.knowledge_graph_service import KnowledgeGraphService
+from app.services.qa_service import EmbeddingManager
+from app.services.report_service import ReportService
+
+RESULT_VERSION = 1
+
+# 名称 -> (准备函数, 默认重复次数)；准备函数不计时，返回 (被测函数, 处理量, 处理量单位)
+BENCHMARKS: Dict[str, Tuple[Callable, int]] = {}
+
+
+def benchmark(name: str, repeat: int = 5):
+    def register(setup: Callable):
+        BENCHMARKS[name] = (setup, repeat)
+        return setup
+    return register
+
+
+class Corpus:
+    """按 scale 生成的固定语料，各基准共享，只在首次使用时生成"""
+
+    def __init__(self, directory: str, scale: float):
+        self.directory = directory
+        self.scale = scale
+        self._cache: Dict[str, object] = {}
+
+    def size(self, base: int) -> int:
+        return max(1, int(base * self.scale))
+
+    def cached(self, key: str, factory: Callable):
+        if key not in self._cache:
+            self._cache[key] = factory()
+        return self._cache[key]
+
+    @property
+    def text(self) -> str:
+        return self.cached("text", lambda: synthetic_text(self.size(200), seed=7))
+
+    @property
+    def chunks(self) -> List[str]:
+        return self.cached("chunks", lambda: chunk_store.split_for_embedding(self.text))
+
+    @property
+    def embeddings(self):
+        return EmbeddingManager.get_embeddings()
+
+    @property
+    def vectors(self) -> List[List[float]]:
+        return self.cached("vectors", lambda: self.embeddings.embed_documents(self.chunks))
+
+    @property
+    def extractions(self) -> List[Dict]:
+        return self.cached("extractions", lambda: synthetic_extractions(self.size(5000), self.size(800)))
+
+    def graph_service(self, edges: int) -> KnowledgeGraphService:
+        service = KnowledgeGraphService(None)
+        for data in synthetic_extractions(edges, max(edges // 3, 10), seed=3):
+            service._parse_and_add_to_graph(data)
+        return service
+
+    @property
+    def graph_image(self) -> bytes:
+        return self.cached("graph_image", lambda: self.graph_service(120).generate_graph_image())
+
+
+# --- 基准定义 ---
+
+@benchmark("extract.pdf")
+def bench_extract_pdf(corpus: Corpus):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    pages = corpus.size(40)
+    path = os.path.join(corpus.directory, "extract.pdf")
+    # 内置字体不含中文，只写入 ASCII 部分
+    text = corpus.text.encode("ascii", "ignore").decode() or "page"
+    pdf = canvas.Canvas(path, pagesize=letter)
+    for page in range(pages):
+        y = 750
+        for start in range(page * 90, page * 90 + 90 * 50, 90):
+            pdf.drawString(40, y, text[start % len(text):start % len(text) + 90])
+            y -= 14
+        pdf.showPage()
+    pdf.save()
+    return (lambda: extraction_service.extract_text(path, "application/pdf")), pages, "pages"
+
+
+@benchmark("extract.docx")
+def bench_extract_docx(corpus: Corpus):
+    from docx import Document as DocxDocument
+
+    path = os.path.join(corpus.directory, "extract.docx")
+    document = DocxDocument()
+    paragraphs = corpus.text.split("\n\n")
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+    content_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    return (lambda: extraction_service.extract_text(path, content_type)), len(paragraphs), "paragraphs"
+
+
+@benchmark("chunk.embedding")
+def bench_chunk_embedding(corpus: Corpus):
+    text = corpus.text
+    return (lambda: chunk_store.split_for_embedding(text)), len(text), "chars"
+
+
+@benchmark("chunk.graph")
+def bench_chunk_graph(corpus: Corpus):
+    text = corpus.text
+    return (lambda: KnowledgeGraphService._split_chunks(text)), len(text), "chars"
+
+
+@benchmark("embed.documents")
+def bench_embed_documents(corpus: Corpus):
+    chunks, embeddings = corpus.chunks, corpus.embeddings
+    return (lambda: embeddings.embed_documents(chunks)), len(chunks), "chunks"
+
+
+@benchmark("faiss.build")
+def bench_faiss_build(corpus: Corpus):
+    pairs, embeddings = list(zip(corpus.chunks, corpus.vectors)), corpus.embeddings
+    return (lambda: FAISS.from_embeddings(pairs, embeddings)), len(pairs), "chunks"
+
+
+@benchmark("faiss.query")
+def bench_faiss_query(corpus: Corpus):
+    store = FAISS.from_embeddings(list(zip(corpus.chunks, corpus.vectors)), corpus.embeddings)
+    queries = [corpus.embeddings.embed_query(f"问题 {i} 知识图谱 风险") for i in range(corpus.size(200))]
+
+    def run():
+        for vector in queries:
+            store.similarity_search_by_vector(vector, k=4)
+    return run, len(queries), "queries"
+
+
+@benchmark("graph.build_centrality")
+def bench_graph_build(corpus: Corpus):
+    extractions = corpus.extractions
+
+    def run():
+        service = KnowledgeGraphService(None)
+        for data in extractions:
+            service._parse_and_add_to_graph(data)
+        graph = service.graph.remove_isolates(min_count=2)
+        graph.degree_centrality()
+        graph.pagerank()
+    return run, len(extractions), "extractions"
+
+
+@benchmark("graph.image", repeat=3)
+def bench_graph_image(corpus: Corpus):
+    service = corpus.graph_service(120)
+    return service.generate_graph_image_base64, service.graph.number_of_nodes, "nodes"
+
+
+def _report_setup(corpus: Corpus, format: str):
+    service = ReportService()
+    content = {"title": "基准测试报告", "summary": synthetic_text(corpus.size(8), seed=11)}
+    selected_docs = [{"filename": f"doc_{i}.pdf"} for i in range(corpus.size(20))]
+    image = corpus.graph_image
+
+    def run():
+        service.generate_report(format=format, content=content, selected_docs=selected_docs,
+                                kg_image=image, output=BytesIO())
+    return run, 1, "reports"
+
+
+@benchmark("report.pdf", repeat=3)
+def bench_report_pdf(corpus: Corpus):
+    return _report_setup(corpus, "pdf")
+
+
+@benchmark("report.word", repeat=3)
+def bench_report_word(corpus: Corpus):
+    return _report_setup(corpus, "word")
+
+
+# --- 运行与对比 ---
+
+def measure(fn: Callable, repeat: int) -> Dict:
+    fn()  # 预热：导入、字体注册、缓存等一次性开销不计入
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds_median": round(statistics.median(samples), 6),
+        "seconds_min": round(min(samples), 6),
+        "repeat": repeat,
+        "peak_mb": round(peak / 1024 / 1024, 3),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(only: Optional[List[str]], scale: float, repeat: Optional[int], real_embeddings: bool) -> Dict:
+    if not real_embeddings:
+        EmbeddingManager.register(EmbeddingManager.active_model(), HashingEmbeddings())
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="docqa-suite-") as directory:
+        corpus = Corpus(directory, scale)
+        for name, (setup, default_repeat) in BENCHMARKS.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            fn, items, unit = setup(corpus)
+            result = measure(fn, repeat or default_repeat)
+            result.update(items=items, unit=unit,
+                          items_per_second=round(items / result["seconds_median"], 2)
+                          if result["seconds_median"] > 0 else None)
+            results[name] = result
+            print(f"{name:>24}: {result['seconds_median'] * 1000:9.2f} ms  "
+                  f"peak {result['peak_mb']:8.2f} MB  {result['items_per_second']} {unit}/s", file=sys.stderr)
+    return {
+        "version": RESULT_VERSION,
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": scale,
+            "embeddings": EmbeddingManager.active_model() if real_embeddings else "HashingEmbeddings",
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float, memory_threshold: float,
+            min_delta_ms: float) -> List[Dict]:
+    """
+    逐项对比耗时中位数和峰值内存，超过基线 (1 + 阈值) 倍记为回退.
+    耗时差小于 min_delta_ms 的不算回退，避免极短基准的计时抖动误报。
+    """
+    if baseline.get("meta", {}).get("scale") != current["meta"]["scale"]:
+        print("warning: baseline was recorded with a different --scale", file=sys.stderr)
+    rows = []
+    for name, result in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            rows.append({"name": name, "status": "new"})
+            continue
+        time_ratio = result["seconds_median"] / base["seconds_median"] if base["seconds_median"] else None
+        memory_ratio = result["peak_mb"] / base["peak_mb"] if base["peak_mb"] else None
+        delta_ms = (result["seconds_median"] - base["seconds_median"]) * 1000
+        reasons = []
+        if time_ratio is not None and time_ratio > 1 + threshold and delta_ms >= min_delta_ms:
+            reasons.append("time")
+        if memory_ratio is not None and memory_ratio > 1 + memory_threshold:
+            reasons.append("memory")
+        rows.append({
+            "name": name,
+            "status": "regression" if reasons else "ok",
+            "reasons": reasons,
+            "time_ratio": round(time_ratio, 3) if time_ratio is not None else None,
+            "memory_ratio": round(memory_ratio, 3) if memory_ratio is not None else None,
+            "seconds_median": result["seconds_median"],
+            "baseline_seconds_median": base["seconds_median"],
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="把结果写入该 JSON 文件 (可作为之后的基线)")
+    parser.add_argument("--baseline", help="与该 JSON 基线对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="耗时回退阈值 (相对基线的增幅)")
+    parser.add_argument("--memory-threshold", type=float, default=0.2, help="峰值内存回退阈值")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="耗时差低于该值时不算回退")
+    parser.add_argument("--only", help="逗号分隔的基准名前缀")
+    parser.add_argument("--scale", type=float, default=1.0, help="语料规模倍数")
+    parser.add_argument("--repeat", type=int, help="覆盖各基准的默认重复次数")
+    parser.add_argument("--real-embeddings", action="store_true", help=f"使用 {settings.EMBEDDING_MODEL_NAME}")
+    parser.add_argument("--list", action="store_true", help="只列出基准名称")
+    args = parser.parse_args()
+    # 无中文字体的环境下图谱渲染会为每个缺失字形告警
+    warnings.filterwarnings("ignore", message="Glyph .* missing from")
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+    only = [prefix.strip() for prefix in args.only.split(",")] if args.only else None
+    report = run_suite(only, args.scale, args.repeat, args.real_embeddings)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold, args.memory_threshold, args.min_delta_ms)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold,
+                                "memory_threshold": args.memory_threshold, "results": rows}
+        for row in rows:
+            if row["status"] == "new":
+                print(f"{row['name']:>24}: new (not in baseline)")
+                continue
+            flag = "REGRESSION " + "+".join(row["reasons"]) if row["reasons"] else "ok"
+            print(f"{row['name']:>24}: time x{row['time_ratio']}  memory x{row['memory_ratio']}  {flag}")
+        if any(row["status"] == "regression" for row in rows):
+            exit_code = 1
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    elif not args.baseline:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+压测驱动：按加权的请求组合回放接近真实的负载，统计各接口的吞吐量和 p50 / p95 / p99 延迟.
+先上传一批合成文档作为问答、图谱和报告的对象，之后在限定时长或请求数内持续发起请求：
+- 默认闭环模式，--concurrency 个虚拟用户各自串行发请求；
+- 指定 --rate 时为开环模式，请求按泊松过程到达，延迟从计划到达时刻算起，排队时间也计入 (避免协同遗漏)。
+延迟分位数只统计 2xx 响应，其余按状态码计数；流式接口另外统计首个事件的到达时间。
+--spawn 时自动启动 mock LLM (loadtest.mock_llm) 和被测应用 (loadtest.serve_app)，结束后关闭。
+运行方式 (在 backend 目录下):
+  python -m loadtest.driver --spawn --fake-embeddings --duration 60 --concurrency 8
+  python -m loadtest.driver --base-url http://127.0.0.1:8000 --mix qa_multi_model=3,kg_build=1 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+_WORDS = [
+    "人工智能", "知识图谱", "大语言模型", "检索", "向量", "文档", "实体", "关系", "数据", "模型",
+    "训练", "推理", "企业", "市场", "增长", "风险", "政策", "研究", "系统", "用户",
+    "OpenAI", "FAISS", "Python", "GPU", "API", "benchmark", "latency", "throughput",
+]
+_QUESTIONS = [
+    "这篇文档的主要结论是什么？", "文中提到了哪些风险？", "知识图谱在系统中起什么作用？",
+    "企业如何使用大语言模型？", "总结一下市场增长的原因", "文档中的数据来自哪里？",
+]
+_REPORT_TITLES = ["智能文档分析报告", "季度研究摘要", "风险评估报告"]
+
+DEFAULT_MIX = {
+    "qa_single": 30,
+    "qa_multi_model": 10,
+    "qa_multi_model_stream": 5,
+    "qa_knowledge_base": 3,
+    "search": 25,
+    "documents_list": 10,
+    "kg_build": 6,
+    "report": 6,
+    "document_upload": 2,
+}
+
+
+def document_text(seed: int, paragraphs: int) -> str:
+    """确定性的中英混合文本，段落之间以空行分隔"""
+    rng = random.Random(seed)
+    result = []
+    for _ in range(paragraphs):
+        sentences = ["".join(rng.choice(_WORDS) for _ in range(12)) + "。" for _ in range(rng.randint(3, 6))]
+        result.append("".join(sentences))
+    return "\n\n".join(result)
+
+
+@dataclass
+class Sample:
+    status: str
+    latency: float
+    first_event: Optional[float] = None
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    rng: random.Random
+    document_ids: List[int]
+    paragraphs: int
+    uploads: int = 0
+
+
+@dataclass
+class EndpointStats:
+    samples: List[Sample] = field(default_factory=list)
+
+    def summary(self, elapsed: float) -> Dict:
+        ok = sorted(sample.latency for sample in self.samples if sample.status.startswith("2"))
+        first = sorted(sample.first_event for sample in self.samples
+                       if sample.status.startswith("2") and sample.first_event is not None)
+        result = {
+            "requests": len(self.samples),
+            "ok": len(ok),
+            "errors": len(self.samples) - len(ok),
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+            "statuses": dict(Counter(sample.status for sample in self.samples)),
+        }
+        result.update(latency_summary(ok))
+        if first:
+            result["first_event"] = latency_summary(first)
+        return result
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法，values 已排序"""
+    index = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def latency_summary(values: List[float]) -> Dict:
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    result = {f"p{q}_ms": round(percentile(values, q) * 1000, 1) for q in (50, 95, 99)}
+    result["max_ms"] = round(values[-1] * 1000, 1)
+    return result
+
+
+# --- 场景：每个场景发起一次请求，返回 (状态, 首个事件耗时) ---
+
+async def _send(ctx: Context, method: str, url: str, **kwargs) -> str:
+    response = await ctx.client.request(method, url, **kwargs)
+    return str(response.status_code)
+
+
+async def qa_single(ctx: Context):
+    return await _send(ctx, "POST", "/qa/single-document", json={}, params={
+        "document_id": ctx.rng.choice(ctx.document_ids), "question": ctx.rng.choice(_QUESTIONS)})
+
+
+async def qa_multi_model(ctx: Context):
+    return await _send(ctx, "POST", "/qa/multi-model", params={
+        "document_id": ctx.rng.choice(ctx.document_ids), "question": ctx.rng.choice(_QUESTIONS)})
+
+
+async def qa_multi_model_stream(ctx: Context):
+    started = time.perf_counter()
+    first_event = None
+    params = {"document_id": ctx.rng.choice(ctx.document_ids), "question": ctx.rng.choice(_QUESTIONS)}
+    async with ctx.client.stream("POST", "/qa/multi-model/stream", params=params) as response:
+        async for line in response.aiter_lines():
+            if line and first_event is None:
+                first_event = time.perf_counter() - started
+    return str(response.status_code), first_event
+
+
+async def qa_knowledge_base(ctx: Context):
+    return await _send(ctx, "POST", "/qa/knowledge-base", json={},
+                       params={"question": ctx.rng.choice(_QUESTIONS)})
+
+
+async def search(ctx: Context):
+    terms = ctx.rng.sample(_WORDS, ctx.rng.choice([1, 1, 2]))
+    return await _send(ctx, "GET", "/documents/search", params={"q": " ".join(terms), "limit": 20})
+
+
+async def documents_list(ctx: Context):
+    return await _send(ctx, "GET", "/documents/")
+
+
+async def kg_build(ctx: Context):
+    return await _send(ctx, "POST", "/knowledge-graph/build", json={"document_id": ctx.rng.choice(ctx.document_ids)})
+
+
+async def report(ctx: Context):
+    # 标题和文档组合取值范围有限，相同组合会命中报告缓存，与实际使用相近
+    document_ids = ctx.rng.sample(ctx.document_ids, min(len(ctx.document_ids), ctx.rng.randint(1, 3)))
+    return await _send(ctx, "POST", "/reports/generate", json={
+        "format": ctx.rng.choice(["pdf", "word"]), "title": ctx.rng.choice(_REPORT_TITLES),
+        "document_ids": document_ids})
+
+
+async def document_upload(ctx: Context):
+    ctx.uploads += 1
+    seed = 1_000_000 + ctx.rng.randrange(1_000_000) * 1000 + ctx.uploads
+    content = document_text(seed, ctx.paragraphs).encode("utf-8")
+    return await _send(ctx, "POST", "/documents/",
+                       files={"file": (f"loadtest_upload_{seed}.txt", content, "text/plain")})
+
+
+SCENARIOS: Dict[str, Callable[[Context], Awaitable]] = {
+    "qa_single": qa_single,
+    "qa_multi_model": qa_multi_model,
+    "qa_multi_model_stream": qa_multi_model_stream,
+    "qa_knowledge_base": qa_knowledge_base,
+    "search": search,
+    "documents_list": documents_list,
+    "kg_build": kg_build,
+    "report": report,
+    "document_upload": document_upload,
+}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, sep, weight = item.partition("=")
+        if name not in SCENARIOS or not sep:
+            raise argparse.ArgumentTypeError(f"无法解析的请求组合 {item}，可选场景: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight)
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("请求组合中至少要有一个权重大于 0 的场景")
+    return mix
+
+
+async def seed_documents(client: httpx.AsyncClient, count: int, paragraphs: int, reuse: bool) -> List[int]:
+    """上传合成文档；reuse 时直接使用库中已有的文档"""
+    if reuse:
+        response = await client.get("/documents/")
+        response.raise_for_status()
+        ids = [document["id"] for document in response.json()][:count]
+        if ids:
+            return ids
+    ids = []
+    for i in range(count):
+        content = document_text(i, paragraphs).encode("utf-8")
+        response = await client.post("/documents/", files={"file": (f"loadtest_{i:04d}.txt", content, "text/plain")})
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    return ids
+
+
+async def run_load(args) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        document_ids = await seed_documents(client, args.documents, args.paragraphs, args.reuse_documents)
+        ctx = Context(client=client, rng=random.Random(args.seed), document_ids=document_ids, paragraphs=args.paragraphs)
+        names = [name for name, weight in args.mix.items() if weight > 0]
+        weights = [args.mix[name] for name in names]
+        stats = {name: EndpointStats() for name in names}
+        issued = 0
+        started = time.perf_counter()
+        deadline = started + args.duration if args.duration else None
+
+        def more() -> bool:
+            if args.requests and issued >= args.requests:
+                return False
+            return deadline is None or time.perf_counter() < deadline
+
+        async def execute(name: str, scheduled_at: float):
+            first_event = None
+            try:
+                result = await SCENARIOS[name](ctx)
+                status, first_event = result if isinstance(result, tuple) else (result, None)
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError as e:
+                status = f"error:{type(e).__name__}"
+            stats[name].samples.append(Sample(status, time.perf_counter() - scheduled_at, first_event))
+
+        if args.rate:
+            # 开环：按泊松过程到达，不等待前一个请求完成
+            tasks = set()
+            next_at = time.perf_counter()
+            while more():
+                next_at += ctx.rng.expovariate(args.rate)
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                issued += 1
+                task = asyncio.create_task(execute(ctx.rng.choices(names, weights)[0], next_at))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        else:
+            async def user():
+                nonlocal issued
+                while more():
+                    issued += 1
+                    await execute(ctx.rng.choices(names, weights)[0], time.perf_counter())
+
+            await asyncio.gather(*(user() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    all_samples = EndpointStats([sample for endpoint in stats.values() for sample in endpoint.samples])
+    return {
+        "meta": {
+            "base_url": args.base_url, "mode": f"open-loop {args.rate}/s" if args.rate else "closed-loop",
+            "concurrency": args.concurrency, "elapsed_seconds": round(elapsed, 1), "documents": len(document_ids),
+            "mix": args.mix, "python": platform.python_version(), "machine": platform.machine(),
+        },
+        "endpoints": {name: endpoint.summary(elapsed) for name, endpoint in stats.items() if endpoint.samples},
+        "total": all_samples.summary(elapsed),
+    }
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} 对应的进程已退出 (exit code {process.returncode})")
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"等待 {url} 就绪超时")
+
+
+def spawn_servers(args) -> List[subprocess.Popen]:
+    """启动 mock LLM 和被测应用，返回进程列表；工作目录为 backend"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    mock_base = f"http://127.0.0.1:{args.mock_port}"
+    processes = []
+    # 两个服务的日志写入文件，避免与压测报告混在一起
+    log = open(args.server_log, "ab")
+    try:
+        mock = subprocess.Popen([sys.executable, "-m", "loadtest.mock_llm", "--port", str(args.mock_port),
+                                 *shlex.split(args.mock_args)], cwd=backend_dir, stdout=log, stderr=log)
+        processes.append(mock)
+        _wait_ready(f"{mock_base}/mock/config", mock, 30)
+        app_command = [sys.executable, "-m", "loadtest.serve_app", "--port", str(args.app_port),
+                       "--llm-base", f"{mock_base}/v1", *shlex.split(args.app_args)]
+        if args.fake_embeddings:
+            app_command.append("--fake-embeddings")
+        app = subprocess.Popen(app_command, cwd=backend_dir, stdout=log, stderr=log)
+        processes.append(app)
+        _wait_ready(f"http://127.0.0.1:{args.app_port}/health", app, 180)
+    except Exception:
+        stop_servers(processes)
+        print(f"服务启动失败，日志见 {args.server_log}", file=sys.stderr)
+        raise
+    finally:
+        log.close()
+    args.base_url = f"http://127.0.0.1:{args.app_port}"
+    args.mock_url = mock_base
+    return processes
+
+
+def stop_servers(processes: List[subprocess.Popen]):
+    for process in reversed(processes):
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def print_report(report: Dict):
+    meta = report["meta"]
+    print(f"{meta['mode']}, concurrency={meta['concurrency']}, elapsed={meta['elapsed_seconds']}s, "
+          f"documents={meta['documents']}")
+    header = f"{'endpoint':<24}{'requests':>9}{'ok':>7}{'rps':>8}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}{'max_ms':>10}  statuses"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for name, row in rows:
+        cells = "".join(f"{'-' if row[key] is None else row[key]:>10}" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms"))
+        print(f"{name:<24}{row['requests']:>9}{row['ok']:>7}{row['throughput_rps']:>8}{cells}  {row['statuses']}")
+        if "first_event" in row and name != "TOTAL":
+            first = row["first_event"]
+            print(f"{'  first event':<48}{first['p50_ms']:>10}{first['p95_ms']:>10}{first['p99_ms']:>10}{first['max_ms']:>10}")
+    if "mock_llm" in report:
+        print(f"mock LLM: {json.dumps(report['mock_llm'], ensure_ascii=False)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="被测应用地址 (--spawn 时忽略)")
+    parser.add_argument("--mock-url", default=None, help="mock LLM 地址，提供时在报告中附上其调用统计")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="场景权重，如 qa_single=5,kg_build=1；可选场景: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8, help="闭环模式的虚拟用户数 / 开环模式的最大连接数")
+    parser.add_argument("--rate", type=float, default=0.0, help="开环模式的平均到达速率 (请求/秒)，0 表示闭环")
+    parser.add_argument("--duration", type=float, default=60.0, help="压测时长 (秒)，0 表示只按 --requests 限制")
+    parser.add_argument("--requests", type=int, default=0, help="最多发起的请求数，0 表示不限")
+    parser.add_argument("--documents", type=int, default=10, help="预先上传的文档数")
+    parser.add_argument("--paragraphs", type=int, default=8, help="每个文档的段落数")
+    parser.add_argument("--reuse-documents", action="store_true", help="使用库中已有的文档，不再上传")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求的超时 (秒)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn", action="store_true", help="自动启动 mock LLM 和被测应用")
+    parser.add_argument("--fake-embeddings", action="store_true", help="--spawn 时被测应用使用离线哈希向量")
+    parser.add_argument("--mock-port", type=int, default=9000)
+    parser.add_argument("--app-port", type=int, default=8000)
+    parser.add_argument("--mock-args", default="", help="传给 mock LLM 的参数，如 \"--latency fixed:0.5 --error-rate 0.02\"")
+    parser.add_argument("--app-args", default="", help="传给被测应用 (loadtest.serve_app) 的参数")
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "docqa-loadtest-servers.log"),
+                        help="--spawn 时两个服务的日志文件")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        parser.error("--duration 和 --requests 至少指定一个")
+
+    processes = spawn_servers(args) if args.spawn else []
+    try:
+        report = asyncio.run(run_load(args))
+        if args.mock_url:
+            try:
+                report["mock_llm"] = httpx.get(f"{args.mock_url}/mock/stats", timeout=5.0).json()
+            except httpx.HTTPError as e:
+                report["mock_llm"] = {"error": str(e)}
+    finally:
+        stop_servers(processes)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+本地模拟的 OpenAI 兼容 LLM 服务，用于压测，不依赖也不消耗远程模型.
+实现 POST /v1/chat/completions (含 stream=true 的 SSE 流式输出) 和 GET /v1/models：
+- 延迟按分布抽样 (fixed / uniform / normal / lognormal)，可按模型单独设置，流式输出另有逐 token 间隔；
+- 按比例注入 500 错误和带 Retry-After 的 429，超过并发上限的请求同样返回 429；
+- 图谱抽取提示词 ([片段 i] 分段) 返回确定性的 {"chunks": [...]} JSON，实体取自片段原文，
+  可按比例返回被截断的 JSON 以覆盖本地修复和模型修复的路径；其余提示词返回固定格式的回答。
+运行时可通过 GET/PUT /mock/config 修改参数，GET /mock/stats 查看调用统计。
+运行方式 (在 backend 目录下): python -m loadtest.mock_llm --port 9000 --latency lognormal:0.8,0.5
+应用侧设置 OPENAI_API_KEY=mock, OPENAI_API_BASE=http://127.0.0.1:9000/v1 即可 (竞技场模型未单独配置地址时沿用该地址)。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_REPAIR_PREFIX = "下面的内容应当是一个 JSON 对象"
+_SECTION = re.compile(r"\[片段 (\d+)\]\n(.*?)(?=\n\n\[片段 \d+\]\n|\Z)", re.S)
+_ENTITY_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]+|[\u4e00-\u9fff]{2,}")
+_RELATIONS = ["属于", "包含", "使用", "发布", "投资", "合作", "研发", "影响"]
+
+
+class Latency:
+    """
+    延迟分布，单位秒:
+    fixed:0.5 | uniform:0.2,1.5 | normal:1.0,0.2 (均值, 标准差) | lognormal:0.8,0.5 (中位数, sigma)
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        try:
+            values = [float(value) for value in params.split(",")] if params else []
+        except ValueError:
+            raise ValueError(f"无法解析的延迟分布: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"无法解析的延迟分布: {spec}")
+        self.kind, self.values = kind, values
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.values[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.values)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.values)
+        else:
+            median, sigma = self.values
+            value = median * rng.lognormvariate(0.0, sigma)
+        return max(0.0, value)
+
+
+@dataclass
+class MockConfig:
+    latency: str = "lognormal:0.8,0.5"  # 首 token 延迟 (非流式时即整个响应的延迟)
+    model_latency: Dict[str, str] = field(default_factory=dict)  # 按模型覆盖延迟分布
+    token_delay: float = 0.01  # 流式输出每个片段之间的间隔
+    answer_chars: int = 300  # 普通回答的长度
+    entities_per_chunk: int = 6  # 图谱抽取每个片段返回的实体数
+    error_rate: float = 0.0  # 返回 500 的比例
+    rate_limit_rate: float = 0.0  # 返回 429 的比例
+    max_concurrency: int = 0  # 并发请求上限，超过返回 429，0 表示不限
+    retry_after: float = 1.0  # 429 响应的 Retry-After 秒数
+    truncated_json_rate: float = 0.0  # 图谱抽取返回被截断 JSON 的比例
+    seed: Optional[int] = None
+
+    def validate(self):
+        Latency(self.latency)
+        for spec in self.model_latency.values():
+            Latency(spec)
+        for name in ("error_rate", "rate_limit_rate", "truncated_json_rate"):
+            if not 0.0 <= getattr(self, name) <= 1.0:
+                raise ValueError(f"{name} 必须在 0 到 1 之间")
+
+
+class MockLLM:
+    def __init__(self, config: MockConfig):
+        config.validate()
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.stats: Dict[str, Counter] = {}
+        self.started_at = time.time()
+
+    def update(self, changes: Dict):
+        config = MockConfig(**{**asdict(self.config), **changes})
+        config.validate()
+        self.config = config
+        if "seed" in changes:
+            self.rng = random.Random(config.seed)
+
+    def record(self, model: str, outcome: str):
+        self.stats.setdefault(model, Counter())[outcome] += 1
+
+    def latency_for(self, model: str) -> float:
+        return Latency(self.config.model_latency.get(model, self.config.latency)).sample(self.rng)
+
+    def injected_error(self) -> Optional[JSONResponse]:
+        """按配置抽样注入错误，返回 None 表示正常处理"""
+        roll = self.rng.random()
+        if roll < self.config.rate_limit_rate:
+            return _rate_limited(self.config.retry_after, "Rate limit reached (injected by mock)")
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            return JSONResponse(status_code=500, content={"error": {
+                "message": "Internal server error (injected by mock)", "type": "server_error", "code": None}})
+        return None
+
+    def reply(self, messages: List[Dict], response_format: Optional[Dict]) -> str:
+        prompt = _last_user_text(messages)
+        if prompt.startswith(_REPAIR_PREFIX):
+            return _repair(prompt)
+        sections = _SECTION.findall(prompt)
+        if sections:
+            payload = json.dumps({"chunks": [
+                dict(id=int(index), **_extract(text, self.config.entities_per_chunk)) for index, text in sections
+            ]}, ensure_ascii=False)
+            if self.rng.random() < self.config.truncated_json_rate:
+                # 模拟输出被 max_tokens 截断
+                payload = payload[:max(1, int(len(payload) * self.rng.uniform(0.5, 0.95)))]
+            return payload
+        if response_format and response_format.get("type") == "json_object":
+            return json.dumps({"answer": _answer(prompt, self.config.answer_chars)}, ensure_ascii=False)
+        return _answer(prompt, self.config.answer_chars)
+
+
+def _rate_limited(retry_after: float, message: str) -> JSONResponse:
+    return JSONResponse(status_code=429, headers={"retry-after": f"{retry_after:g}"}, content={"error": {
+        "message": message, "type": "requests", "code": "rate_limit_exceeded"}})
+
+
+def _last_user_text(messages: List[Dict]) -> str:
+    for message in reversed(messages or []):
+        if message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content or ""
+    return ""
+
+
+def _stable_hash(text: str) -> int:
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:4], "little")
+
+
+def _extract(text: str, count: int) -> Dict:
+    """从片段原文中确定性地挑选实体 (英文单词和二到四字的中文词)，相邻实体之间连一条关系"""
+    candidates = Counter()
+    for word in _ENTITY_WORD.findall(text):
+        if word[0].isascii():
+            candidates[word] += 1
+            continue
+        # 连续的中文按二到四字切开，切分位置由内容决定
+        i = 0
+        while i + 2 <= len(word):
+            size = 2 + _stable_hash(word[i:i + 4]) % 3
+            candidates[word[i:i + size]] += 1
+            i += size
+    entities = [word for word, _ in sorted(candidates.items(), key=lambda item: (-item[1], item[0]))[:count]]
+    relations = [{"source": source, "target": target, "relation": _RELATIONS[_stable_hash(source + target) % len(_RELATIONS)]}
+                 for source, target in zip(entities, entities[1:])]
+    return {"entities": entities, "relations": relations}
+
+
+def _repair(prompt: str) -> str:
+    """修复请求：补齐被截断的 JSON；实在无法修复时返回空结果"""
+    broken = prompt.split("\n\n", 1)[-1].strip()
+    broken = re.sub(r",\s*$", "", broken)
+    stack, in_string, escaped = [], False, False
+    for c in broken:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]" and stack:
+            stack.pop()
+    candidate = broken + ('"' if in_string else "") + "".join(reversed(stack))
+    try:
+        json.loads(candidate)
+        return candidate
+    except json.JSONDecodeError:
+        return '{"chunks": []}'
+
+
+def _answer(prompt: str, length: int) -> str:
+    question = prompt.strip().splitlines()[-1][:60] if prompt.strip() else ""
+    body = f"根据文档内容，关于“{question}”的回答如下：" + "文档指出相关结论需要结合上下文理解，" * (length // 18 + 1)
+    return body[:length]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def _pieces(text: str, size: int = 8) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI-compatible LLM")
+    mock = MockLLM(config or MockConfig())
+    app.state.mock = mock
+
+    @app.get("/v1/models")
+    async def list_models():
+        models = sorted(set(mock.config.model_latency) | set(mock.stats)) or ["mock-model"]
+        return {"object": "list", "data": [{"id": name, "object": "model", "owned_by": "mock"} for name in models]}
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model") or "mock-model"
+        if mock.config.max_concurrency and mock.in_flight >= mock.config.max_concurrency:
+            mock.record(model, "429_concurrency")
+            return _rate_limited(mock.config.retry_after, "Too many concurrent requests (mock)")
+
+        mock.in_flight += 1
+        mock.peak_in_flight = max(mock.peak_in_flight, mock.in_flight)
+        streaming = False
+        try:
+            await asyncio.sleep(mock.latency_for(model))
+            error = mock.injected_error()
+            if error is not None:
+                mock.record(model, str(error.status_code))
+                return error
+
+            content = mock.reply(body.get("messages") or [], body.get("response_format"))
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            created = int(time.time())
+            usage = {"prompt_tokens": _tokens(_last_user_text(body.get("messages") or [])),
+                     "completion_tokens": _tokens(content)}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            mock.record(model, "200")
+            if not body.get("stream"):
+                return {
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop", "logprobs": None}],
+                    "usage": usage,
+                }
+
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+            def chunk(choices: List[Dict], **extra) -> str:
+                payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                           "model": model, "choices": choices, **extra}
+                return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+            def delta(values: Dict, finish_reason: Optional[str] = None) -> str:
+                return chunk([{"index": 0, "delta": values, "finish_reason": finish_reason}])
+
+            async def events():
+                try:
+                    yield delta({"role": "assistant", "content": ""})
+                    for piece in _pieces(content):
+                        await asyncio.sleep(mock.config.token_delay)
+                        yield delta({"content": piece})
+                    yield delta({}, "stop")
+                    if include_usage:
+                        yield chunk([], usage=usage)
+                    yield "data: [DONE]\n\n"
+                finally:
+                    mock.in_flight -= 1
+
+            streaming = True
+            return StreamingResponse(events(), media_type="text/event-stream")
+        finally:
+            # 流式响应在输出结束时才释放并发名额
+            if not streaming:
+                mock.in_flight -= 1
+
+    @app.get("/mock/config")
+    async def get_config():
+        return asdict(mock.config)
+
+    @app.put("/mock/config")
+    async def put_config(request: Request):
+        try:
+            mock.update(await request.json())
+        except (TypeError, ValueError) as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        return asdict(mock.config)
+
+    @app.get("/mock/stats")
+    async def get_stats():
+        return {"uptime_seconds": round(time.time() - mock.started_at, 1), "in_flight": mock.in_flight,
+                "peak_in_flight": mock.peak_in_flight,
+                "models": {model: dict(counter) for model, counter in mock.stats.items()}}
+
+    @app.post("/mock/stats/reset")
+    async def reset_stats():
+        mock.stats.clear()
+        mock.peak_in_flight = mock.in_flight
+        mock.started_at = time.time()
+        return {"status": "reset"}
+
+    return app
+
+
+def _model_latency(values: List[str]) -> Dict[str, str]:
+    result = {}
+    for value in values:
+        model, sep, spec = value.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--model-latency 格式应为 模型名=分布: {value}")
+        result[model] = spec
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default=MockConfig.latency, help="默认延迟分布，如 lognormal:0.8,0.5")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="按模型覆盖延迟分布，可重复，如 glm-4=lognormal:2.5,0.6")
+    parser.add_argument("--token-delay", type=float, default=MockConfig.token_delay)
+    parser.add_argument("--answer-chars", type=int, default=MockConfig.answer_chars)
+    parser.add_argument("--entities-per-chunk", type=int, default=MockConfig.entities_per_chunk)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="并发上限，超过返回 429")
+    parser.add_argument("--retry-after", type=float, default=MockConfig.retry_after)
+    parser.add_argument("--truncated-json-rate", type=float, default=0.0, help="图谱抽取返回被截断 JSON 的比例")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency, model_latency=_model_latency(args.model_latency), token_delay=args.token_delay,
+        answer_chars=args.answer_chars, entities_per_chunk=args.entities_per_chunk, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, max_concurrency=args.max_concurrency, retry_after=args.retry_after,
+        truncated_json_rate=args.truncated_json_rate, seed=args.seed,
+    )
+    try:
+        app = create_app(config)
+    except ValueError as e:
+        parser.error(str(e))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
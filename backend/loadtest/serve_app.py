@@ -0,0 +1,55 @@
+"""
+启动被测应用：LLM 指向本地 mock 服务，数据库默认使用临时文件，不影响正式数据.
+--fake-embeddings 时以离线的哈希向量代替 HuggingFace 模型 (以单独的模型名登记，向量缓存不会与真实模型混用)，
+适合没有下载模型的机器；需要测量真实 embedding 开销时去掉该参数。
+运行方式 (在 backend 目录下): python -m loadtest.serve_app --port 8000 --llm-base http://127.0.0.1:9000/v1 --fake-embeddings
+"""
+import argparse
+import os
+import tempfile
+
+FAKE_EMBEDDING_MODEL = "loadtest/hashing-512"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--llm-base", default="http://127.0.0.1:9000/v1", help="mock LLM 服务地址")
+    parser.add_argument("--database-url", default=None, help="默认在临时目录新建 SQLite 数据库")
+    parser.add_argument("--fake-embeddings", action="store_true", help="使用离线哈希向量代替 HuggingFace 模型")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    # 配置在导入 app 时读取，必须先写入环境变量
+    workdir = tempfile.mkdtemp(prefix="docqa-loadtest-")
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ["OPENAI_API_BASE"] = args.llm_base
+    # 竞技场模型即使在 .env 中单独配置了地址，压测时也一律指向 mock
+    for i in range(1, 5):
+        os.environ[f"ARENA_MODEL_{i}_BASE"] = args.llm_base
+        os.environ[f"ARENA_MODEL_{i}_KEY"] = "mock"
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/loadtest.db"
+    os.environ.setdefault("VECTOR_INDEX_DIR", f"{workdir}/vector_indexes")
+    os.environ.setdefault("REPORT_CACHE_DIR", f"{workdir}/reports")
+    if args.fake_embeddings:
+        os.environ["EMBEDDING_MODEL_NAME"] = FAKE_EMBEDDING_MODEL
+        os.environ["LOADTEST_FAKE_EMBEDDINGS"] = "1"
+
+    import uvicorn
+    uvicorn.run("loadtest.serve_app:create_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers, log_level="warning")
+
+
+def create_app():
+    """uvicorn 的应用工厂；多 worker 时每个进程各自登记假 embedding"""
+    if os.environ.get("LOADTEST_FAKE_EMBEDDINGS"):
+        from benchmarks._common import HashingEmbeddings
+        from app.services.qa_service import EmbeddingManager
+        EmbeddingManager.register(FAKE_EMBEDDING_MODEL, HashingEmbeddings())
+    from app.main import app
+    return app
+
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,26 @@ export const buildKnowledgeGraph = (documentId) => {
 // 获取知识图谱可视化
 export const getKnowledgeGraphVisualization = () => {
   return apiClient.get('/knowledge-graph/visualize');
-};
\ No newline at end of file
+};
+
+// 按 PageRank / 度数 / 提及次数排序的实体列表
+export const getEntities = ({ orderBy = 'pagerank', query, skip = 0, limit = 20 } = {}) => {
+  return apiClient.get('/knowledge-graph/entities', {
+    params: { order_by: orderBy, q: query || undefined, skip, limit },
+  });
+};
+
+// 实体的 k 跳邻域 (分页)
+export const getEntityNeighborhood = (entity, { hops = 1, skip = 0, limit = 50 } = {}) => {
+  return apiClient.get('/knowledge-graph/neighborhood', { params: { entity, hops, skip, limit } });
+};
+
+// 两个实体之间的最短路径
+export const getEntityPath = (source, target) => {
+  return apiClient.get('/knowledge-graph/path', { params: { source, target } });
+};
+
+// 提到该实体的文档片段
+export const getEntityMentions = (entity, { skip = 0, limit = 20 } = {}) => {
+  return apiClient.get('/knowledge-graph/mentions', { params: { entity, skip, limit } });
+};
@@ -1,9 +1,11 @@
 import apiClient from './apiClient';
 
-// 单文档问答 - 增加 history 参数
-export const singleDocumentQA = (documentId, question, history = []) => {
+// 单文档问答 - 会话状态保存在服务端；始终附带最近几轮 history (由调用方截断)，
+// 服务端会话已过期、被淘汰或在其他 worker 上时据此重建，响应中 conversation_reset 为 true
+export const singleDocumentQA = (documentId, question, history = [], conversationId = null) => {
   return apiClient.post('/qa/single-document', { // 改为 POST body 传参更合适，但为了兼容保持 query param 也可以，这里推荐用 body
-    history: history
+    history: history,
+    conversation_id: conversationId
   }, {
     params: { document_id: documentId, question }
   });
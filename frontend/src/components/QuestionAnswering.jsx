@@ -22,6 +22,9 @@ const QuestionAnswering = () => {
   const [inputValue, setInputValue] = useState('');
   const [loading, setLoading] = useState(false);
 
+  // 单文档多轮对话的服务端会话 ID
+  const [conversationId, setConversationId] = useState(null);
+
   // 竞技场模式的专用状态
   const [arenaResults, setArenaResults] = useState(null);
 
@@ -88,7 +91,8 @@ const QuestionAnswering = () => {
         .map(msg => ({ role: msg.role, content: msg.content }));
 
       if (mode === 'single') {
-        result = await singleDocumentQA(selectedDocId, question, contextHistory);
+        result = await singleDocumentQA(selectedDocId, question, contextHistory, conversationId);
+        setConversationId(result.conversation_id || null);
       } else if (mode === 'kb') {
         result = await knowledgeBaseQA(question, contextHistory);
       } else if (mode === 'compare') {
@@ -113,6 +117,7 @@ const QuestionAnswering = () => {
   const clearChat = () => {
     setChatHistory([{ role: 'assistant', content: '对话已清空。我们可以重新开始了。' }]);
     setArenaResults(null);
+    setConversationId(null);
   };
 
   const renderMessage = (item) => {